@@ -2,6 +2,9 @@ import json
 from datetime import datetime, timezone
 import os
 import random
+import sys
+
+import click
 
 from dotenv import load_dotenv
 from flask import Flask, send_from_directory
@@ -24,12 +27,30 @@ mqtt = Mqtt()
 cache = Cache()
 user_datastore = None
 
-def create_app():
+CONFIG_DEFAULT = 'default'
+CONFIG_TESTING = 'testing'  # БД в памяти (или TEST_DATABASE_URI), без начальных данных и без приёма MQTT
+CONFIG_NAMES = (CONFIG_DEFAULT, CONFIG_TESTING)
+
+def create_app(config_name=None, mode=None):
+    """
+    config_name: default — настройки из .env, testing — для тестов (см. tests/conftest.py).
+    mode (или APP_MODE): all — HTTP и приём MQTT в одном процессе,
+    web — только HTTP, ingest — только приём (см. app/ingest.py).
+    """
     global user_datastore  #user_datastore глобальной переменной
 
     # Загружаем переменные окружения
     load_dotenv()
 
+    from app.ingest import APP_MODES, APP_MODE_ALL, APP_MODE_WEB, APP_MODE_INGEST, start_ingest, run_ingest
+    config_name = config_name or CONFIG_DEFAULT
+    if config_name not in CONFIG_NAMES:
+        raise ValueError(f"Unknown config '{config_name}'")
+    testing = config_name == CONFIG_TESTING
+    mode = mode or (APP_MODE_WEB if testing else os.getenv('APP_MODE', APP_MODE_ALL))
+    if mode not in APP_MODES:
+        raise ValueError(f"Unknown APP_MODE '{mode}'")
+
     # Инициализация Flask
     app = Flask(__name__, instance_relative_config=True)
 
@@ -37,6 +58,9 @@ def create_app():
 
     # Конфигурация базы данных
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
+    if testing:
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('TEST_DATABASE_URI', 'sqlite://')
     # Настройка конфигурации из .env
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False') == 'True'
     app.config['JSON_AS_ASCII'] = os.getenv('JSON_AS_ASCII', 'False') == 'True'
@@ -48,13 +72,69 @@ def create_app():
     app.config['JWT_IDENTITY_CLAIM'] = os.getenv('JWT_IDENTITY_CLAIM')
     app.config['MQTT_BROKER_URL'] = os.getenv('MQTT_BROKER_URL')
     app.config['MQTT_BROKER_PORT'] = int(os.getenv('MQTT_BROKER_PORT'))
+    # Подписки MQTT через подстановочные фильтры, через запятую (например sensor/#).
+    # Пусто — подписка на каждый топик датчика отдельно
+    app.config['MQTT_TOPIC_FILTERS'] = [f.strip() for f in os.getenv('MQTT_TOPIC_FILTERS', '').split(',') if f.strip()]
+    # Декодер JSON входящих сообщений: auto | orjson | json
+    app.config['MQTT_JSON_DECODER'] = os.getenv('MQTT_JSON_DECODER', 'auto')
+    # Журнал на диске для записей, которые не удалось записать в БД, и потолок буфера в памяти
+    app.config['MQTT_SPILL_DIR'] = os.getenv('MQTT_SPILL_DIR', os.path.join(app.instance_path, 'spill'))
+    app.config['MQTT_BUFFER_MEMORY_LIMIT'] = int(os.getenv('MQTT_BUFFER_MEMORY_LIMIT', '100000'))
+    # Окно отсева повторных доставок MQTT: меток времени на серию, 0 — отключено
+    app.config['MQTT_DEDUP_WINDOW'] = int(os.getenv('MQTT_DEDUP_WINDOW', '1024'))
+    # Топик для публикации тревог: <MQTT_ALARM_TOPIC>/<sensor_id>/<parameter_id>; пусто — не публиковать
+    app.config['MQTT_ALARM_TOPIC'] = os.getenv('MQTT_ALARM_TOPIC', 'alarms')
+    # Горизонты (сек) экспоненциально затухающей статистики серий, через запятую
+    app.config['MQTT_STATS_HORIZONS'] = [float(h) for h in os.getenv('MQTT_STATS_HORIZONS', '60,3600').split(',') if h.strip()]
+    # Конвейер приёма: число декодеров, их вид (thread | process) и ёмкость очереди сырых сообщений
+    app.config['INGEST_DECODE_WORKERS'] = int(os.getenv('INGEST_DECODE_WORKERS', '2'))
+    app.config['INGEST_WORKER_MODE'] = os.getenv('INGEST_WORKER_MODE', 'thread')
+    app.config['INGEST_QUEUE_SIZE'] = int(os.getenv('INGEST_QUEUE_SIZE', '10000'))
+    # Шардированный приём: none — все топики в одном процессе, hash — топики делятся между
+    # процессами согласованным хешированием data_source (состав — через таблицу ingest_workers),
+    # shared — общие подписки MQTT $share/<INGEST_SHARED_GROUP>/...
+    app.config['INGEST_SHARD_MODE'] = os.getenv('INGEST_SHARD_MODE', 'none')
+    app.config['INGEST_WORKER_ID'] = os.getenv('INGEST_WORKER_ID') or None
+    app.config['INGEST_SHARD_HEARTBEAT'] = float(os.getenv('INGEST_SHARD_HEARTBEAT', '5'))
+    app.config['INGEST_SHARD_TIMEOUT'] = float(os.getenv('INGEST_SHARD_TIMEOUT', '15'))
+    app.config['INGEST_SHARED_GROUP'] = os.getenv('INGEST_SHARED_GROUP', 'cv-ingest')
+    # Как часто процесс приёма проверяет изменения настроек, сделанные другими процессами (сек)
+    app.config['ROUTING_POLL_INTERVAL'] = float(os.getenv('ROUTING_POLL_INTERVAL', '5'))
+    # Постоянные конфигурации: сколько последних точек каждого источника держать в памяти
+    app.config['STANDING_MAX_POINTS'] = int(os.getenv('STANDING_MAX_POINTS', '100000'))
+    # При шардированном приёме: секунд между перечитываниями серий постоянных конфигураций
+    app.config['STANDING_REFRESH_INTERVAL'] = float(os.getenv('STANDING_REFRESH_INTERVAL', '10'))
+    app.config['APP_MODE'] = mode
+    # Один лидер приёма без шардирования: auto | db (advisory-блокировка PostgreSQL) | file | none
+    app.config['INGEST_LEADER_LOCK'] = os.getenv('INGEST_LEADER_LOCK', 'auto')
+    app.config['INGEST_LEADER_LOCK_FILE'] = os.getenv('INGEST_LEADER_LOCK_FILE') or None
+    app.config['INGEST_LEADER_RETRY'] = float(os.getenv('INGEST_LEADER_RETRY', '5'))
+    # Порт HTTP-сервера метрик Prometheus в процессе APP_MODE=ingest; 0 — не запускать
+    app.config['INGEST_METRICS_PORT'] = int(os.getenv('INGEST_METRICS_PORT', '0'))
+    # Граничный узел: адрес центрального экземпляра (пусто — узел не пересылает), имя узла,
+    # токен, период и размер пачки. EDGE_INGEST_TOKEN — токен, который центр ждёт от узлов
+    app.config['EDGE_FORWARD_URL'] = os.getenv('EDGE_FORWARD_URL') or None
+    app.config['EDGE_NODE_ID'] = os.getenv('EDGE_NODE_ID') or None
+    app.config['EDGE_FORWARD_TOKEN'] = os.getenv('EDGE_FORWARD_TOKEN') or None
+    app.config['EDGE_FORWARD_INTERVAL'] = float(os.getenv('EDGE_FORWARD_INTERVAL', '10'))
+    app.config['EDGE_FORWARD_BATCH'] = int(os.getenv('EDGE_FORWARD_BATCH', '5000'))
+    app.config['EDGE_INGEST_TOKEN'] = os.getenv('EDGE_INGEST_TOKEN') or None
+    # Секции sensor_records на PostgreSQL: период секции (day | month), сколько следующих периодов
+    # создавать заранее, срок хранения по умолчанию (дней, 0 — бессрочно) и период обслуживания (сек)
+    app.config['SENSOR_RECORDS_PARTITION'] = os.getenv('SENSOR_RECORDS_PARTITION', 'month')
+    app.config['SENSOR_RECORDS_PARTITIONS_AHEAD'] = int(os.getenv('SENSOR_RECORDS_PARTITIONS_AHEAD', '2'))
+    app.config['SENSOR_RECORDS_RETENTION_DAYS'] = int(os.getenv('SENSOR_RECORDS_RETENTION_DAYS', '0'))
+    app.config['PARTITION_MAINTENANCE_INTERVAL'] = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600'))
+    # Агрегаты серий 1 с / 1 мин / 1 ч, обновляемые каждой пачкой приёма, и бюджет точек
+    # на серию графика по умолчанию: длинные интервалы читаются из агрегатов (0 — всегда записи)
+    app.config['SENSOR_ROLLUPS'] = os.getenv('SENSOR_ROLLUPS', 'True') == 'True'
+    app.config['ROLLUP_POINT_BUDGET'] = int(os.getenv('ROLLUP_POINT_BUDGET', '2000'))
     # Минимальная конфигурация кэша (используем простой встроенный кэш)
     app.config["CACHE_TYPE"] =  os.getenv('CACHE_TYPE')
 
     # Инициализация расширений
     db.init_app(app)
     cache.init_app(app)
-    mqtt.init_app(app)
     jwt = JWTManager(app)
 
     # Swagger статические файлы
@@ -72,22 +152,69 @@ def create_app():
     from app.models.users import Role, User
     user_datastore = SQLAlchemyUserDatastore(db, User, Role)
 
-    with app.app_context():
-
-        # удаление данных таблиц
-        create_tables()
+    from app.services.partitions import partition_manager
+    from app.services.record_schema import needs_upgrade, upgrade_records
+    from app.services.rollups import rollup_manager
+    partition_manager.configure(app.config['SENSOR_RECORDS_PARTITION'],
+                                app.config['SENSOR_RECORDS_PARTITIONS_AHEAD'],
+                                app.config['SENSOR_RECORDS_RETENTION_DAYS'],
+                                app.config['PARTITION_MAINTENANCE_INTERVAL'])
+    rollup_manager.configure(app.config['SENSOR_ROLLUPS'], app.config['ROLLUP_POINT_BUDGET'])
 
-        # создание начальных данных
-        create_roles_and_users()
-        create_sensors_and_equipment()
-        #insert_bulk_data(5000)
+    with app.app_context():
+        if mode == APP_MODE_INGEST:
+            # Процесс приёма не трогает данные, которые готовит веб-процесс
+            db.create_all()
+            if needs_upgrade():
+                print("sensor_records uses the old row layout: run 'flask upgrade-records' with ingest stopped")
+            elif rollup_manager.needs_rebuild():
+                print("Some sensor_records are not in the rollups (reads use raw records): "
+                      "run 'flask rebuild-rollups' with ingest stopped")
+        elif testing:
+            # Таблицы и данные создают фикстуры тестов
+            pass
+        else:
+            # удаление данных таблиц
+            create_tables()
+
+            # создание начальных данных
+            create_roles_and_users()
+            create_sensors_and_equipment()
+            #insert_bulk_data(5000)
 
     # Регистрация всех маршрутов
     from app.routes import register_routes
     register_routes(app)
 
-    from app.services import mqtt_service
-    # Передаем app в mqtt_service
-    mqtt_service.init_app(app)
+    # Приём MQTT: в режиме ingest запускается командой flask ingest / python -m app.ingest
+    @app.cli.command('ingest')
+    def ingest_command():
+        if app.config['APP_MODE'] != APP_MODE_INGEST:
+            raise click.UsageError("Run with APP_MODE=ingest")
+        sys.exit(run_ingest(app))
+
+    # Перевод сохранённых sensor_records на текущую схему (см. app/services/record_schema.py)
+    @app.cli.command('upgrade-records')
+    def upgrade_records_command():
+        if app.config['APP_MODE'] != APP_MODE_INGEST:
+            raise click.UsageError("Run with APP_MODE=ingest: other modes recreate the tables on start")
+        print(upgrade_records())
+
+    # Пересчёт агрегатов серий из sensor_records (см. app/services/rollups.py)
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        if app.config['APP_MODE'] != APP_MODE_INGEST:
+            raise click.UsageError("Run with APP_MODE=ingest: other modes recreate the tables on start")
+        print(rollup_manager.rebuild())
+
+    # Внеочередной проход обслуживания секций: секции наперёд и сроки хранения (см. app/services/partitions.py)
+    @app.cli.command('maintain-partitions')
+    def maintain_partitions_command():
+        if app.config['APP_MODE'] != APP_MODE_INGEST:
+            raise click.UsageError("Run with APP_MODE=ingest: other modes recreate the tables on start")
+        print(partition_manager.maintain())
+
+    if mode == APP_MODE_ALL:
+        start_ingest(app)
 
     return app
\ No newline at end of file
@@ -11,7 +11,7 @@ def spectrum(signal: List[float], fs: float = 1000, remove_dc: bool = True, wind
     if len(signal) == 0:
         return np.array([]), np.array([])
 
-    signal = np.array([float(x) for x in signal], dtype=float)
+    signal = np.asarray(signal, dtype=float)
     n = len(signal)
 
     if remove_dc:
@@ -52,13 +52,17 @@ def func1(values_x: List[Any], values_y: List[float]) -> Tuple[List[Any], List[f
     y = [float(v)*5 for v in values_y]
     return values_x, y
 
-def execute_function(function_name: str, values_x: List[Any], values_y: List[float]) -> Tuple[Any, Any]:
+def execute_function(function_name: str, values_x: List[Any], values_y: List[float],
+                     fs: float = None) -> Tuple[Any, Any]:
     """
     Вызывает нужную функцию обработки данных.
     Поддерживаем: spectrum, fourier (alias), func1, lowpass.
+    fs — частота дискретизации входа, если известна (кадры формы сигнала).
     """
     name = function_name.lower()
     if name in ('spectrum', 'fourier'):
+        if fs:
+            return spectrum(values_y, fs=fs)
         return spectrum(values_y)
     if name == 'func1':
         return func1(values_x, values_y)
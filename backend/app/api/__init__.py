@@ -8,6 +8,15 @@ from .parameters import parameter_bp
 from .sensors_parameters import sensors_parameters_bp
 from .sensor_records import sensor_records_bp
 from .configuration import configuration_bp
+from .ingest import ingest_bp
+from .captures import captures_bp
+from .derived_parameters import derived_parameters_bp
+from .alarms import alarms_bp
+from .anomalies import anomalies_bp
+from .brokers import brokers_bp
+from .metrics import metrics_bp
+from .edge import edge_bp
+from .partitions import partitions_bp
 
 # Создание главного Blueprint для API
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -19,4 +28,13 @@ api_bp.register_blueprint(equipment_bp, url_prefix='/equipment')
 api_bp.register_blueprint(parameter_bp, url_prefix='/parameter')
 api_bp.register_blueprint(sensors_parameters_bp, url_prefix='/sensors_parameters')
 api_bp.register_blueprint(sensor_records_bp, url_prefix='/sensor_records')
-api_bp.register_blueprint(configuration_bp, url_prefix='/configuration')
\ No newline at end of file
+api_bp.register_blueprint(configuration_bp, url_prefix='/configuration')
+api_bp.register_blueprint(ingest_bp, url_prefix='/ingest')
+api_bp.register_blueprint(captures_bp, url_prefix='/captures')
+api_bp.register_blueprint(derived_parameters_bp, url_prefix='/derived_parameters')
+api_bp.register_blueprint(alarms_bp, url_prefix='/alarms')
+api_bp.register_blueprint(anomalies_bp, url_prefix='/anomalies')
+api_bp.register_blueprint(brokers_bp, url_prefix='/brokers')
+api_bp.register_blueprint(metrics_bp, url_prefix='/metrics')
+api_bp.register_blueprint(edge_bp, url_prefix='/edge')
+api_bp.register_blueprint(partitions_bp, url_prefix='/partitions')
\ No newline at end of file
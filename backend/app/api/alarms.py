@@ -0,0 +1,109 @@
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+alarms_bp = Blueprint('alarms', __name__)
+
+from ..models.alarm import Alarm_Rule, Alarm_Event
+from app.services.alarms import KINDS, SEVERITIES, active_alarms
+from app import db
+
+
+def apply_rule(rule, data):
+    # Заполняет правило тревоги из запроса; возвращает текст ошибки или None
+    for field in ('name', 'sensor_id', 'parameter_id'):
+        if field in data:
+            setattr(rule, field, data[field])
+    if 'kind' in data:
+        if data['kind'] not in KINDS:
+            return 'kind must be one of: ' + ', '.join(KINDS)
+        rule.kind = data['kind']
+    if 'severity' in data:
+        if data['severity'] not in SEVERITIES:
+            return 'severity must be one of: ' + ', '.join(SEVERITIES)
+        rule.severity = data['severity']
+    if 'enabled' in data:
+        rule.enabled = bool(data['enabled'])
+    try:
+        for field in ('limit', 'hysteresis'):
+            if field in data:
+                setattr(rule, field, float(data[field]))
+        for field in ('n', 'm'):
+            if field in data:
+                setattr(rule, field, int(data[field]))
+    except (TypeError, ValueError):
+        return 'limit and hysteresis must be numbers, n and m — integers'
+    if not rule.sensor_id or not rule.parameter_id or not rule.kind or rule.limit is None:
+        return 'sensor_id, parameter_id, kind and limit are required'
+    if (rule.hysteresis or 0) < 0:
+        return 'hysteresis must not be negative'
+    if not 1 <= (rule.n or 1) <= (rule.m or 1):
+        return 'n and m must satisfy 1 <= n <= m'
+    return None
+
+
+# Список правил тревог
+@alarms_bp.route('/rules', methods=['GET'])
+#@jwt_required()
+def show_rules():
+    return jsonify([rule.to_dict() for rule in Alarm_Rule.query.order_by(Alarm_Rule.id).all()])
+
+
+# Добавление правила тревоги
+@alarms_bp.route('/rules', methods=['POST'])
+#@jwt_required()
+def add_rule():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    rule = Alarm_Rule()
+    error = apply_rule(rule, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(rule)
+    db.session.commit()
+    return jsonify(rule.to_dict()), 201
+
+
+# Изменение правила тревоги
+@alarms_bp.route('/rules/<int:rule_id>', methods=['PUT'])
+#@jwt_required()
+def update_rule(rule_id):
+    rule = Alarm_Rule.query.get_or_404(rule_id)
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    error = apply_rule(rule, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(rule.to_dict()), 200
+
+
+# Удаление правила тревоги (журнал событий остаётся)
+@alarms_bp.route('/rules/<int:rule_id>', methods=['DELETE'])
+#@jwt_required()
+def delete_rule(rule_id):
+    rule = Alarm_Rule.query.get_or_404(rule_id)
+    db.session.delete(rule)
+    db.session.commit()
+    return jsonify({'message': 'Alarm rule deleted successfully'}), 200
+
+
+# Журнал событий тревог, новые сверху; фильтры sensor_id, parameter_id, state необязательны
+@alarms_bp.route('/events', methods=['GET'])
+#@jwt_required()
+def show_events():
+    query = Alarm_Event.query
+    for field in ('sensor_id', 'parameter_id', 'state'):
+        if request.args.get(field):
+            query = query.filter(getattr(Alarm_Event, field) == request.args.get(field))
+    events = query.order_by(Alarm_Event.timestamp.desc()).limit(request.args.get('limit', 100, type=int)).all()
+    return jsonify([event.to_dict() for event in events])
+
+
+# Активные сейчас тревоги — по последнему событию каждого правила в alarm_events
+@alarms_bp.route('/active', methods=['GET'])
+#@jwt_required()
+def show_active():
+    return jsonify(active_alarms())
@@ -0,0 +1,18 @@
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+anomalies_bp = Blueprint('anomalies', __name__)
+
+from ..models.anomaly import Anomaly
+
+
+# Аномалии, найденные на приёме, — последние сначала
+@anomalies_bp.route('/', methods=['GET'])
+#@jwt_required()
+def show_anomalies():
+    query = Anomaly.query
+    for field in ('sensor_id', 'parameter_id'):
+        if request.args.get(field):
+            query = query.filter(getattr(Anomaly, field) == request.args.get(field))
+    anomalies = query.order_by(Anomaly.timestamp.desc()).limit(request.args.get('limit', 100, type=int)).all()
+    return jsonify([anomaly.to_dict() for anomaly in anomalies])
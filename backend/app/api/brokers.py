@@ -0,0 +1,78 @@
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+brokers_bp = Blueprint('brokers', __name__)
+
+from ..models.broker import Broker
+from ..models.sensor import Sensor
+from app import db
+
+
+def apply_broker(broker, data):
+    # Заполняет брокер из запроса; возвращает текст ошибки или None
+    for field in ('name', 'host', 'username', 'password'):
+        if field in data:
+            setattr(broker, field, data[field])
+    for field in ('port', 'keepalive'):
+        if field in data:
+            if not isinstance(data[field], int) or data[field] <= 0:
+                return f'{field} must be a positive integer'
+            setattr(broker, field, data[field])
+    if not broker.name or not broker.host:
+        return 'name and host are required'
+    duplicate = Broker.query.filter(Broker.name == broker.name, Broker.id != broker.id).first()
+    if duplicate:
+        return 'Broker already exists'
+    return None
+
+
+# Список брокеров
+@brokers_bp.route('/', methods=['GET'])
+#@jwt_required()
+def show_brokers():
+    return jsonify([broker.to_dict() for broker in Broker.query.order_by(Broker.id).all()])
+
+
+# Добавление брокера (подключение появится, когда на нём будет датчик)
+@brokers_bp.route('/', methods=['POST'])
+#@jwt_required()
+def add_broker():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    broker = Broker()
+    error = apply_broker(broker, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(broker)
+    db.session.commit()
+    return jsonify(broker.to_dict()), 201
+
+
+# Изменение брокера: клиент переподключится после перестройки маршрутизации
+@brokers_bp.route('/<int:broker_id>', methods=['PUT'])
+#@jwt_required()
+def update_broker(broker_id):
+    broker = Broker.query.get_or_404(broker_id)
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    error = apply_broker(broker, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(broker.to_dict()), 200
+
+
+# Удаление брокера — только если на нём нет датчиков
+@brokers_bp.route('/<int:broker_id>', methods=['DELETE'])
+#@jwt_required()
+def delete_broker(broker_id):
+    broker = Broker.query.get_or_404(broker_id)
+    if Sensor.query.filter_by(broker_id=broker_id).first():
+        return jsonify({'error': 'Broker has sensors'}), 400
+    db.session.delete(broker)
+    db.session.commit()
+    return jsonify({'message': 'Broker deleted successfully'}), 200
+
@@ -0,0 +1,92 @@
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+captures_bp = Blueprint('captures', __name__)
+
+from ..models.capture import Capture_Trigger, Capture
+from app.services.capture import CONDITIONS
+from app import db
+
+
+def apply_trigger(trigger, data):
+    # Заполняет условие захвата из запроса; возвращает текст ошибки или None
+    for field in ('sensor_id', 'parameter_id', 'source_sensor_id', 'source_parameter_id'):
+        if field in data:
+            setattr(trigger, field, data[field])
+    if 'condition' in data:
+        if data['condition'] not in CONDITIONS:
+            return 'condition must be one of: ' + ', '.join(CONDITIONS)
+        trigger.condition = data['condition']
+    try:
+        for field in ('threshold', 'pre_seconds', 'post_seconds'):
+            if field in data:
+                setattr(trigger, field, float(data[field]))
+    except (TypeError, ValueError):
+        return 'threshold, pre_seconds and post_seconds must be numbers'
+    if not trigger.sensor_id or not trigger.parameter_id or not trigger.condition or trigger.threshold is None:
+        return 'sensor_id, parameter_id, condition and threshold are required'
+    if (trigger.pre_seconds or 0) < 0 or (trigger.post_seconds or 0) < 0:
+        return 'pre_seconds and post_seconds must not be negative'
+    return None
+
+
+# Список условий захвата
+@captures_bp.route('/triggers', methods=['GET'])
+#@jwt_required()
+def show_triggers():
+    return jsonify([trigger.to_dict() for trigger in Capture_Trigger.query.order_by(Capture_Trigger.id).all()])
+
+
+# Добавление условия захвата
+@captures_bp.route('/triggers', methods=['POST'])
+#@jwt_required()
+def add_trigger():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    trigger = Capture_Trigger()
+    error = apply_trigger(trigger, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(trigger)
+    db.session.commit()
+    return jsonify(trigger.to_dict()), 201
+
+
+# Изменение условия захвата
+@captures_bp.route('/triggers/<int:trigger_id>', methods=['PUT'])
+#@jwt_required()
+def update_trigger(trigger_id):
+    trigger = Capture_Trigger.query.get_or_404(trigger_id)
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    error = apply_trigger(trigger, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(trigger.to_dict()), 200
+
+
+# Удаление условия захвата (сохранённые захваты остаются)
+@captures_bp.route('/triggers/<int:trigger_id>', methods=['DELETE'])
+#@jwt_required()
+def delete_trigger(trigger_id):
+    trigger = Capture_Trigger.query.get_or_404(trigger_id)
+    db.session.delete(trigger)
+    db.session.commit()
+    return jsonify({'message': 'Trigger deleted successfully'}), 200
+
+
+# Сохранённые захваты, новые сверху; фильтры sensor_id и parameter_id необязательны
+@captures_bp.route('/', methods=['GET'])
+#@jwt_required()
+def show_captures():
+    query = Capture.query
+    if request.args.get('sensor_id'):
+        query = query.filter(Capture.sensor_id == request.args.get('sensor_id'))
+    if request.args.get('parameter_id'):
+        query = query.filter(Capture.parameter_id == request.args.get('parameter_id'))
+    captures = query.order_by(Capture.start_time.desc()).limit(request.args.get('limit', 100, type=int)).all()
+    return jsonify([capture.to_dict() for capture in captures])
@@ -1,12 +1,10 @@
-from datetime import datetime
-
-import pytz
-from flask import jsonify, Blueprint, request
+from flask import jsonify, Blueprint, request, current_app
 from flask_jwt_extended import  jwt_required
 
 from app import db, cache
-from app.core.block_processor import Block_Processor
+from app.core.block_processor import Block_Processor, serialize_result, apply_last_update
 from app.models.configuration import Configuration
+from app.models.standing_result import Standing_Result
 
 configuration_bp = Blueprint('configuration', __name__)
 
@@ -66,6 +64,20 @@ def delete_configuration(user_id, equipment_id):
     db.session.commit()
     return jsonify({'message': 'Configuration deleted successfully'}), 200
 
+# Сделать конфигурацию постоянной (или обычной): {"standing": true | false}
+@configuration_bp.route('/<user_id>/<equipment_id>/standing', methods=['PUT'])
+#@jwt_required()
+def set_standing(user_id, equipment_id):
+    config = Configuration.query.get((user_id, equipment_id))
+    if not config:
+        return jsonify({'message': 'Нет конфигурация для этого пользователя и оборудования!'}), 404
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('standing'), bool):
+        return jsonify({'message': 'standing must be true or false'}), 400
+    config.standing = data['standing']
+    db.session.commit()
+    return jsonify(config.to_dict()), 200
+
 @configuration_bp.route('/<user_id>/<equipment_id>/apply', methods=['GET'])
 #@jwt_required()
 def apply_configuration(user_id, equipment_id):
@@ -73,17 +85,20 @@ def apply_configuration(user_id, equipment_id):
     if not config:
         return jsonify({'message': 'Нет конфигурации для этого пользователя и оборудования!'}), 404
 
+    # Постоянная конфигурация уже вычислена на приёме — отдаём готовый ответ,
+    # если он посчитан после последнего изменения конфигурации
+    if config.standing:
+        stored = db.session.get(Standing_Result, (config.user_id, config.equipment_id))
+        if stored is not None and stored.materialized_at > (config.updated_at or config.created_at):
+            return current_app.response_class(stored.payload, mimetype='application/json')
+
     # Получаем параметр `last_update` из запроса (в формате %Y-%m-%dT%H:%M:%S.%fZ)
     last_update_str = request.args.get('last_update')
     if not last_update_str:
         return jsonify({'message': 'Last_update arg needed'}), 401
 
-    # Convert to Moscow time (UTC+3)
-    last_update_str = '2024-12-12T00:00:00.461Z'
-    timestamp_utc = datetime.strptime(last_update_str, '%Y-%m-%dT%H:%M:%S.%fZ')
-    timestamp_utc = pytz.utc.localize(timestamp_utc)
-    moscow_tz = pytz.timezone('Europe/Moscow')
-    timestamp = timestamp_utc.astimezone(moscow_tz)
+    # Пока читаем серии с фиксированного момента (тот же используют постоянные конфигурации)
+    timestamp = apply_last_update()
 
     # Кэшируем данные
     # cache_key = f"prev_update_data_{user_id}_{equipment_id}"
@@ -128,15 +143,7 @@ def apply_configuration(user_id, equipment_id):
     # cache.set(cache_key, {"prev_update": timestamp, 'raw_result':raw_result}, timeout=3600)
 
     raw_result = Block_Processor(config.config, timestamp).process()
-    # Преобразуем numpy.ndarray в списки, чтобы JSON-сериализация прошла успешно
-    serializable = {}
-    for block_id, data in raw_result.items():
-        x_vals = data.get('x_values', [])
-        y_vals = data.get('y_values', [])
-        serializable[block_id] = {
-            'x_values': x_vals.tolist() if hasattr(x_vals, 'tolist') else list(x_vals),
-            'y_values': y_vals.tolist() if hasattr(y_vals, 'tolist') else list(y_vals)
-        }
+    serializable = serialize_result(raw_result)
 
     return jsonify({'message': 'Configuration applied successfully', 'result': serializable}), 200
 
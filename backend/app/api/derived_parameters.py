@@ -0,0 +1,77 @@
+from flask import jsonify, request, Blueprint
+from flask_jwt_extended import jwt_required
+
+derived_parameters_bp = Blueprint('derived_parameters', __name__)
+
+from ..models.derived_parameter import Derived_Parameter
+from app.services.derived import Derived_Definition
+from app import db
+
+
+def apply_derived(item, data):
+    # Заполняет производный параметр из запроса и проверяет выражение; возвращает текст ошибки или None
+    for field in ('sensor_id', 'parameter_id', 'expression', 'inputs'):
+        if field in data:
+            setattr(item, field, data[field])
+    if not item.sensor_id or not item.parameter_id or not item.expression or not item.inputs:
+        return 'sensor_id, parameter_id, expression and inputs are required'
+    if not isinstance(item.inputs, list):
+        return 'inputs must be a list of {name, sensor_id, parameter_id}'
+    try:
+        definition = Derived_Definition(item.id, (item.sensor_id, item.parameter_id), item.expression, item.inputs)
+    except (KeyError, TypeError):
+        return 'inputs must be a list of {name, sensor_id, parameter_id}'
+    except ValueError as e:
+        return str(e)
+    if (int(item.sensor_id), int(item.parameter_id)) in [key for _, key in definition.inputs]:
+        return 'derived parameter cannot be its own input'
+    return None
+
+
+# Список производных параметров
+@derived_parameters_bp.route('/', methods=['GET'])
+#@jwt_required()
+def show_derived_parameters():
+    return jsonify([item.to_dict() for item in Derived_Parameter.query.order_by(Derived_Parameter.id).all()])
+
+
+# Добавление производного параметра
+@derived_parameters_bp.route('/', methods=['POST'])
+#@jwt_required()
+def add_derived_parameter():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    item = Derived_Parameter()
+    error = apply_derived(item, data)
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(item)
+    db.session.commit()
+    return jsonify(item.to_dict()), 201
+
+
+# Изменение производного параметра
+@derived_parameters_bp.route('/<int:derived_id>', methods=['PUT'])
+#@jwt_required()
+def update_derived_parameter(derived_id):
+    item = Derived_Parameter.query.get_or_404(derived_id)
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    error = apply_derived(item, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    return jsonify(item.to_dict()), 200
+
+
+# Удаление производного параметра (уже вычисленные записи остаются)
+@derived_parameters_bp.route('/<int:derived_id>', methods=['DELETE'])
+#@jwt_required()
+def delete_derived_parameter(derived_id):
+    item = Derived_Parameter.query.get_or_404(derived_id)
+    db.session.delete(item)
+    db.session.commit()
+    return jsonify({'message': 'Derived parameter deleted successfully'}), 200
@@ -0,0 +1,54 @@
+import hmac
+
+from flask import jsonify, request, Blueprint, current_app
+from flask_jwt_extended import jwt_required
+
+edge_bp = Blueprint('edge', __name__)
+
+from app.models.edge_cursor import Edge_Cursor
+from app.services import mqtt_service
+from app.services.edge import apply_batch, unpack_batch, Edge_Batch_Error
+
+
+def _refused():
+    # Узлы подписывают запросы общим токеном EDGE_INGEST_TOKEN. Без него приём с узлов
+    # выключен: иначе писать записи в БД мог бы любой, кто достучался до API
+    token = current_app.config.get('EDGE_INGEST_TOKEN')
+    if not token:
+        return jsonify({'error': 'Edge ingest is disabled: EDGE_INGEST_TOKEN is not set'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Edge-Token', ''), token):
+        return jsonify({'error': 'Invalid edge token'}), 401
+    return None
+
+
+# Приём пачки с граничного узла (тело — JSON, обычно gzip)
+@edge_bp.route('/batches', methods=['POST'])
+def receive_batch():
+    refused = _refused()
+    if refused is not None:
+        return refused
+    try:
+        batch = unpack_batch(request.get_data(), request.headers.get('Content-Encoding') == 'gzip')
+        # Постоянные конфигурации центра дополняются пересланными строками так же, как принятыми по MQTT
+        accepted, cursor = apply_batch(batch, mqtt_service.mqtt_buffer.after_commit)
+    except Edge_Batch_Error as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify({'accepted': accepted, 'cursor': cursor}), 200
+
+
+# Курсоры узла: с какого id продолжать пересылку по каждой таблице
+@edge_bp.route('/cursors/<node_id>', methods=['GET'])
+def show_cursors(node_id):
+    refused = _refused()
+    if refused is not None:
+        return refused
+    cursors = Edge_Cursor.query.filter_by(node_id=node_id).all()
+    return jsonify({cursor.stream: cursor.last_id for cursor in cursors}), 200
+
+
+# Все узлы, которые пересылают данные на этот экземпляр
+@edge_bp.route('/nodes', methods=['GET'])
+#@jwt_required()
+def show_nodes():
+    cursors = Edge_Cursor.query.order_by(Edge_Cursor.node_id, Edge_Cursor.stream).all()
+    return jsonify([cursor.to_dict() for cursor in cursors]), 200
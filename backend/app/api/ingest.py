@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from flask import jsonify, Blueprint, current_app
+from flask_jwt_extended import jwt_required
+
+ingest_bp = Blueprint('ingest', __name__)
+
+from app.services import mqtt_service
+from app.models.ingest_worker import Ingest_Worker
+from app.services.sharding import SHARD_TIMEOUT
+
+
+# Состояние конвейера приёма MQTT: глубина очередей по стадиям
+@ingest_bp.route('/status', methods=['GET'])
+#@jwt_required()
+def show_ingest_status():
+    if mqtt_service.ingest_pipeline is None:
+        return jsonify({'error': 'Ingest is not running'}), 503
+    return jsonify(mqtt_service.ingest_stats()), 200
+
+
+# Процессы шардированного приёма по таблице ingest_workers (все узлы, а не только этот процесс)
+@ingest_bp.route('/workers', methods=['GET'])
+#@jwt_required()
+def show_ingest_workers():
+    timeout = current_app.config.get('INGEST_SHARD_TIMEOUT', SHARD_TIMEOUT)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    workers = Ingest_Worker.query.order_by(Ingest_Worker.worker_id).all()
+    return jsonify([dict(worker.to_dict(), alive=(now - worker.heartbeat_at).total_seconds() <= timeout)
+                    for worker in workers]), 200
@@ -0,0 +1,12 @@
+from flask import Response, Blueprint
+
+metrics_bp = Blueprint('metrics', __name__)
+
+from app.services import mqtt_service  # noqa: F401 — регистрирует сборщик состояния приёма
+from app.services.metrics import metrics, CONTENT_TYPE
+
+
+# Метрики приёма в текстовом формате Prometheus (без авторизации — для сборщика)
+@metrics_bp.route('', methods=['GET'])
+def show_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
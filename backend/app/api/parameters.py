@@ -6,12 +6,22 @@ parameter_bp = Blueprint('parameter', __name__)
 from ..models.parameter import Parameter
 from app import db
 
+
+def apply_retention(parameter, data):
+    # Срок хранения записей параметра; возвращает текст ошибки или None
+    retention_days = data.get('retention_days', parameter.retention_days)
+    if retention_days is not None and (not isinstance(retention_days, int) or retention_days < 0):
+        return 'retention_days must be a non-negative integer or null'
+    parameter.retention_days = retention_days
+    return None
+
+
 @parameter_bp.route('/', methods=['GET'])
 #@jwt_required()
 def show_parameter():
     parameters = Parameter.query.all()
 
-    return jsonify([{'id': parameter.id, 'name': parameter.name, 'unit': parameter.unit} for parameter in parameters])
+    return jsonify([parameter.to_dict() for parameter in parameters])
 
 # Добавление Parameter
 @parameter_bp.route('/add', methods=['POST'])
@@ -25,6 +35,9 @@ def add_sensor():
         return jsonify({'error': 'Parameter already exists'}), 400
 
     new_parameter = Parameter(name=data['name'], unit=data['unit'])
+    error = apply_retention(new_parameter, data)
+    if error:
+        return jsonify({'error': error}), 400
     db.session.add(new_parameter)
     db.session.commit()
     return jsonify(new_parameter.to_dict()), 201
@@ -47,6 +60,10 @@ def update_sensor(parameter_id):
         if 'unit' in data:
             parameter.unit = data['unit']
 
+    error = apply_retention(parameter, data)
+    if error:
+        return jsonify({'error': error}), 400
+
     db.session.commit()
     return jsonify(parameter.to_dict()), 200
 
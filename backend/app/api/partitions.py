@@ -0,0 +1,14 @@
+from flask import jsonify, Blueprint
+from flask_jwt_extended import jwt_required
+
+partitions_bp = Blueprint('partitions', __name__)
+
+from app.services.partitions import partition_manager
+
+
+# Секции sensor_records (PostgreSQL) и настройки обслуживания
+@partitions_bp.route('/', methods=['GET'])
+#@jwt_required()
+def show_partitions():
+    return jsonify({'settings': partition_manager.stats(), 'partitions': partition_manager.list_partitions()}), 200
+
@@ -5,6 +5,11 @@ from datetime import datetime
 sensor_records_bp = Blueprint('sensor_records', __name__)
 
 from ..models.sensor_record import Sensor_Record
+from ..models.series_stat import Series_Stat
+from ..models.sensor_parameter import Sensor_parameter
+from app import db
+from app.services.compression import COMPRESSION_NONE
+from app.services.rollups import rollup_manager
 
 
 @sensor_records_bp.route('/', methods=['GET'])
@@ -39,6 +44,16 @@ def show_sensor_records(sensor_id):
     #                  'sensor_id': sensor_record.sensor.name, 'parameter_id': sensor_record.parameter.name} for sensor_record in sensor_records])
 
 
+@sensor_records_bp.route('/stats/<int:sensor_id>', methods=['GET'])
+@jwt_required()
+def show_sensor_records_stats(sensor_id):
+    # Статистика считается на приёме и после каждого флаша пишется в series_stats —
+    # читаем готовые строки, sensor_records не трогаем
+    rows = Series_Stat.query.filter_by(sensor_id=sensor_id).order_by(Series_Stat.parameter_id).all()
+    return jsonify({'sensor_id': sensor_id, 'since': min((row.started_at for row in rows), default=None),
+                    'parameters': [row.to_dict() for row in rows]}), 200
+
+
 @sensor_records_bp.route('/raw_data/<sensor_id>')
 @jwt_required()
 def show_sensor_records_raw_data(sensor_id):
@@ -46,6 +61,9 @@ def show_sensor_records_raw_data(sensor_id):
     start_datetime_str = request.args.get('start_date')
     end_datetime_str = request.args.get('end_date')
     parameter = request.args.get('parameter')
+    # Бюджет точек: длинный интервал серии отдаётся средними из агрегатов (см. app/services/rollups.py)
+    points = request.args.get('points', type=int)
+    start_datetime = end_datetime = None
 
     # Базовый запрос
     query = Sensor_Record.query.filter(Sensor_Record.sensor_id == sensor_id)
@@ -65,6 +83,20 @@ def show_sensor_records_raw_data(sensor_id):
         except ValueError:
             return jsonify({"error": "Неверный формат end_datetime. Используйте DD.MM.YYYY HH:MM:SS"}), 400
 
+    if points:
+        # Агрегаты ведутся по серии — нужен параметр
+        if not parameter:
+            return jsonify({"error": "points requires parameter"}), 400
+        compression = db.session.execute(
+            db.select(Sensor_parameter.compression)
+              .filter_by(sensor_id=sensor_id, parameter_id=parameter)
+        ).scalar()
+        # У сжатой серии в агрегаты попадают только опорные точки — её отдаём записями, как get_data
+        if not compression or compression == COMPRESSION_NONE:
+            rolled = rollup_manager.read(sensor_id, parameter, points, start=start_datetime, end=end_datetime)
+            if rolled is not None:
+                return jsonify(rolled[1])
+
     # Фильтрация по параметрам
     if parameter:
         query = query.filter(Sensor_Record.parameter_id == parameter)
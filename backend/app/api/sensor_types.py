@@ -5,13 +5,14 @@ sensor_type_bp = Blueprint('sensor-type', __name__)
 
 from ..models.sensor_type import Sensor_type
 from app import db
+from app.services.codecs import CODECS
 
 @sensor_type_bp.route('/', methods=['GET'])
 #@jwt_required()
 def show_sensor_type():
     sensor_types = Sensor_type.query.all()
 
-    return jsonify([{'id': sensor_type.id, 'name': sensor_type.name} for sensor_type in sensor_types])
+    return jsonify([sensor_type.to_dict() for sensor_type in sensor_types])
 
 # Добавление Sensor_type
 @sensor_type_bp.route('/add', methods=['POST'])
@@ -24,7 +25,10 @@ def add_sensor():
     if Sensor_type.query.filter_by(name=data['name']).first():
         return jsonify({'error': 'Sensor_type already exists'}), 400
 
-    new_sensor_type = Sensor_type(name=data['name'])
+    if data.get('payload_format') and data['payload_format'] not in CODECS:
+        return jsonify({'error': f"payload_format must be one of {sorted(CODECS)}"}), 400
+
+    new_sensor_type = Sensor_type(name=data['name'], payload_format=data.get('payload_format'))
     db.session.add(new_sensor_type)
     db.session.commit()
     return jsonify(new_sensor_type.to_dict()), 201
@@ -45,6 +49,11 @@ def update_sensor(sensor_type_id):
             return jsonify({'error': 'name already exists'}), 400
         sensor_type.name = data['name']
 
+    if 'payload_format' in data:
+        if data['payload_format'] and data['payload_format'] not in CODECS:
+            return jsonify({'error': f"payload_format must be one of {sorted(CODECS)}"}), 400
+        sensor_type.payload_format = data['payload_format']
+
     db.session.commit()
     return jsonify(sensor_type.to_dict()), 200
 
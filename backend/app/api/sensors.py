@@ -4,7 +4,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 sensors_bp = Blueprint('sensors', __name__)
 
 from ..models.sensor import Sensor
-from app import db, mqtt
+from ..models.broker import Broker
+from app import db
+from app.services.codecs import CODECS
 
 
 @sensors_bp.route('/', methods=['GET'])
@@ -13,6 +15,7 @@ def show_sensors():
     sensors = Sensor.query.all()
 
     return jsonify([{'id': sensor.id, 'name': sensor.name,'data_source': sensor.data_source,
+                     'payload_format': sensor.payload_format, 'broker_id': sensor.broker_id,
                      'sensor_type_id': sensor.sensor_type.name, 'equipment': sensor.equipment.name} for sensor in sensors])
 
 # Добавление sensor
@@ -27,11 +30,18 @@ def add_sensor():
     if Sensor.query.filter_by(name=data['name']).first():
         return jsonify({'error': 'Sensor already exists'}), 400
 
+    if data.get('payload_format') and data['payload_format'] not in CODECS:
+        return jsonify({'error': f"payload_format must be one of {sorted(CODECS)}"}), 400
+
+    if data.get('broker_id') and not Broker.query.get(data['broker_id']):
+        return jsonify({'error': 'Broker not found'}), 400
+
     new_sensor = Sensor(name=data['name'], data_source=data['data_source'], sensor_type_id=data['sensor_type_id'],
-                        equipment_id=data['equipment_id'])
+                        equipment_id=data['equipment_id'], payload_format=data.get('payload_format'),
+                        broker_id=data.get('broker_id'))
     db.session.add(new_sensor)
     db.session.commit()
-    mqtt.subscribe(new_sensor.data_source)
+    # Подписка обновится сама: topic_router перестраивается после commit
     return jsonify(new_sensor.to_dict()), 201
 
 
@@ -50,16 +60,23 @@ def update_sensor(sensor_id):
             return jsonify({'error': 'name already exists'}), 400
         sensor.name = data['name']
 
-    data_source = sensor.data_source
-    if data_source != data['data_source']:
+    if sensor.data_source != data['data_source']:
         sensor.data_source = data['data_source']
 
     sensor.sensor_type_id = data['sensor_type_id']
     sensor.equipment_id = data['equipment_id']
 
+    if 'payload_format' in data:
+        if data['payload_format'] and data['payload_format'] not in CODECS:
+            return jsonify({'error': f"payload_format must be one of {sorted(CODECS)}"}), 400
+        sensor.payload_format = data['payload_format']
+
+    if 'broker_id' in data:
+        if data['broker_id'] and not Broker.query.get(data['broker_id']):
+            return jsonify({'error': 'Broker not found'}), 400
+        sensor.broker_id = data['broker_id'] or None
+
     db.session.commit()
-    mqtt.unsubscribe(data_source)
-    mqtt.subscribe(sensor.data_source)
     return jsonify(sensor.to_dict()), 200
 
 
@@ -68,9 +85,6 @@ def update_sensor(sensor_id):
 #@jwt_required()
 def delete_sensor(sensor_id):
     sensor = Sensor.query.get_or_404(sensor_id)
-    data_source = sensor.data_source
     db.session.delete(sensor)
     db.session.commit()
-
-    mqtt.unsubscribe(data_source)
     return jsonify({'message': 'Sensor deleted successfully'}), 200
\ No newline at end of file
@@ -2,14 +2,49 @@
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import event
 
-from app import db, cache
-from app.models.sensor import Sensor
+from app import db
 from app.models.sensor_parameter import Sensor_parameter
+from app.services.extraction import STORAGE_RECORDS, STORAGE_WAVEFORM
+from app.services.compression import COMPRESSION_METHODS, COMPRESSION_NONE
 
 sensors_parameters_bp = Blueprint('sensors_parameters', __name__, url_prefix='/api/sensors_parameters')
 
+
+def apply_compression(sp, data):
+    # Настройки сжатия, прореживания и порога аномалий на приёме; возвращает текст ошибки или None
+    method = data.get('compression', sp.compression or COMPRESSION_NONE)
+    if method not in COMPRESSION_METHODS:
+        return 'compression must be one of: ' + ', '.join(COMPRESSION_METHODS)
+    try:
+        tolerance = data.get('compression_tolerance', sp.compression_tolerance)
+        tolerance = float(tolerance) if tolerance is not None else None
+        max_interval = data.get('compression_max_interval', sp.compression_max_interval)
+        max_interval = float(max_interval) if max_interval is not None else None
+    except (TypeError, ValueError):
+        return 'compression_tolerance and compression_max_interval must be numbers'
+    if method != COMPRESSION_NONE and (tolerance is None or tolerance < 0):
+        return 'compression_tolerance must be a non-negative number'
+    if max_interval is not None and max_interval <= 0:
+        return 'compression_max_interval must be positive'
+    decimation = data.get('decimation', sp.decimation or 1)
+    if not isinstance(decimation, int) or decimation < 1:
+        return 'decimation must be a positive integer'
+    try:
+        anomaly_threshold = data.get('anomaly_threshold', sp.anomaly_threshold)
+        anomaly_threshold = float(anomaly_threshold) if anomaly_threshold is not None else None
+    except (TypeError, ValueError):
+        return 'anomaly_threshold must be a number'
+    if anomaly_threshold is not None and anomaly_threshold <= 0:
+        return 'anomaly_threshold must be positive'
+    sp.compression = method
+    sp.compression_tolerance = tolerance
+    sp.compression_max_interval = max_interval
+    sp.decimation = decimation
+    sp.anomaly_threshold = anomaly_threshold
+    return None
+
+
 # Получить все параметры, назначенные датчику
 @sensors_parameters_bp.route('/<int:sensor_id>', methods=['GET'])
 #@jwt_required()
@@ -29,8 +64,15 @@ def add_sensor_parameter(sensor_id, parameter_id):
     if Sensor_parameter.query.filter_by(sensor_id=sensor_id, parameter_id=parameter_id).first():
         return jsonify({'message': 'Parameter already assigned'}), 400
 
+    storage = data.get('storage', STORAGE_RECORDS)
+    if storage not in (STORAGE_RECORDS, STORAGE_WAVEFORM):
+        return jsonify({'error': 'storage must be records or waveform'}), 400
+
     key = data['key']
-    param = Sensor_parameter(sensor_id=sensor_id, parameter_id=parameter_id, key=key)
+    param = Sensor_parameter(sensor_id=sensor_id, parameter_id=parameter_id, key=key, storage=storage)
+    error = apply_compression(param, data)
+    if error:
+        return jsonify({'error': error}), 400
     db.session.add(param)
     db.session.commit()
     return jsonify(param.to_dict()), 201
@@ -47,6 +89,16 @@ def update_sensor_parameter(sensor_id, parameter_id):
     if not sp:
         return jsonify({'message': 'Not found'}), 404
 
+    if 'storage' in data:
+        if data['storage'] not in (STORAGE_RECORDS, STORAGE_WAVEFORM):
+            return jsonify({'error': 'storage must be records or waveform'}), 400
+        sp.storage = data['storage']
+
+    error = apply_compression(sp, data)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+
     sp.key = data['key']
     db.session.commit()
     return jsonify(sp.to_dict()), 200
@@ -62,17 +114,3 @@ def delete_sensor_parameter(sensor_id, parameter_id):
     db.session.delete(param)
     db.session.commit()
     return jsonify({'message': 'Deleted successfully'}), 200
-
-# Необходимо для MQTT !!!
-# Функция для сброса кэша при изменениях Sensor_parameter
-def clear_sensor_cache(mapper, connection, target):
-    sensor = db.session.get(Sensor, target.sensor_id)
-    if sensor:
-        cache_key = f"sensor_params_{sensor.data_source}"
-        cache.delete(cache_key)
-        print(f"Cleared cache for {cache_key}")
-
-# Регистрируем обработчики для всех значимых событий
-event.listen(Sensor_parameter, 'after_insert', clear_sensor_cache)
-event.listen(Sensor_parameter, 'after_update', clear_sensor_cache)
-event.listen(Sensor_parameter, 'after_delete', clear_sensor_cache)
@@ -1,19 +1,68 @@
 # backend/app/core/block_processor.py
 
 import json
-from typing import Dict, Any, List, Optional
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+import pytz
+
 from app.algorithms.algorithms import execute_function
 from ..models.sensor_record import Sensor_Record
+from ..models.waveform_frame import Waveform_Frame
+from ..models.sensor_parameter import Sensor_parameter
+from app.services.compression import COMPRESSION_NONE, reconstruct_segments
+from app.services.rollups import rollup_manager, naive_utc
 from app import db
 
+# /apply читает серии источников с этого момента (время UTC, формат %Y-%m-%dT%H:%M:%S.%fZ)
+APPLY_LAST_UPDATE = '2024-12-12T00:00:00.461Z'
+
+
+def apply_last_update():
+    # Convert to Moscow time (UTC+3)
+    timestamp_utc = pytz.utc.localize(datetime.strptime(APPLY_LAST_UPDATE, '%Y-%m-%dT%H:%M:%S.%fZ'))
+    return timestamp_utc.astimezone(pytz.timezone('Europe/Moscow'))
+
+
+def source_mode(parameters: Dict[str, Any]) -> str:
+    # mode=waveform — отсчёты из кадров формы сигнала, иначе записи sensor_records
+    return 'waveform' if parameters.get('mode') == 'waveform' else 'records'
+
+
+def feeds_charts_only(config: Dict[str, Any], block_id: str) -> bool:
+    # Все выходы блока — графики: для отрисовки хватает средних по интервалам
+    blocks = config.get('blocks') or {}
+    targets = [c.get('target') for c in config.get('connections') or [] if c.get('source') == block_id]
+    return bool(targets) and all((blocks.get(target) or {}).get('type') == 'chart' for target in targets)
+
+
+def source_points(parameters: Dict[str, Any], charts_only: bool = False) -> Optional[int]:
+    # points — бюджет точек источника (0 — все записи). Не задан — ROLLUP_POINT_BUDGET только
+    # у источников одних графиков: функциям (spectrum и т.п.) нужны исходные отсчёты
+    points = parameters.get('points')
+    if points not in (None, ''):
+        try:
+            return int(points)
+        except (TypeError, ValueError):
+            pass
+    return rollup_manager.point_budget if charts_only else None
+
+
 class Block_Processor:
-    def __init__(self, config: Dict[str, Any], last_update: Any = -1):
+    def __init__(self, config: Dict[str, Any], last_update: Any = -1,
+                 sources: Optional[Callable[[int, int, str, Optional[int]], tuple]] = None):
         self.config = config
         self.blocks = config.get('blocks', {})
         self.connections = config.get('connections', [])
         self.values_y: Dict[str, Any] = {}
         self.values_x: Dict[str, Any] = {}
+        # Частота дискретизации результата блока (известна для кадров формы сигнала)
+        self.sample_rates: Dict[str, float] = {}
         self.last_update = last_update
+        # Источник данных вместо БД: (sensor_id, parameter_id, mode, points) → (x, y, частота или None).
+        # Используется постоянными конфигурациями, серии которых уже лежат в памяти
+        self.sources = sources
 
     def process(self) -> Dict[str, Dict[str, List[Any]]]:
         # Только источники с выбранным parameter_id
@@ -64,14 +113,30 @@ class Block_Processor:
             except (TypeError, ValueError):
                 return [], []
 
+            mode = source_mode(block['parameters'])
+            points = source_points(block['parameters'], feeds_charts_only(self.config, block_id)) \
+                if mode == 'records' else None
+
+            if self.sources is not None:
+                x_values, y_values, rate = self.sources(sid, pid, mode, points)
+                if rate:
+                    self.sample_rates[block_id] = rate
+                return x_values, y_values
+
+            if mode == 'waveform':
+                x_values, y_values, rate = get_waveform(sid, pid, self.last_update)
+                if rate:
+                    self.sample_rates[block_id] = rate
+                return x_values, y_values
+
             if self.last_update == -1:
-                return get_data(sid, pid)
-            return get_data(sid, pid, self.last_update)
+                return get_data(sid, pid, points=points)
+            return get_data(sid, pid, self.last_update, points)
 
         elif block['type'] == 'function':
             x_in, y_in = self._get_input_value(block_id)
             func_name = block['parameters'].get('function')
-            return execute_function(func_name, x_in, y_in)
+            return execute_function(func_name, x_in, y_in, fs=self._get_input_rate(block_id))
 
         elif block['type'] == 'chart':
             return self._get_input_value(block_id)
@@ -86,11 +151,48 @@ class Block_Processor:
         src = incoming[0]['source']
         return self.values_x.get(src, []), self.values_y.get(src, [])
 
-def get_data(sensor_id: int, parameter_id: int, last_update: Any = -1):
+    def _get_input_rate(self, block_id: str) -> Optional[float]:
+        incoming = [c for c in self.connections if c['target'] == block_id]
+        if not incoming:
+            return None
+        return self.sample_rates.get(incoming[0]['source'])
+
+def serialize_result(raw_result: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, list]]:
+    # Преобразуем numpy.ndarray в списки, чтобы JSON-сериализация прошла успешно
+    serializable = {}
+    for block_id, data in raw_result.items():
+        x_vals = data.get('x_values', [])
+        y_vals = data.get('y_values', [])
+        serializable[block_id] = {
+            'x_values': x_vals.tolist() if hasattr(x_vals, 'tolist') else list(x_vals),
+            'y_values': y_vals.tolist() if hasattr(y_vals, 'tolist') else list(y_vals)
+        }
+    return serializable
+
+def get_data(sensor_id: int, parameter_id: int, last_update: Any = -1, points: Optional[int] = None):
     """
     Возвращает timestamp и value из sensor_records.
     Если last_update != -1, возвращаем только новые записи.
+    Для серий со сжатием на приёме возвращается восстановленный ряд (см. reconstruct_segments).
+    points — потолок числа точек (None или 0 — все записи): если записей больше points,
+    возвращаются агрегаты самого мелкого разрешения (1 с / 1 мин / 1 ч), которое укладывается
+    в бюджет, — начала интервалов и средние значения. Бюджет задаёт вызывающий (см. source_points).
+    last_update с поясом (как его передаёт /apply) приводится к времени записей — UTC без пояса.
     """
+    if last_update != -1:
+        last_update = naive_utc(last_update)
+    compression = db.session.execute(
+        db.select(Sensor_parameter.compression)
+          .filter_by(sensor_id=sensor_id, parameter_id=parameter_id)
+    ).scalar()
+    compressed = compression and compression != COMPRESSION_NONE
+    if points and not compressed:
+        # У сжатой серии в агрегаты попадают только опорные точки — её читаем по записям
+        rolled = rollup_manager.read(sensor_id, parameter_id, points,
+                                     after=None if last_update == -1 else last_update)
+        if rolled is not None:
+            return rolled
+
     if last_update == -1:
         rows = db.session.execute(
             db.select(Sensor_Record.timestamp, Sensor_Record.value)
@@ -109,5 +211,65 @@ def get_data(sensor_id: int, parameter_id: int, last_update: Any = -1):
             .all()
 
     timestamps = [r.timestamp for r in rows]
-    values     = [float(r.value) for r in rows]
+    values     = [r.value for r in rows]
+
+    # Сжатая на приёме серия хранит только опорные точки — восстанавливаем линейные участки
+    if compressed and timestamps:
+        if last_update != -1:
+            # Участок между последней уже показанной опорной точкой и первой новой
+            anchor = db.session.execute(
+                db.select(Sensor_Record.timestamp, Sensor_Record.value)
+                  .filter(Sensor_Record.sensor_id == sensor_id,
+                          Sensor_Record.parameter_id == parameter_id,
+                          Sensor_Record.timestamp <= last_update)
+                  .order_by(Sensor_Record.timestamp.desc())
+                  .limit(1)
+            ).first()
+            if anchor is not None:
+                timestamps.insert(0, anchor.timestamp)
+                values.insert(0, anchor.value)
+        timestamps, values = reconstruct_segments(timestamps, values)
+        if last_update != -1:
+            new = [i for i, t in enumerate(timestamps) if t > last_update]
+            timestamps = [timestamps[i] for i in new]
+            values = [values[i] for i in new]
     return timestamps, values
+
+def get_waveform(sensor_id: int, parameter_id: int, last_update: Any = -1):
+    """
+    Возвращает отсчёты кадров формы сигнала одним массивом NumPy:
+    x — секунды от начала первого кадра серии, y — значения, и частоту дискретизации.
+    Если last_update != -1, возвращаются только новые кадры, но x по-прежнему отсчитывается
+    от начала серии — их можно дописать к уже полученным.
+    Кадры читаются как np.frombuffer (без копирования и без Python-объекта на отсчёт)
+    и один раз копируются в заранее выделенный общий массив.
+    """
+    if last_update != -1:
+        last_update = naive_utc(last_update)
+    query = db.select(Waveform_Frame.start_time, Waveform_Frame.sample_rate, Waveform_Frame.sample_count,
+                      Waveform_Frame.dtype, Waveform_Frame.samples) \
+        .filter_by(sensor_id=sensor_id, parameter_id=parameter_id)
+    if last_update != -1:
+        query = query.filter(Waveform_Frame.start_time > last_update)
+    rows = db.session.execute(query.order_by(Waveform_Frame.start_time)).all()
+    if not rows:
+        return np.array([]), np.array([]), None
+
+    total = sum(row.sample_count for row in rows)
+    y_values = np.empty(total, dtype=np.float64)
+    x_values = np.empty(total, dtype=np.float64)
+    origin = rows[0].start_time
+    if last_update != -1:
+        origin = db.session.execute(
+            db.select(db.func.min(Waveform_Frame.start_time))
+              .filter_by(sensor_id=sensor_id, parameter_id=parameter_id)
+        ).scalar()
+    position = 0
+    for row in rows:
+        samples = np.frombuffer(row.samples, dtype=row.dtype, count=row.sample_count)
+        end = position + row.sample_count
+        y_values[position:end] = samples
+        offset = (row.start_time - origin).total_seconds()
+        x_values[position:end] = offset + np.arange(row.sample_count) / row.sample_rate
+        position = end
+    return x_values, y_values, rows[-1].sample_rate
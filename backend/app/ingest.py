@@ -0,0 +1,120 @@
+# backend/app/ingest.py
+#
+# Отдельный процесс приёма MQTT: подписки, конвейер декодирования и запись в БД,
+# без HTTP. Веб-процессы в этом случае запускаются с APP_MODE=web и к MQTT не подключаются.
+#
+# Запуск из каталога backend:
+#   python -m app.ingest
+#   APP_MODE=ingest flask --app app ingest
+#
+# Без шардирования (INGEST_SHARD_MODE=none) лидер приёма один: остальные процессы
+# ждут блокировку INGEST_LEADER_LOCK в резерве и подхватывают приём, когда лидер уходит.
+
+import signal
+import sys
+from threading import Event, Thread
+
+from app.services import mqtt_service
+from app.services.leader import make_leader_lock, LEADER_RETRY
+from app.services.metrics import start_http_server
+from app.services.sharding import SHARD_NONE
+
+APP_MODE_ALL = 'all'  # Веб и приём в одном процессе (как раньше)
+APP_MODE_WEB = 'web'  # Только HTTP, без подключения к MQTT
+APP_MODE_INGEST = 'ingest'  # Только приём
+APP_MODES = (APP_MODE_ALL, APP_MODE_WEB, APP_MODE_INGEST)
+
+leader_lock = None  # Удерживаемая блокировка лидера (файл закрывается вместе с объектом)
+
+
+def _leader_lock(app):
+    # В шардированном режиме процессов приёма несколько по замыслу — лидер не нужен
+    if app.config.get('INGEST_SHARD_MODE', SHARD_NONE) != SHARD_NONE:
+        return None
+    return make_leader_lock(app)
+
+
+def _wait_for_leadership(lock, stopped: Event, retry: float) -> bool:
+    announced = False
+    while not stopped.is_set():
+        try:
+            if lock.acquire():
+                print(f"Ingest leader: {lock.describe()}")
+                return True
+        except Exception as e:
+            print(f"Ingest leader lock failed: {e}")
+        if not announced:
+            print(f"Ingest standby: {lock.describe()} is held by another process")
+            announced = True
+        stopped.wait(retry)
+    return False
+
+
+def run_ingest(app) -> int:
+    """Приём до SIGINT / SIGTERM; код возврата 1 — потеряна блокировка лидера."""
+    stopped = Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopped.set())
+    retry = app.config.get('INGEST_LEADER_RETRY', LEADER_RETRY)
+    # HTTP здесь нет: метрики отдаёт свой сервер, в резерве — с cv_ingest_running 0
+    server = None
+    if app.config.get('INGEST_METRICS_PORT'):
+        server = start_http_server(app.config['INGEST_METRICS_PORT'])
+
+    lock = _leader_lock(app)
+    if lock is not None and not _wait_for_leadership(lock, stopped, retry):
+        if server is not None:
+            server.shutdown()
+        return 0
+
+    code = 0
+    mqtt_service.init_app(app)
+    try:
+        while not stopped.wait(retry):
+            if lock is not None and not lock.check():
+                # Лидером уже может быть другой процесс: выходим, перезапуск — дело супервизора
+                print("Ingest leader lock lost, stopping")
+                code = 1
+                break
+    finally:
+        mqtt_service.shutdown()
+        if lock is not None:
+            lock.release()
+        if server is not None:
+            server.shutdown()
+    return code
+
+
+def start_ingest(app):
+    """
+    Приём в фоне веб-процесса (APP_MODE=all). Под многопроцессным WSGI-сервером
+    принимает только процесс-лидер, остальные обслуживают HTTP и ждут в резерве.
+    """
+    global leader_lock
+    lock = leader_lock = _leader_lock(app)
+    if lock is None:
+        mqtt_service.init_app(app)
+        return
+    try:
+        if lock.acquire():
+            print(f"Ingest leader: {lock.describe()}")
+            mqtt_service.init_app(app)
+            return
+    except Exception as e:
+        print(f"Ingest leader lock failed: {e}")
+
+    def standby():
+        if _wait_for_leadership(lock, Event(), app.config.get('INGEST_LEADER_RETRY', LEADER_RETRY)):
+            mqtt_service.init_app(app)
+
+    Thread(target=standby, name="ingest-standby", daemon=True).start()
+
+
+def main():
+    from app import create_app
+    app = create_app(mode=APP_MODE_INGEST)
+    return run_ingest(app)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
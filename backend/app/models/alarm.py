@@ -0,0 +1,73 @@
+from app import db
+
+
+class Alarm_Rule(db.Model):
+    """
+    Правило тревоги для серии (sensor_id, parameter_id), проверяемое на приёме.
+    kind: high — значение выше limit, low — ниже limit, rate — модуль скорости
+    изменения (ед./сек) выше limit. Тревога поднимается, когда условие нарушено
+    в n из последних m отсчётов, и снимается, когда значение вернулось за limit
+    с запасом hysteresis.
+    """
+    __tablename__ = "alarm_rules"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(100))
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), nullable=False)
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    limit = db.Column(db.Float, nullable=False)
+    hysteresis = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    n = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    m = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    severity = db.Column(db.String(10), nullable=False, default='warning', server_default='warning')
+    enabled = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+
+    events = db.relationship("Alarm_Event", backref="rule", passive_deletes=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'kind': self.kind,
+            'limit': self.limit,
+            'hysteresis': self.hysteresis,
+            'n': self.n,
+            'm': self.m,
+            'severity': self.severity,
+            'enabled': self.enabled
+    }
+
+
+class Alarm_Event(db.Model):
+    """Событие тревоги: поднята (raised) или снята (cleared) в момент отсчёта timestamp."""
+    __tablename__ = "alarm_events"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey("alarm_rules.id", ondelete='SET NULL'))
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+    state = db.Column(db.String(10), nullable=False)
+    severity = db.Column(db.String(10))
+    timestamp = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index('ix_alarm_events_series_time', 'sensor_id', 'parameter_id', 'timestamp'),
+        # Последнее событие правила — для активных тревог
+        db.Index('ix_alarm_events_rule', 'rule_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rule_id': self.rule_id,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'state': self.state,
+            'severity': self.severity,
+            'timestamp': self.timestamp,
+            'value': self.value
+    }
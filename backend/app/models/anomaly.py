@@ -0,0 +1,32 @@
+from app import db
+
+
+class Anomaly(db.Model):
+    """
+    Отсчёт, признанный аномалией на приёме: значение и его оценки относительно
+    базы серии — z по EWMA (ewma_score) и робастная z по медиане/MAD (robust_score).
+    """
+    __tablename__ = "anomalies"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+    timestamp = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float)
+    ewma_score = db.Column(db.Float)
+    robust_score = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index('ix_anomalies_series_time', 'sensor_id', 'parameter_id', 'timestamp'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'timestamp': self.timestamp,
+            'value': self.value,
+            'ewma_score': self.ewma_score,
+            'robust_score': self.robust_score
+    }
@@ -0,0 +1,31 @@
+from app import db
+
+
+class Broker(db.Model):
+    """
+    Дополнительный брокер MQTT (например, брокер цеха). Датчики с broker_id
+    читаются через отдельное подключение к нему; датчики без broker_id —
+    через брокер по умолчанию из MQTT_BROKER_URL / MQTT_BROKER_PORT.
+    """
+    __tablename__ = "brokers"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    host = db.Column(db.String(255), nullable=False)
+    port = db.Column(db.Integer, nullable=False, default=1883, server_default='1883')
+    username = db.Column(db.String(100))
+    password = db.Column(db.String(255))
+    keepalive = db.Column(db.Integer, nullable=False, default=60, server_default='60')
+
+    sensors = db.relationship("Sensor", backref="broker", passive_deletes=True)
+
+    def to_dict(self):
+        # Пароль наружу не отдаём
+        return {
+            'id': self.id,
+            'name': self.name,
+            'host': self.host,
+            'port': self.port,
+            'username': self.username,
+            'keepalive': self.keepalive
+    }
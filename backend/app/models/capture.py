@@ -0,0 +1,67 @@
+from app import db
+
+
+class Capture_Trigger(db.Model):
+    """
+    Условие захвата: когда значение источника (source_sensor_id, source_parameter_id,
+    по умолчанию — та же серия) выполняет условие, серия (sensor_id, parameter_id)
+    сохраняется с полным разрешением за pre_seconds до и post_seconds после срабатывания.
+    """
+    __tablename__ = "capture_triggers"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), nullable=False)
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'), nullable=False)
+    source_sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
+    source_parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+    # above / below — порог по значению, rate — порог по модулю скорости изменения (ед./сек)
+    condition = db.Column(db.String(10), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    pre_seconds = db.Column(db.Float, nullable=False, default=10)
+    post_seconds = db.Column(db.Float, nullable=False, default=10)
+
+    captures = db.relationship("Capture", backref="trigger", passive_deletes=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'source_sensor_id': self.source_sensor_id,
+            'source_parameter_id': self.source_parameter_id,
+            'condition': self.condition,
+            'threshold': self.threshold,
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds
+    }
+
+
+class Capture(db.Model):
+    """
+    Сохранённый захват: интервал, за который записи серии в sensor_records
+    лежат с полным разрешением, и момент срабатывания условия.
+    """
+    __tablename__ = "captures"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    trigger_id = db.Column(db.Integer, db.ForeignKey("capture_triggers.id", ondelete='SET NULL'))
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+    trigger_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_captures_series_time', 'sensor_id', 'parameter_id', 'start_time'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'trigger_id': self.trigger_id,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'trigger_time': self.trigger_time,
+            'start_time': self.start_time,
+            'end_time': self.end_time
+    }
@@ -11,12 +11,15 @@ class Configuration(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
     config = db.Column(JSONB, nullable=False)
+    # Постоянная конфигурация: граф пересчитывается на приёме, /apply отдаёт готовый результат
+    standing = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     def to_dict(self):
         return {
             'user_id': self.user_id,
             'equipment_id': self.equipment_id,
             'config': self.config,
+            'standing': self.standing,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
\ No newline at end of file
@@ -0,0 +1,26 @@
+from app import db
+
+
+class Derived_Parameter(db.Model):
+    """
+    Производный (виртуальный) параметр: серия (sensor_id, parameter_id), значения
+    которой вычисляются на приёме выражением над другими сериями и пишутся
+    в sensor_records как обычные записи.
+    inputs — список {"name": ..., "sensor_id": ..., "parameter_id": ...}; первый вход задаёт моменты времени.
+    """
+    __tablename__ = "derived_parameters"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), nullable=False)
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'), nullable=False)
+    expression = db.Column(db.String(255), nullable=False)
+    inputs = db.Column(db.JSON, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'expression': self.expression,
+            'inputs': self.inputs
+    }
@@ -0,0 +1,26 @@
+from app import db
+
+
+class Edge_Cursor(db.Model):
+    """
+    Курсор пересылки с граничного узла на центральном экземпляре: до какого id
+    локальной таблицы узла (stream) строки уже приняты. Обновляется в одной
+    транзакции с записью пачки, поэтому повторная отправка после обрыва связи
+    не дублирует строки, а узел после перезапуска продолжает с этого места.
+    """
+    __tablename__ = "edge_cursors"
+
+    node_id = db.Column(db.String(100), primary_key=True)
+    stream = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    rows = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'node_id': self.node_id,
+            'stream': self.stream,
+            'last_id': self.last_id,
+            'rows': self.rows,
+            'updated_at': self.updated_at
+    }
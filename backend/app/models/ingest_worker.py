@@ -0,0 +1,27 @@
+from app import db
+
+
+class Ingest_Worker(db.Model):
+    """
+    Живой процесс приёма в шардированном режиме. Каждый процесс обновляет
+    heartbeat_at (UTC); по списку живых процессов все они одинаково строят кольцо
+    согласованного хеширования и делят между собой топики датчиков.
+    """
+    __tablename__ = "ingest_workers"
+
+    worker_id = db.Column(db.String(100), primary_key=True)
+    hostname = db.Column(db.String(255))
+    pid = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, index=True)
+    topics = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def to_dict(self):
+        return {
+            'worker_id': self.worker_id,
+            'hostname': self.hostname,
+            'pid': self.pid,
+            'started_at': self.started_at,
+            'heartbeat_at': self.heartbeat_at,
+            'topics': self.topics
+    }
@@ -7,13 +7,18 @@ class Parameter(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(30))
     unit = db.Column(db.String(30))
+    # Срок хранения записей, дней: пусто — SENSOR_RECORDS_RETENTION_DAYS, 0 — бессрочно.
+    # На PostgreSQL истёкшие записи удаляются целыми секциями (app/services/partitions.py)
+    retention_days = db.Column(db.Integer)
     # использовать отношения, чтобы связать объекты без явного указания ID
     sensor_parameter = db.relationship("Sensor_parameter", backref="parameter", passive_deletes='RESTRICT')
     parameter_record = db.relationship("Sensor_Record", backref="parameter", passive_deletes='RESTRICT')
+    parameter_waveform = db.relationship("Waveform_Frame", backref="parameter", passive_deletes='RESTRICT')
 
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
-            'unit': self.unit
+            'unit': self.unit,
+            'retention_days': self.retention_days
     }
\ No newline at end of file
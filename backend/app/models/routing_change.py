@@ -0,0 +1,20 @@
+from app import db
+
+
+class Routing_Change(db.Model):
+    """
+    Отметка изменения настроек, от которых зависит таблица маршрутизации приёма
+    (датчики, их параметры, условия захвата, тревоги, конфигурации, брокеры).
+    Строка добавляется в той же транзакции, что и само изменение; процессы приёма
+    сравнивают наибольший id со своим и перестраивают таблицу, если он вырос.
+    """
+    __tablename__ = "routing_changes"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'changed_at': self.changed_at
+    }
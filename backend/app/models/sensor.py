@@ -7,18 +7,25 @@ class Sensor(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(30))
     data_source = db.Column(db.String(255))
+    # Формат сообщений: json, msgpack, cbor, float_frame; NULL — как у типа датчика
+    payload_format = db.Column(db.String(20))
+    # Брокер MQTT, через который приходят сообщения; NULL — брокер по умолчанию (MQTT_BROKER_URL)
+    broker_id = db.Column(db.Integer, db.ForeignKey("brokers.id", ondelete='RESTRICT'))
 
     sensor_type_id = db.Column(db.Integer, db.ForeignKey("sensor_types.id", ondelete='RESTRICT'))
     equipment_id = db.Column(db.Integer, db.ForeignKey("equipment.id", ondelete='RESTRICT'))
     #использовать отношения, чтобы связать объекты без явного указания ID
     sensor_parameter = db.relationship("Sensor_parameter", backref="sensor",cascade='all, delete-orphan')
     sensor_record = db.relationship("Sensor_Record", backref="sensor",cascade='all, delete-orphan')
+    waveform_frame = db.relationship("Waveform_Frame", backref="sensor", cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'data_source': self.data_source,
+            'payload_format': self.payload_format,
+            'broker_id': self.broker_id,
             'sensor_type_id': self.sensor_type_id,
             'equipment_id': self.equipment_id
     }
\ No newline at end of file
@@ -8,11 +8,29 @@ class Sensor_parameter(db.Model):
     sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
     parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
     key = db.Column(db.String(100))
+    # Как хранить значения: records — строка на отсчёт в sensor_records,
+    # waveform — кадрами сырой формы сигнала в waveform_frames
+    storage = db.Column(db.String(10), nullable=False, default='records', server_default='records')
+    # Сжатие на приёме: none, deadband или swinging_door; допуск — в единицах параметра,
+    # max_interval — не реже скольких секунд сохранять точку, даже если значение не менялось
+    compression = db.Column(db.String(20), nullable=False, default='none', server_default='none')
+    compression_tolerance = db.Column(db.Float)
+    compression_max_interval = db.Column(db.Float)
+    # Прореживание: сохранять каждый N-й отсчёт (1 — все); вокруг событий захвата — все
+    decimation = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Порог обнаружения аномалий по модулю z-оценки; пусто — серия не проверяется
+    anomaly_threshold = db.Column(db.Float)
 
     def to_dict(self):
         return {
             'id': self.id,
             'sensor_id': self.sensor_id,
             'parameter_id': self.parameter_id,
-            'key': self.key
+            'key': self.key,
+            'storage': self.storage,
+            'compression': self.compression,
+            'compression_tolerance': self.compression_tolerance,
+            'compression_max_interval': self.compression_max_interval,
+            'decimation': self.decimation,
+            'anomaly_threshold': self.anomaly_threshold
     }
\ No newline at end of file
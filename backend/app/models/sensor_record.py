@@ -1,18 +1,41 @@
 from datetime import datetime
 
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import PrimaryKeyConstraint
+
 from app import db
 
+# Ключ серии — по нему читают все запросы (датчик, параметр, интервал времени)
+SERIES_KEY = ('sensor_id', 'parameter_id', 'timestamp')
+
+
+def _not_postgresql(ddl, target, bind, **kw):
+    return kw['dialect'].name != 'postgresql'
+
 
 class Sensor_Record(db.Model):
     #__bind_key__ = 'postgre_db'  # Указываем бинд из SQLALCHEMY_BINDS
     __tablename__ = "sensor_records"
 
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    value = db.Column(db.DECIMAL(precision=10, scale=2))
+    # Столбцы идут без выравнивающих пропусков: 8 + 8 + 8 + 4 + 4 байта на строку.
+    # id — BIGINT (на SQLite — rowid): не ключ серии, а курсор пересылки граничных узлов
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    value = db.Column(db.Double)
 
-    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
-    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), nullable=False)
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'), nullable=False)
+
+    # Одно значение на серию в момент времени: повторные доставки MQTT не дублируют строки.
+    # На PostgreSQL ключ серии — первичный ключ с value в листьях индекса (index-only scan
+    # по диапазону времени), он же покрывает ключ секционирования: LIST по параметру,
+    # внутри — RANGE по времени (секции ведёт app/services/partitions.py)
+    __table_args__ = (
+        db.UniqueConstraint(*SERIES_KEY, name='uq_sensor_records_series_time').ddl_if(callable_=_not_postgresql),
+        db.Index('ix_sensor_records_id', 'id').ddl_if(dialect='postgresql'),
+        {'postgresql_partition_by': 'LIST (parameter_id)',
+         'info': {'postgresql_primary_key': SERIES_KEY, 'postgresql_include': ('value',)}},
+    )
 
     def to_dict(self):
         return {
@@ -22,4 +45,17 @@ class Sensor_Record(db.Model):
             'sensor_id': self.sensor_id,
             'parameter_id': self.parameter_id
 
-    }
\ No newline at end of file
+    }
+
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def _series_primary_key(constraint, compiler, **kw):
+    # ORM по-прежнему опознаёт строки по id; в БД первичный ключ заменяется ключом из info
+    key = constraint.table.info.get('postgresql_primary_key')
+    if not key:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    sql = f"PRIMARY KEY ({', '.join(key)})"
+    include = constraint.table.info.get('postgresql_include')
+    if include:
+        sql += f" INCLUDE ({', '.join(include)})"
+    return sql
@@ -0,0 +1,77 @@
+from sqlalchemy.orm import declared_attr
+
+from app import db
+
+
+class Rollup_Columns:
+    """
+    Агрегаты серии за интервал (bucket — его начало): число значений, минимум, максимум,
+    среднее и сумма квадратов (дисперсия = sum_squares / count - mean²).
+    Таблицы трёх разрешений ведёт app/services/rollups.py при каждой записи пачки.
+    """
+    bucket = db.Column(db.DateTime, nullable=False)
+    min = db.Column(db.Double, nullable=False)
+    max = db.Column(db.Double, nullable=False)
+    mean = db.Column(db.Double, nullable=False)
+    sum_squares = db.Column(db.Double, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    @declared_attr
+    def sensor_id(cls):
+        return db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), nullable=False)
+
+    @declared_attr
+    def parameter_id(cls):
+        return db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='CASCADE'), nullable=False)
+
+    @declared_attr
+    def __table_args__(cls):
+        # Тот же порядок, что у ключа серии sensor_records: чтение диапазона — по индексу
+        return (db.PrimaryKeyConstraint('sensor_id', 'parameter_id', 'bucket'),)
+
+    def to_dict(self):
+        return {
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'bucket': self.bucket,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'sum_squares': self.sum_squares
+    }
+
+
+class Sensor_Rollup_1s(Rollup_Columns, db.Model):
+    __tablename__ = "sensor_rollups_1s"
+
+
+class Sensor_Rollup_1m(Rollup_Columns, db.Model):
+    __tablename__ = "sensor_rollups_1m"
+
+
+class Sensor_Rollup_1h(Rollup_Columns, db.Model):
+    __tablename__ = "sensor_rollups_1h"
+
+
+class Rollup_Watermark(db.Model):
+    """
+    Отметка серии: до какого времени записи уже учтены в агрегатах. Записи новее неё
+    добавляются к агрегатам, более старые (запоздавшие, повторные) пересчитываются из
+    sensor_records по затронутым интервалам. complete — агрегаты покрывают все записи
+    серии; пока это не так (данные до включения агрегатов), чтение идёт по записям.
+    """
+    __tablename__ = "rollup_watermarks"
+
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'), primary_key=True)
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='CASCADE'), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=False)
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id,
+            'watermark': self.watermark,
+            'complete': self.complete
+    }
@@ -6,10 +6,13 @@ class Sensor_type(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(30))
+    # Формат сообщений датчиков этого типа по умолчанию (NULL — json)
+    payload_format = db.Column(db.String(20))
     sensors= db.relationship("Sensor", backref="sensor_type", passive_deletes='RESTRICT')
 
     def to_dict(self):
         return {
             'id': self.id,
-            'name': self.name
+            'name': self.name,
+            'payload_format': self.payload_format
     }
\ No newline at end of file
@@ -0,0 +1,43 @@
+import math
+
+from app import db
+
+
+class Series_Stat(db.Model):
+    """
+    Снимок текущей статистики серии (sensor_id, parameter_id), которую процесс приёма
+    ведёт в памяти (app/services/running_stats.py) и после каждого флаша пишет сюда —
+    только изменившиеся серии. API читает статистику отсюда в любом процессе.
+    started_at — запуск процесса приёма, с которого идёт счёт.
+    """
+    __tablename__ = "series_stats"
+
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), primary_key=True)
+    parameter_id = db.Column(db.Integer, db.ForeignKey('parameters.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.Float, nullable=False)
+    variance = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    first_time = db.Column(db.DateTime)
+    last_time = db.Column(db.DateTime)
+    last_value = db.Column(db.Float)
+    ewm = db.Column(db.JSON, nullable=False)  # {горизонт, сек: {mean, std}}
+    started_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'parameter_id': self.parameter_id,
+            'count': self.count,
+            'mean': self.mean,
+            'variance': self.variance,
+            'std': math.sqrt(self.variance),
+            'min': self.min,
+            'max': self.max,
+            'first_time': self.first_time,
+            'last_time': self.last_time,
+            'last_value': self.last_value,
+            'ewm': self.ewm,
+            'updated_at': self.updated_at
+    }
@@ -0,0 +1,22 @@
+from app import db
+
+
+class Standing_Result(db.Model):
+    """
+    Готовый ответ /apply постоянной конфигурации: его пишет процесс приёма после
+    пересчёта графа, а отдаёт любой процесс API. materialized_at ставится временем
+    БД (как updated_at конфигурации) — ответ старше изменения конфигурации не отдаётся.
+    """
+    __tablename__ = "standing_results"
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    equipment_id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    materialized_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'equipment_id': self.equipment_id,
+            'materialized_at': self.materialized_at.isoformat()
+    }
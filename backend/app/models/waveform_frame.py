@@ -0,0 +1,35 @@
+from app import db
+
+
+class Waveform_Frame(db.Model):
+    """
+    Кадр сырой формы сигнала: непрерывный блок равномерных отсчётов одного параметра.
+    Отсчёты хранятся одним бинарным полем (массив NumPy в байтах little-endian),
+    а не строкой на значение, как в sensor_records.
+    """
+    __tablename__ = "waveform_frames"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    sample_rate = db.Column(db.Float, nullable=False)  # Гц
+    sample_count = db.Column(db.Integer, nullable=False)
+    dtype = db.Column(db.String(8), nullable=False)  # '<f4' или '<f8'
+    samples = db.Column(db.LargeBinary, nullable=False)
+
+    sensor_id = db.Column(db.Integer, db.ForeignKey("sensors.id", ondelete='CASCADE'))
+    parameter_id = db.Column(db.Integer, db.ForeignKey("parameters.id", ondelete='RESTRICT'))
+
+    __table_args__ = (
+        db.Index('ix_waveform_frames_series_time', 'sensor_id', 'parameter_id', 'start_time', unique=True),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'start_time': self.start_time,
+            'sample_rate': self.sample_rate,
+            'sample_count': self.sample_count,
+            'dtype': self.dtype,
+            'sensor_id': self.sensor_id,
+            'parameter_id': self.parameter_id
+    }
@@ -0,0 +1,142 @@
+# backend/app/services/alarms.py
+
+from typing import Dict, List, Optional, Tuple
+
+from app import db
+from app.models.alarm import Alarm_Rule, Alarm_Event
+
+KIND_HIGH = 'high'
+KIND_LOW = 'low'
+KIND_RATE = 'rate'
+KINDS = (KIND_HIGH, KIND_LOW, KIND_RATE)
+SEVERITIES = ('info', 'warning', 'critical')
+ALARM_EVENTS_TABLE = 'alarm_events'
+STATE_RAISED = 'raised'
+STATE_CLEARED = 'cleared'
+
+
+class Rule:
+    """Снимок Alarm_Rule и состояние правила по его серии (окно n из m, активна ли тревога)."""
+
+    __slots__ = ('id', 'key', 'kind', 'limit', 'hysteresis', 'n', 'm', 'severity',
+                 'full_mask', 'mask', 'count', 'active', 'previous')
+
+    def __init__(self, id, key, kind, limit, hysteresis=0.0, n=1, m=1, severity='warning'):
+        self.id = id
+        self.key = key  # (sensor_id, parameter_id)
+        self.kind = kind
+        self.limit = limit
+        self.hysteresis = hysteresis or 0.0
+        self.m = max(int(m or 1), 1)
+        self.n = min(max(int(n or 1), 1), self.m)
+        self.severity = severity
+        self.full_mask = (1 << self.m) - 1
+        self.mask = 0  # Последние m результатов проверки, младший бит — последний отсчёт
+        self.count = 0  # Число нарушений среди них
+        self.active = False
+        self.previous = None  # (t, v) для правила по скорости изменения
+
+    def settings(self) -> tuple:
+        return self.key, self.kind, self.limit, self.hysteresis, self.n, self.m
+
+    def check(self, t, v) -> Optional[str]:
+        # O(1) на отсчёт: новое состояние тревоги или None, если не изменилось
+        if self.kind == KIND_RATE:
+            previous, self.previous = self.previous, (t, v)
+            if previous is None:
+                return None
+            elapsed = (t - previous[0]).total_seconds()
+            if elapsed <= 0:
+                return None
+            v = abs(v - previous[1]) / elapsed
+        if self.kind == KIND_LOW:
+            violated = v < self.limit
+            clear = v > self.limit + self.hysteresis
+        else:
+            violated = v > self.limit
+            clear = v < self.limit - self.hysteresis
+
+        oldest = (self.mask >> (self.m - 1)) & 1
+        self.mask = ((self.mask << 1) | violated) & self.full_mask
+        self.count += violated - oldest
+        if not self.active and self.count >= self.n:
+            self.active = True
+            return STATE_RAISED
+        if self.active and clear and self.count < self.n:
+            self.active = False
+            return STATE_CLEARED
+        return None
+
+
+class Alarm_Engine:
+    """
+    Правила тревог, проверяемые на приёме по каждому отсчёту:
+    пороги сверху и снизу, скорость изменения, гистерезис снятия и «n из m».
+    Состояние каждого правила — несколько чисел, поэтому проверка стоит O(1) на отсчёт.
+    Смены состояния становятся строками alarm_events (пишутся вместе с записями);
+    публикует их флашер MQTT_Buffer, уже вне лока. Активные тревоги читаются из
+    alarm_events (active_alarms) — в любом процессе, а не из памяти приёма.
+    Не потокобезопасен: вызывается под локом MQTT_Buffer.
+    """
+
+    def __init__(self):
+        self.rules: Dict[Tuple[int, int], List[Rule]] = {}
+        self.raised = 0
+        self.cleared = 0
+
+    def configure(self, rules: List[Rule]):
+        # Состояние правил, настройки которых не изменились, сохраняется
+        old = {rule.id: rule for series in self.rules.values() for rule in series}
+        self.rules = {}
+        for rule in rules:
+            previous = old.get(rule.id)
+            if previous is not None and previous.settings() == rule.settings():
+                previous.severity = rule.severity
+                rule = previous
+            self.rules.setdefault(rule.key, []).append(rule)
+
+    def apply(self, records: List[tuple]) -> List[tuple]:
+        # Запись: (timestamp, value, sensor_id, parameter_id); возвращает события для alarm_events
+        if not self.rules:
+            return []
+        events = []
+        rules_by_key = self.rules
+        for timestamp, value, sensor_id, parameter_id in records:
+            rules = rules_by_key.get((sensor_id, parameter_id))
+            if rules is None or timestamp is None or value is None:
+                continue
+            try:
+                v = float(value)
+            except (TypeError, ValueError):
+                continue
+            for rule in rules:
+                state = rule.check(timestamp, v)
+                if state is not None:
+                    events.append(self._event(rule, state, timestamp, v))
+        return events
+
+    def _event(self, rule: Rule, state: str, timestamp, value) -> tuple:
+        if state == STATE_RAISED:
+            self.raised += 1
+        else:
+            self.cleared += 1
+        row = {'rule_id': rule.id, 'sensor_id': rule.key[0], 'parameter_id': rule.key[1],
+               'state': state, 'severity': rule.severity, 'timestamp': timestamp, 'value': value}
+        return ALARM_EVENTS_TABLE, row
+
+
+def active_alarms() -> List[dict]:
+    """Включённые правила, последнее событие которых в alarm_events — raised (в контексте приложения)."""
+    latest = db.select(db.func.max(Alarm_Event.id).label('id')) \
+        .filter(Alarm_Event.rule_id.isnot(None)) \
+        .group_by(Alarm_Event.rule_id).subquery()
+    rows = db.session.execute(
+        db.select(Alarm_Event, Alarm_Rule.severity)
+          .join(latest, Alarm_Event.id == latest.c.id)
+          .join(Alarm_Rule, Alarm_Rule.id == Alarm_Event.rule_id)
+          .filter(Alarm_Rule.enabled.is_(True), Alarm_Event.state == STATE_RAISED)
+          .order_by(Alarm_Event.rule_id)
+    ).all()
+    return [{'rule_id': event.rule_id, 'sensor_id': event.sensor_id, 'parameter_id': event.parameter_id,
+             'severity': severity, 'since': event.timestamp, 'value': event.value}
+            for event, severity in rows]
@@ -0,0 +1,146 @@
+# backend/app/services/anomaly.py
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from app.services.derived import group_series
+
+ANOMALY_EWMA_ALPHA = 0.05  # Вес нового отсчёта в EWMA-базе (≈ последние 40 отсчётов)
+ANOMALY_WINDOW = 100  # Окно медианы/MAD, отсчётов
+ANOMALY_MIN_HISTORY = 30  # Сколько отсчётов накопить до первой оценки
+ANOMALY_STRIDE = 16  # Раз во сколько отсчётов пересчитываются медиана и MAD
+ANOMALIES_TABLE = 'anomalies'
+MAD_SCALE = 0.6745  # Приводит MAD к СКО нормального распределения
+
+
+class Series_Baseline:
+    """Состояние серии между пачками: EWMA-среднее и дисперсия, число отсчётов, хвост окна медианы."""
+
+    __slots__ = ('mean', 'var', 'count', 'window')
+
+    def __init__(self):
+        self.mean = None
+        self.var = 0.0
+        self.count = 0
+        self.window = np.empty(0)
+
+
+class Anomaly_Detector:
+    """
+    Потоковое обнаружение аномалий по сериям с заданным порогом (Sensor_parameter.anomaly_threshold).
+    Каждый отсчёт оценивается относительно базы, построенной только по предыдущим отсчётам:
+      - z-оценка по экспоненциально взвешенным среднему и дисперсии;
+      - робастная z-оценка по медиане и MAD скользящего окна (обновляется раз в stride отсчётов).
+    Отсчёт считается аномалией, если любая из оценок по модулю выше порога;
+    сохраняются только аномалии (таблица anomalies) вместе с оценками.
+    Отсчёты копятся между записями в БД и обрабатываются один раз на пачку
+    массивами NumPy: рекурсии EWMA считаются через scipy.signal.lfilter,
+    медиана и MAD — по скользящим окнам без цикла по отсчётам.
+    configure, collect и take вызываются под локом MQTT_Buffer, evaluate — только
+    потоком-флашером и уже вне лока (состояние серий трогает только он).
+    """
+
+    def __init__(self, alpha: float = ANOMALY_EWMA_ALPHA, window: int = ANOMALY_WINDOW,
+                 min_history: int = ANOMALY_MIN_HISTORY, stride: int = ANOMALY_STRIDE):
+        self.alpha = alpha
+        self.window = window
+        self.stride = max(int(stride), 1)
+        self.min_history = min_history
+        self.thresholds: Dict[Tuple[int, int], float] = {}
+        self.baselines: Dict[Tuple[int, int], Series_Baseline] = {}
+        self.pending: List[tuple] = []
+        self.anomalies = 0
+
+    def configure(self, thresholds: Dict[Tuple[int, int], float]):
+        self.thresholds = thresholds
+        for key in list(self.baselines):
+            if key not in thresholds:
+                del self.baselines[key]
+
+    def select(self, records: List[tuple]) -> List[tuple]:
+        # Отсчёты серий с заданным порогом
+        thresholds = self.thresholds
+        if not thresholds:
+            return []
+        return [record for record in records if (record[2], record[3]) in thresholds]
+
+    def collect(self, records: List[tuple]):
+        self.pending.extend(self.select(records))
+
+    def take(self) -> List[tuple]:
+        # Отсчёты пачки для evaluate; под локом — только подмена списка
+        pending, self.pending = self.pending, []
+        return pending
+
+    def evaluate(self, pending: List[tuple]) -> List[tuple]:
+        if not pending:
+            return []
+        events = []
+        for key, (_, values, timestamps) in group_series(pending).items():
+            threshold = self.thresholds.get(key)
+            if threshold is None:
+                continue
+            baseline = self.baselines.get(key)
+            if baseline is None:
+                baseline = self.baselines[key] = Series_Baseline()
+            ewma_score, robust_score = self.score(baseline, values)
+            anomalous = (np.abs(ewma_score) > threshold) | (np.abs(robust_score) > threshold)
+            for i in np.flatnonzero(anomalous):
+                events.append((ANOMALIES_TABLE, {
+                    'sensor_id': key[0], 'parameter_id': key[1], 'timestamp': timestamps[i],
+                    'value': float(values[i]), 'ewma_score': float(ewma_score[i]),
+                    'robust_score': float(robust_score[i]),
+                }))
+        self.anomalies += len(events)
+        return events
+
+    def score(self, baseline: Series_Baseline, x: np.ndarray):
+        """Оценки пачки x (по времени) и обновление состояния серии."""
+        a = self.alpha
+        if baseline.mean is None:
+            baseline.mean = x[0]
+        decay = [1.0, -(1.0 - a)]
+
+        # EWMA: m[i] = (1-a)·m[i-1] + a·x[i]; база для x[i] — m[i-1]
+        means = lfilter([a], decay, x, zi=[(1.0 - a) * baseline.mean])[0]
+        prior_means = np.concatenate(([baseline.mean], means[:-1]))
+        deviation = x - prior_means
+        # Дисперсия: v[i] = (1-a)·(v[i-1] + a·d[i]²)
+        variances = lfilter([1.0], decay, (1.0 - a) * a * deviation ** 2, zi=[(1.0 - a) * baseline.var])[0]
+        prior_vars = np.concatenate(([baseline.var], variances[:-1]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ewma_score = np.where(prior_vars > 1e-12, deviation / np.sqrt(prior_vars), 0.0)
+
+        # Медиана и MAD окна из window предыдущих отсчётов (с хвостом прошлой пачки).
+        # База пересчитывается раз в stride отсчётов (по сквозному номеру отсчёта серии),
+        # внутри блока все отсчёты сравниваются с окном, закончившимся перед его началом
+        history = np.concatenate((baseline.window, x))
+        offset = len(baseline.window)
+        first = baseline.count - offset  # Сквозной номер history[0]
+        positions = np.arange(offset, len(history))
+        starts = positions - (first + positions) % self.stride
+        scored = starts >= self.window
+        robust_score = np.zeros(len(x))
+        if scored.any():
+            refresh, inverse = np.unique(starts[scored], return_inverse=True)
+            # Окно, заканчивающееся перед отсчётом history[q], — windows[q - window]
+            windows = sliding_window_view(history, self.window)[refresh - self.window]
+            median = np.median(windows, axis=1)
+            mad = np.median(np.abs(windows - median[:, None]), axis=1)
+            median, mad = median[inverse], mad[inverse]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                robust_score[scored] = np.where(mad > 1e-12, MAD_SCALE * (x[scored] - median) / mad, 0.0)
+
+        # Пока истории мало, оценки ненадёжны
+        warmup = np.arange(baseline.count, baseline.count + len(x)) < self.min_history
+        ewma_score[warmup] = 0.0
+        robust_score[warmup] = 0.0
+
+        baseline.mean = means[-1]
+        baseline.var = variances[-1]
+        baseline.count += len(x)
+        baseline.window = history[-(self.window + self.stride):].copy()
+        return ewma_score, robust_score
@@ -0,0 +1,216 @@
+# backend/app/services/brokers.py
+
+import time
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+import paho.mqtt.client as paho
+
+DEFAULT_BROKER = None  # broker_id датчиков без брокера: подключение flask_mqtt из MQTT_BROKER_URL
+RATE_WINDOW = 10.0  # Окно расчёта сообщений в секунду, сек
+LAG_ALPHA = 0.1  # Вес нового сообщения в сглаженной задержке доставки
+
+
+def broker_label(broker_id) -> str:
+    return 'default' if broker_id is DEFAULT_BROKER else str(broker_id)
+
+
+class Broker_Settings:
+    """Снимок строки Broker для подключения: при изменении настроек клиент переподключается."""
+
+    __slots__ = ('id', 'name', 'host', 'port', 'username', 'password', 'keepalive')
+
+    def __init__(self, id, name, host, port=1883, username=None, password=None, keepalive=60):
+        self.id = id
+        self.name = name
+        self.host = host
+        self.port = port or 1883
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive or 60
+
+    def key(self) -> tuple:
+        return self.host, self.port, self.username, self.password, self.keepalive
+
+
+class Broker_Stats:
+    """
+    Метрики одного брокера: число и объём сообщений, сообщений в секунду
+    за последнее окно, задержка доставки (время приёма минус метка времени
+    последнего отсчёта в сообщении, сглаженная), время с последнего сообщения
+    и состояние подключения. Показывают, какой цех отстаёт или замолчал.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = Lock()
+        self.messages = 0
+        self.bytes = 0
+        self.last_received = None
+        self.window_start = time.time()
+        self.window_messages = 0
+        self.rate = 0.0
+        self.lag = None
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+
+    def message(self, size: int, received_at: float):
+        # Вызывается в потоке сети брокера: только счётчики
+        with self.lock:
+            self.messages += 1
+            self.bytes += size
+            self.last_received = received_at
+            self.window_messages += 1
+            elapsed = received_at - self.window_start
+            if elapsed >= RATE_WINDOW:
+                self.rate = self.window_messages / elapsed
+                self.window_start = received_at
+                self.window_messages = 0
+
+    def delivery_lag(self, seconds: float):
+        with self.lock:
+            self.lag = seconds if self.lag is None else self.lag + LAG_ALPHA * (seconds - self.lag)
+
+    def connection(self, connected: bool):
+        with self.lock:
+            if connected:
+                self.connects += 1
+            elif self.connected:
+                self.disconnects += 1
+            self.connected = connected
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        with self.lock:
+            return {
+                'name': self.name,
+                'connected': self.connected,
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+                'messages': self.messages,
+                'bytes': self.bytes,
+                'messages_per_second': self.rate,
+                'delivery_lag': self.lag,
+                'seconds_since_last_message': now - self.last_received if self.last_received else None,
+            }
+
+
+class Broker_Client:
+    """
+    Подключение к дополнительному брокеру через paho (flask_mqtt держит одно подключение).
+    Свои фильтры клиент помнит сам и повторяет подписки после переподключения.
+    Сообщения отдаются в on_message(broker_id, topic, payload, received_at) — в общий конвейер приёма.
+    """
+
+    def __init__(self, settings: Broker_Settings, on_message: Callable, stats: Broker_Stats, client_id: str = ''):
+        self.settings = settings
+        self.on_message = on_message
+        self.stats = stats
+        self.filters = set()
+        self.lock = Lock()
+        if hasattr(paho, 'CallbackAPIVersion'):
+            self.client = paho.Client(paho.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self.client = paho.Client(client_id=client_id)
+        if settings.username:
+            self.client.username_pw_set(settings.username, settings.password)
+        self.client.on_connect = self._handle_connect
+        self.client.on_disconnect = self._handle_disconnect
+        self.client.on_message = self._handle_message
+
+    def start(self):
+        # Асинхронно: недоступный брокер не задерживает запуск, paho переподключается сам
+        self.client.connect_async(self.settings.host, self.settings.port, keepalive=self.settings.keepalive)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.stats.connection(False)
+
+    def subscribe(self, topic_filter: str):
+        with self.lock:
+            self.filters.add(topic_filter)
+        self.client.subscribe(topic_filter, qos=1)
+
+    def unsubscribe(self, topic_filter: str):
+        with self.lock:
+            self.filters.discard(topic_filter)
+        self.client.unsubscribe(topic_filter)
+
+    def _handle_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            print(f"MQTT broker {self.settings.name} refused connection: {reason_code}")
+            return
+        print(f"MQTT Connected to broker {self.settings.name}")
+        self.stats.connection(True)
+        with self.lock:
+            filters = sorted(self.filters)
+        for topic_filter in filters:
+            client.subscribe(topic_filter, qos=1)
+
+    def _handle_disconnect(self, client, userdata, *args):
+        self.stats.connection(False)
+
+    def _handle_message(self, client, userdata, message):
+        received_at = time.time()
+        self.stats.message(len(message.payload), received_at)
+        self.on_message(self.settings.id, message.topic, message.payload, received_at)
+
+
+class Broker_Manager:
+    """
+    Подключения ко всем брокерам, на которых есть датчики.
+    configure вызывается после перестройки таблицы маршрутизации: новые брокеры
+    подключаются, удалённые отключаются, изменённые — переподключаются.
+    Брокер по умолчанию обслуживает flask_mqtt, здесь для него только метрики.
+    """
+
+    def __init__(self):
+        self.clients: Dict[int, Broker_Client] = {}
+        self.stats: Dict[Optional[int], Broker_Stats] = {DEFAULT_BROKER: Broker_Stats('default')}
+        self.on_message: Optional[Callable] = None
+        self.client_id = ''
+        self.lock = Lock()
+
+    def configure(self, brokers: Dict[int, Broker_Settings]):
+        with self.lock:
+            for broker_id in list(self.clients):
+                client = self.clients[broker_id]
+                settings = brokers.get(broker_id)
+                if settings is None or settings.key() != client.settings.key():
+                    client.stop()
+                    del self.clients[broker_id]
+                    print(f"MQTT broker {client.settings.name} disconnected")
+            for broker_id, settings in brokers.items():
+                stats = self.stats.get(broker_id)
+                if stats is None:
+                    stats = self.stats[broker_id] = Broker_Stats(settings.name)
+                stats.name = settings.name
+                if broker_id not in self.clients:
+                    client_id = f"{self.client_id}-{broker_id}" if self.client_id else ''
+                    client = Broker_Client(settings, self.on_message, stats, client_id)
+                    client.start()
+                    self.clients[broker_id] = client
+            for broker_id in list(self.stats):
+                if broker_id is not DEFAULT_BROKER and broker_id not in brokers:
+                    del self.stats[broker_id]
+
+    def client(self, broker_id: int) -> Optional[Broker_Client]:
+        return self.clients.get(broker_id)
+
+    def stats_for(self, broker_id: Optional[int]) -> Optional[Broker_Stats]:
+        return self.stats.get(broker_id)
+
+    def all_stats(self) -> dict:
+        return {broker_label(broker_id): stats.to_dict() for broker_id, stats in list(self.stats.items())}
+
+    def stop(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.stop()
+            self.clients = {}
+
+
+broker_manager = Broker_Manager()
@@ -0,0 +1,173 @@
+# backend/app/services/capture.py
+
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+CONDITION_ABOVE = 'above'
+CONDITION_BELOW = 'below'
+CONDITION_RATE = 'rate'
+CONDITIONS = (CONDITION_ABOVE, CONDITION_BELOW, CONDITION_RATE)
+CAPTURES_TABLE = 'captures'
+CAPTURE_CLOSE_GRACE = 10  # Секунд сверх окна post до закрытия по часам, если серия замолчала
+
+
+class Trigger:
+    """Снимок настроек Capture_Trigger для движка захвата."""
+
+    __slots__ = ('id', 'target', 'source', 'condition', 'threshold', 'pre', 'post')
+
+    def __init__(self, id, target, source, condition, threshold, pre_seconds, post_seconds):
+        self.id = id
+        self.target = target  # (sensor_id, parameter_id) сохраняемой серии
+        self.source = source  # (sensor_id, parameter_id) серии, по которой проверяется условие
+        self.condition = condition
+        self.threshold = threshold
+        self.pre = timedelta(seconds=pre_seconds or 0)
+        self.post = timedelta(seconds=post_seconds or 0)
+
+    def fires(self, t, v, previous) -> bool:
+        if self.condition == CONDITION_ABOVE:
+            return v > self.threshold
+        if self.condition == CONDITION_BELOW:
+            return v < self.threshold
+        if previous is None:
+            return False
+        elapsed = (t - previous[0]).total_seconds()
+        return elapsed > 0 and abs(v - previous[1]) / elapsed > self.threshold
+
+
+class Capture_Engine:
+    """
+    Захват событий с полным разрешением на приёме.
+    Серии с прореживанием сохраняют каждый N-й отсчёт; для серий, на которые
+    настроен захват, последние pre-секунд держатся в кольцевом буфере.
+    Когда срабатывает условие (порог, скорость изменения или значение другого
+    параметра), отсчёты из кольцевого буфера и все отсчёты следующих post-секунд
+    уходят в буфер записи полностью, а по закрытии окна пишется строка captures.
+    Окно закрывается первым отсчётом серии после end_time, а если серия замолчала
+    (обычно после аварии) — на флаше, когда по часам прошло post + CAPTURE_CLOSE_GRACE.
+    Не потокобезопасен: вызывается под локом MQTT_Buffer.
+    """
+
+    def __init__(self):
+        self.triggers: Dict[Tuple[int, int], List[Trigger]] = {}  # источник → условия
+        self.pre_windows: Dict[Tuple[int, int], timedelta] = {}  # цель → длина кольцевого буфера
+        self.decimation: Dict[Tuple[int, int], int] = {}
+        self.rings: Dict[Tuple[int, int], deque] = {}
+        self.counters: Dict[Tuple[int, int], int] = {}
+        self.previous: Dict[Tuple[int, int], tuple] = {}
+        self.open: Dict[Tuple[int, int], dict] = {}
+        self.deadlines: Dict[Tuple[int, int], float] = {}  # цель → time.monotonic() закрытия по часам
+        self.captures = 0
+        self.decimated_away = 0
+
+    def configure(self, triggers: List[Trigger], decimation: Dict[Tuple[int, int], int]):
+        self.triggers = {}
+        self.pre_windows = {}
+        for trigger in triggers:
+            self.triggers.setdefault(trigger.source, []).append(trigger)
+            self.pre_windows[trigger.target] = max(self.pre_windows.get(trigger.target, timedelta(0)), trigger.pre)
+        self.decimation = {key: factor for key, factor in decimation.items() if factor and factor > 1}
+        for key in list(self.rings):
+            if key not in self.pre_windows:
+                del self.rings[key]
+
+    def apply(self, records: List[tuple]) -> Tuple[List[tuple], List[tuple]]:
+        # Запись: (timestamp, value, sensor_id, parameter_id); возвращает (записи, события captures)
+        if not self.triggers and not self.decimation:
+            return records, []
+        kept = []
+        events = []
+        for record in records:
+            t, value = record[0], record[1]
+            key = (record[2], record[3])
+            if t is None or (key not in self.triggers and key not in self.pre_windows
+                             and key not in self.decimation):
+                kept.append(record)
+                continue
+            try:
+                v = float(value)
+            except (TypeError, ValueError):
+                kept.append(record)
+                continue
+            # Сначала условия: при срабатывании окно открывается уже для этого отсчёта
+            for trigger in self.triggers.get(key, ()):
+                if trigger.fires(t, v, self.previous.get(key)):
+                    self._trigger(trigger, t, kept)
+            if key in self.triggers:
+                self.previous[key] = (t, v)
+            self._route(record, key, t, kept, events)
+        return kept, events
+
+    def _trigger(self, trigger: Trigger, t, kept: List[tuple]):
+        capture = self.open.get(trigger.target)
+        if capture is not None:
+            # Повторное срабатывание продлевает уже открытое окно
+            capture['end_time'] = max(capture['end_time'], t + trigger.post)
+            self.deadlines[trigger.target] = max(self.deadlines[trigger.target], self._deadline(trigger))
+            return
+        start = t - trigger.pre
+        for entry in self.rings.get(trigger.target, ()):
+            if not entry[1] and entry[0] >= start:
+                kept.append(entry[2])
+                entry[1] = True
+        self.open[trigger.target] = {
+            'trigger_id': trigger.id,
+            'sensor_id': trigger.target[0],
+            'parameter_id': trigger.target[1],
+            'trigger_time': t,
+            'start_time': start,
+            'end_time': t + trigger.post,
+        }
+        self.deadlines[trigger.target] = self._deadline(trigger)
+
+    @staticmethod
+    def _deadline(trigger: Trigger) -> float:
+        # Отсчёты окна приходят не медленнее реального времени (дозагрузка — быстрее),
+        # поэтому по часам окно заведомо закончилось через post + запас на задержку доставки
+        return time.monotonic() + trigger.post.total_seconds() + CAPTURE_CLOSE_GRACE
+
+    def _route(self, record: tuple, key, t, kept: List[tuple], events: List[tuple]):
+        emitted = False
+        capture = self.open.get(key)
+        if capture is not None:
+            if t <= capture['end_time']:
+                kept.append(record)
+                emitted = True
+            else:
+                events.append(self._close(key))
+        if not emitted:
+            factor = self.decimation.get(key, 1)
+            count = self.counters.get(key, 0)
+            self.counters[key] = count + 1
+            if count % factor == 0:
+                kept.append(record)
+                emitted = True
+            else:
+                self.decimated_away += 1
+
+        pre = self.pre_windows.get(key)
+        if pre is not None:
+            ring = self.rings.get(key)
+            if ring is None:
+                ring = self.rings[key] = deque()
+            # [t, отдан ли уже в запись, исходная запись]
+            ring.append([t, emitted, record])
+            while ring and t - ring[0][0] > pre:
+                ring.popleft()
+
+    def _close(self, key) -> tuple:
+        self.captures += 1
+        self.deadlines.pop(key, None)
+        return CAPTURES_TABLE, self.open.pop(key)
+
+    def expire(self, now: Optional[float] = None) -> List[tuple]:
+        # Окна замолчавших серий, срок которых по часам вышел; вызывается на каждом флаше
+        now = time.monotonic() if now is None else now
+        return [self._close(key) for key, deadline in list(self.deadlines.items()) if deadline <= now]
+
+    def drain(self) -> List[tuple]:
+        # Незакрытые окна при остановке приёма сохраняются как есть
+        return [self._close(key) for key in list(self.open)]
@@ -0,0 +1,123 @@
+# backend/app/services/codecs.py
+
+import json
+import struct
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+try:
+    import orjson  # Необязательная зависимость: быстрый JSON-декодер
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # Необязательная зависимость: формат MessagePack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2  # Необязательная зависимость: формат CBOR
+except ImportError:
+    cbor2 = None
+
+DEFAULT_FORMAT = 'json'
+
+# Заголовок бинарного кадра float_frame (little-endian, 26 байт):
+#   magic     2s  b'CV'
+#   version   B   1
+#   dtype     B   1 — float32, 2 — float64
+#   channels  H   число каналов
+#   samples   I   отсчётов на канал
+#   t0        q   время первого отсчёта, мкс от эпохи
+#   rate      d   частота дискретизации, Гц
+# Далее channels * samples значений, канал за каналом.
+FRAME_HEADER = struct.Struct('<2sBBHIqd')
+FRAME_MAGIC = b'CV'
+FRAME_VERSION = 1
+FRAME_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<f8')}
+
+
+_json_loads: Callable[[Any], Any] = json.loads
+
+
+def set_json_decoder(name: str = 'auto'):
+    """
+    Выбирает декодер JSON для входящих сообщений: 'json', 'orjson' или 'auto'
+    (orjson, если установлен).
+    """
+    global _json_loads
+    if name in ('orjson', 'auto') and orjson is not None:
+        _json_loads = orjson.loads
+    elif name == 'orjson':
+        raise ValueError("orjson is not installed")
+    else:
+        _json_loads = json.loads
+
+
+def decode_payload(payload: bytes) -> Any:
+    # orjson.JSONDecodeError наследуется от json.JSONDecodeError
+    return _json_loads(payload)
+
+
+def decode_msgpack(payload: bytes) -> Any:
+    if msgpack is None:
+        raise ValueError("msgpack is not installed")
+    return msgpack.unpackb(payload, raw=False)
+
+
+def decode_cbor(payload: bytes) -> Any:
+    if cbor2 is None:
+        raise ValueError("cbor2 is not installed")
+    return cbor2.loads(payload)
+
+
+def decode_float_frame(payload: bytes) -> Dict[str, Any]:
+    """
+    Разбирает бинарный кадр в структуру пакетного формата:
+    {'device': {'t0', 'dt', 'time_unit': 'us', 'sample_rate'}, 'channels': [ndarray, ...]}.
+    Отсчёты не копируются: каналы — представления np.frombuffer над исходными байтами.
+    Ключи параметров для такого датчика — 'channels[0]', 'channels[1][0:256]' и т. п.
+    """
+    if len(payload) < FRAME_HEADER.size:
+        raise ValueError("Frame is shorter than header")
+    magic, version, dtype_code, channels, samples, t0, rate = FRAME_HEADER.unpack_from(payload)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Unknown frame format")
+    dtype = FRAME_DTYPES.get(dtype_code)
+    if dtype is None:
+        raise ValueError(f"Unknown frame dtype {dtype_code}")
+    if rate <= 0:
+        raise ValueError("Frame sample rate must be positive")
+    count = channels * samples
+    if len(payload) != FRAME_HEADER.size + count * dtype.itemsize:
+        raise ValueError("Frame size does not match header")
+    data = np.frombuffer(payload, dtype=dtype, count=count, offset=FRAME_HEADER.size)
+    return {
+        'device': {'t0': t0, 'dt': 1e6 / rate, 'time_unit': 'us', 'sample_rate': rate},
+        'channels': list(data.reshape(channels, samples)),
+    }
+
+
+def encode_float_frame(channels, t0_us: int, sample_rate: float, dtype: str = 'float32') -> bytes:
+    """Собирает кадр float_frame из массива (channels, samples) — для публикаторов и тестов."""
+    dtype_code = {'float32': 1, 'float64': 2}[dtype]
+    data = np.ascontiguousarray(np.atleast_2d(channels), dtype=FRAME_DTYPES[dtype_code])
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, dtype_code,
+                               data.shape[0], data.shape[1], int(t0_us), float(sample_rate))
+    return header + data.tobytes()
+
+
+CODECS: Dict[str, Callable[[bytes], Any]] = {
+    'json': decode_payload,
+    'msgpack': decode_msgpack,
+    'cbor': decode_cbor,
+    'float_frame': decode_float_frame,
+}
+
+
+def get_codec(name: str = None) -> Callable[[bytes], Any]:
+    codec = CODECS.get(name or DEFAULT_FORMAT)
+    if codec is None:
+        raise ValueError(f"Unknown payload format '{name}'")
+    return codec
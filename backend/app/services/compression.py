@@ -0,0 +1,203 @@
+# backend/app/services/compression.py
+
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_DEADBAND = 'deadband'
+COMPRESSION_SWINGING_DOOR = 'swinging_door'
+COMPRESSION_METHODS = (COMPRESSION_NONE, COMPRESSION_DEADBAND, COMPRESSION_SWINGING_DOOR)
+RECONSTRUCT_MAX_POINTS = 10000  # Потолок точек при восстановлении сжатой серии для чтения
+
+# Настройки серии: (метод, допуск в единицах параметра, макс. секунд между сохранёнными точками)
+CompressionSettings = Tuple[str, float, Optional[float]]
+
+
+class Deadband_State:
+    """
+    Зона нечувствительности: точка сохраняется, если значение ушло от последнего
+    сохранённого больше чем на допуск. Вместе с ней сохраняется предыдущая
+    точка, чтобы при линейном восстановлении горизонтальный участок не превращался
+    в наклонный; ошибка восстановления — не больше двух допусков.
+    """
+
+    def __init__(self, tolerance: float, max_interval: Optional[float]):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.stored = None  # (t, v) последней сохранённой точки
+        self.held = None  # (t, v) последней отброшенной точки
+
+    def update(self, t, v) -> List[tuple]:
+        if self.stored is None:
+            self.stored = (t, v)
+            return [(t, v)]
+        elapsed = (t - self.stored[0]).total_seconds()
+        if elapsed <= 0:
+            # Точка не по порядку — сохраняем как есть, состояние не трогаем
+            return [(t, v)]
+        if abs(v - self.stored[1]) > self.tolerance or \
+                (self.max_interval and elapsed >= self.max_interval):
+            archived = [self.held] if self.held is not None else []
+            archived.append((t, v))
+            self.stored = (t, v)
+            self.held = None
+            return archived
+        self.held = (t, v)
+        return []
+
+    def tail(self) -> List[tuple]:
+        if self.held is None:
+            return []
+        held, self.held = self.held, None
+        self.stored = held
+        return [held]
+
+
+class Swinging_Door_State:
+    """
+    Алгоритм «вращающейся двери»: от последней сохранённой точки строятся
+    верхняя и нижняя границы наклона на расстоянии допуска. Пока коридор открыт,
+    точки отбрасываются; когда он схлопнулся, сохраняется точка в момент последнего
+    отсчёта внутри коридора. Ошибка линейного восстановления — не больше допуска.
+    """
+
+    def __init__(self, tolerance: float, max_interval: Optional[float]):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.anchor = None  # (t, v) последней сохранённой точки
+        self.held = None  # (t, v) последней полученной, ещё не сохранённой точки
+        self.slope_upper = 0.0
+        self.slope_lower = 0.0
+
+    def _open_door(self, t, v):
+        elapsed = (t - self.anchor[0]).total_seconds()
+        self.slope_upper = (v + self.tolerance - self.anchor[1]) / elapsed
+        self.slope_lower = (v - self.tolerance - self.anchor[1]) / elapsed
+        self.held = (t, v)
+
+    def update(self, t, v) -> List[tuple]:
+        if self.anchor is None:
+            self.anchor = (t, v)
+            return [(t, v)]
+        last_t = self.held[0] if self.held is not None else self.anchor[0]
+        if t <= last_t:
+            return [(t, v)]
+        if self.held is None:
+            self._open_door(t, v)
+            return []
+
+        elapsed = (t - self.anchor[0]).total_seconds()
+        slope_upper = min(self.slope_upper, (v + self.tolerance - self.anchor[1]) / elapsed)
+        slope_lower = max(self.slope_lower, (v - self.tolerance - self.anchor[1]) / elapsed)
+        if slope_lower > slope_upper or (self.max_interval and elapsed >= self.max_interval):
+            # Коридор схлопнулся: сохраняем последний отсчёт внутри него и строим новый коридор
+            archived = self._archive_held()
+            self._open_door(t, v)
+            return [archived]
+        self.slope_upper, self.slope_lower = slope_upper, slope_lower
+        self.held = (t, v)
+        return []
+
+    def _archive_held(self):
+        # Значение берётся на прямой из коридора, ближайшей к отсчёту, поэтому
+        # отрезок от опорной точки проходит не дальше допуска от всех отброшенных
+        held_t, held_v = self.held
+        elapsed = (held_t - self.anchor[0]).total_seconds()
+        slope = min(max((held_v - self.anchor[1]) / elapsed, self.slope_lower), self.slope_upper)
+        self.anchor = (held_t, self.anchor[1] + slope * elapsed)
+        self.held = None
+        return self.anchor
+
+    def tail(self) -> List[tuple]:
+        if self.held is None:
+            return []
+        return [self._archive_held()]
+
+
+STATES = {
+    COMPRESSION_DEADBAND: Deadband_State,
+    COMPRESSION_SWINGING_DOOR: Swinging_Door_State,
+}
+
+
+class Series_Compressor:
+    """
+    Сжатие с потерями на приёме, до MQTT_Buffer: по каждой серии
+    (sensor_id, parameter_id) с настроенным методом хранит состояние
+    и пропускает дальше только опорные точки линейных участков.
+    Серии без сжатия проходят без изменений.
+    Не потокобезопасен: вызывается под локом MQTT_Buffer.
+    """
+
+    def __init__(self):
+        self.settings: Dict[Tuple[int, int], CompressionSettings] = {}
+        self.states = {}
+        self.compressed_away = 0
+
+    def configure(self, settings: Dict[Tuple[int, int], CompressionSettings]) -> List[tuple]:
+        """
+        Применяет новые настройки. Возвращает удержанные последние точки серий,
+        чьи настройки изменились, — их нужно записать, чтобы хвост серии не потерялся.
+        """
+        released = []
+        for key in list(self.states):
+            if settings.get(key) != self.settings.get(key):
+                released.extend((t, v) + key for t, v in self.states.pop(key).tail())
+        self.settings = settings
+        return released
+
+    def apply(self, records: List[tuple]) -> List[tuple]:
+        # Запись: (timestamp, value, sensor_id, parameter_id)
+        if not self.settings:
+            return records
+        kept = []
+        for record in records:
+            key = (record[2], record[3])
+            settings = self.settings.get(key)
+            if settings is None or record[0] is None:
+                kept.append(record)
+                continue
+            try:
+                value = float(record[1])
+            except (TypeError, ValueError):
+                kept.append(record)
+                continue
+            state = self.states.get(key)
+            if state is None:
+                method, tolerance, max_interval = settings
+                state = self.states[key] = STATES[method](tolerance, max_interval)
+            archived = state.update(record[0], value)
+            kept.extend((t, v) + key for t, v in archived)
+            self.compressed_away += 1 - len(archived)
+        return kept
+
+    def drain(self) -> List[tuple]:
+        # Удержанные точки всех серий — при остановке приёма
+        released = []
+        for key, state in self.states.items():
+            released.extend((t, v) + key for t, v in state.tail())
+        return released
+
+
+def reconstruct_segments(timestamps: list, values: list, max_points: int = RECONSTRUCT_MAX_POINTS):
+    """
+    Восстанавливает сжатую серию по опорным точкам: линейная интерполяция
+    на равномерную сетку. Шаг сетки — наименьший интервал между опорными точками
+    (обычно исходный период отсчётов), но не мельче, чем даёт max_points на весь диапазон.
+    """
+    if len(timestamps) < 2:
+        return list(timestamps), [float(v) for v in values]
+    origin = timestamps[0]
+    seconds = np.array([(t - origin).total_seconds() for t in timestamps])
+    y = np.asarray(values, dtype=np.float64)
+    gaps = np.diff(seconds)
+    gaps = gaps[gaps > 0]
+    span = seconds[-1]
+    if not gaps.size or span <= 0:
+        return list(timestamps), y.tolist()
+    step = max(gaps.min(), span / max_points)
+    grid = np.arange(0.0, span, step)
+    grid = np.append(grid, span)
+    return [origin + timedelta(seconds=s) for s in grid.tolist()], np.interp(grid, seconds, y).tolist()
@@ -0,0 +1,61 @@
+# backend/app/services/dedup.py
+
+from collections import deque
+from typing import Dict, List, Tuple
+
+from app.services.record_block import Record_Block
+
+DEDUP_WINDOW = 1024  # Сколько последних меток времени помнить на каждую серию
+
+
+class Recent_Key_Window:
+    """
+    Окно недавних ключей (sensor_id, parameter_id, timestamp) для отсева повторов:
+    QoS 1 и повторные отправки публикатора доставляют одно и то же сообщение несколько раз.
+    На каждую серию хранится ограниченное множество последних меток времени
+    (старые вытесняются по очереди), так что память не растёт со временем.
+    Дубликаты старше окна отсекает уникальный ключ в БД (ON CONFLICT DO NOTHING).
+    Не потокобезопасен: вызывается под локом MQTT_Buffer.
+    """
+
+    def __init__(self, size: int = DEDUP_WINDOW):
+        self.size = size
+        self.series: Dict[Tuple[int, int], Tuple[set, deque]] = {}
+        self.duplicates = 0
+
+    def _seen(self, sensor_id, parameter_id, timestamp) -> bool:
+        series = self.series.get((sensor_id, parameter_id))
+        if series is None:
+            series = self.series[(sensor_id, parameter_id)] = (set(), deque())
+        keys, order = series
+        if timestamp in keys:
+            return True
+        keys.add(timestamp)
+        order.append(timestamp)
+        if len(order) > self.size:
+            keys.discard(order.popleft())
+        return False
+
+    def filter_records(self, records: List[tuple]) -> List[tuple]:
+        # Запись: (timestamp, value, sensor_id, parameter_id)
+        if self.size <= 0:
+            return records
+        fresh = [record for record in records if not self._seen(record[2], record[3], record[0])]
+        self.duplicates += len(records) - len(fresh)
+        return fresh
+
+    def filter_frames(self, frames: List[tuple]) -> List[tuple]:
+        # Кадр: (start_time, sample_rate, samples, sensor_id, parameter_id)
+        if self.size <= 0 or not frames:
+            return frames
+        fresh = [frame for frame in frames if not self._seen(frame[3], frame[4], frame[0])]
+        self.duplicates += len(frames) - len(fresh)
+        return fresh
+
+    def filter_blocks(self, blocks: List[Record_Block]) -> List[Record_Block]:
+        # Блок повторной доставки приходит целиком — узнаём его по метке первого отсчёта
+        if self.size <= 0 or not blocks:
+            return blocks
+        fresh = [block for block in blocks if not self._seen(block.sensor_id, block.parameter_id, block.start())]
+        self.duplicates += sum(len(block) for block in blocks) - sum(len(block) for block in fresh)
+        return fresh
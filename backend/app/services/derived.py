@@ -0,0 +1,180 @@
+# backend/app/services/derived.py
+
+import ast
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Функции NumPy, доступные в выражениях производных параметров
+EXPRESSION_FUNCTIONS = {
+    'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'arctan2': np.arctan2,
+    'minimum': np.minimum, 'maximum': np.maximum, 'where': np.where, 'pi': np.pi,
+}
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+)
+# Наибольший допустимый показатель степени: только числовая константа
+MAX_EXPONENT = 16
+
+
+def _exponent(node) -> Optional[float]:
+    # Показатель степени — число или число с унарным знаком, иначе None
+    sign = 1.0
+    while isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = -sign if isinstance(node.op, ast.USub) else sign
+        node = node.operand
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return sign * node.value
+    return None
+
+
+def compile_expression(expression: str, names: List[str]):
+    """
+    Проверяет и компилирует выражение над массивами входов, например 'current * voltage'.
+    Допускаются арифметика, сравнения, числа, имена входов и функции EXPRESSION_FUNCTIONS.
+    Показатель степени — только константа не больше MAX_EXPONENT по модулю, а целые числа
+    считаются как float: выражение вроде 9**9**9 не может надолго занять поток записи.
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"Unsupported element in expression: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in names and node.id not in EXPRESSION_FUNCTIONS:
+            raise ValueError(f"Unknown name in expression: {node.id}")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name)
+                                           or node.func.id not in EXPRESSION_FUNCTIONS):
+            raise ValueError("Only functions from the allowed list can be called")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            exponent = _exponent(node.right)
+            if exponent is None or abs(exponent) > MAX_EXPONENT:
+                raise ValueError(f"Exponent must be a numeric constant not exceeding {MAX_EXPONENT}")
+        if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+            node.value = float(node.value)
+    return compile(tree, '<derived>', 'eval')
+
+
+def group_series(records: List[tuple]):
+    """
+    Раскладывает записи пачки по сериям для векторной обработки:
+    (sensor_id, parameter_id) → (моменты datetime64, значения float64, исходные datetime), по времени.
+    Записи без времени или с нечисловым значением пропускаются.
+    """
+    grouped = {}
+    for timestamp, value, sensor_id, parameter_id in records:
+        if timestamp is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        timestamps, values = grouped.setdefault((sensor_id, parameter_id), ([], []))
+        timestamps.append(timestamp)
+        values.append(value)
+    series = {}
+    for key, (timestamps, values) in grouped.items():
+        times = np.array(timestamps, dtype='datetime64[us]')
+        order = np.argsort(times, kind='stable')
+        series[key] = (times[order], np.asarray(values, dtype=np.float64)[order],
+                       [timestamps[i] for i in order])
+    return series
+
+
+class Derived_Definition:
+    """Снимок Derived_Parameter: выход, скомпилированное выражение и входы [(имя, (sensor_id, parameter_id))]."""
+
+    __slots__ = ('id', 'output', 'code', 'inputs')
+
+    def __init__(self, id, output, expression, inputs):
+        self.id = id
+        self.output = output
+        self.inputs = [(item['name'], (int(item['sensor_id']), int(item['parameter_id']))) for item in inputs]
+        self.code = compile_expression(expression, [name for name, _ in self.inputs])
+
+
+class Derived_Engine:
+    """
+    Производные (виртуальные) параметры, вычисляемые на приёме.
+    Отсчёты входных серий копятся между записями в БД; при подмене буфера
+    выражение вычисляется один раз на всю пачку массивами NumPy.
+    Моменты времени берутся у первого входа, значения остальных — последние
+    известные на этот момент (в том числе из прошлых пачек), поэтому входы
+    разных датчиков не обязаны приходить одновременно.
+    configure, collect и take вызываются под локом MQTT_Buffer, evaluate — только
+    потоком-флашером и уже вне лока (состояние last трогает только он).
+    """
+
+    def __init__(self):
+        self.definitions: List[Derived_Definition] = []
+        self.input_keys = set()
+        self.pending: List[tuple] = []
+        self.last: Dict[Tuple[int, int], Tuple[np.datetime64, float]] = {}
+        self.derived_records = 0
+        self.errors = 0
+
+    def configure(self, definitions: List[Derived_Definition]):
+        self.definitions = definitions
+        self.input_keys = {key for definition in definitions for _, key in definition.inputs}
+
+    def collect(self, records: List[tuple]):
+        # Запоминаем отсчёты входных серий до сжатия и прореживания
+        if self.input_keys:
+            self.pending.extend(record for record in records if (record[2], record[3]) in self.input_keys)
+
+    def take(self) -> List[tuple]:
+        # Отсчёты пачки для evaluate; под локом — только подмена списка
+        pending, self.pending = self.pending, []
+        return pending
+
+    def evaluate(self, pending: List[tuple]) -> List[tuple]:
+        if not pending:
+            return []
+        series = group_series(pending)
+        derived = []
+        for definition in self.definitions:
+            try:
+                derived.extend(self._evaluate(definition, series))
+            except Exception as e:
+                self.errors += 1
+                print(f"Derived parameter {definition.id} failed: {e}")
+        for key, (times, values, _) in series.items():
+            self.last[key] = (times[-1], values[-1])
+        self.derived_records += len(derived)
+        return derived
+
+    def _evaluate(self, definition: Derived_Definition, series) -> List[tuple]:
+        first = series.get(definition.inputs[0][1])
+        if first is None:
+            return []
+        times, _, timestamps = first
+        arrays = {}
+        valid = np.ones(len(times), dtype=bool)
+        for name, key in definition.inputs:
+            arrays[name], known = self._as_of(key, times, series.get(key))
+            valid &= known
+        namespace = dict(EXPRESSION_FUNCTIONS)
+        namespace.update(arrays)
+        with np.errstate(all='ignore'):
+            result = np.broadcast_to(eval(definition.code, {'__builtins__': {}}, namespace), times.shape)
+        valid &= np.isfinite(result)
+        sensor_id, parameter_id = definition.output
+        return [(timestamps[i], float(result[i]), sensor_id, parameter_id) for i in np.flatnonzero(valid)]
+
+    def _as_of(self, key, times, data):
+        # Значение входа на каждый момент: последний отсчёт не позже него
+        last = self.last.get(key)
+        if data is not None:
+            input_times, input_values, _ = data
+        else:
+            input_times, input_values = np.array([], dtype='datetime64[us]'), np.array([])
+        if last is not None and (not len(input_times) or last[0] <= input_times[0]):
+            input_times = np.concatenate(([last[0]], input_times))
+            input_values = np.concatenate(([last[1]], input_values))
+        positions = np.searchsorted(input_times, times, side='right') - 1
+        known = positions >= 0
+        return input_values[np.maximum(positions, 0)] if len(input_values) else np.full(len(times), np.nan), known
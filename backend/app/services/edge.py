@@ -0,0 +1,324 @@
+# backend/app/services/edge.py
+
+import base64
+import gzip
+import json
+import socket
+import time
+import urllib.error
+import urllib.request
+import zlib
+from datetime import datetime, timedelta, timezone
+from threading import Event, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import db
+from app.models.edge_cursor import Edge_Cursor
+from app.models.parameter import Parameter
+from app.models.sensor import Sensor
+from app.models.sensor_parameter import Sensor_parameter
+from app.models.sensor_record import Sensor_Record
+from app.models.waveform_frame import Waveform_Frame
+from app.services.extraction import record_value
+from app.services.record_writer import write_records, write_frames
+
+STREAM_RECORDS = 'sensor_records'
+STREAM_FRAMES = 'waveform_frames'
+EDGE_STREAMS = (STREAM_RECORDS, STREAM_FRAMES)
+EDGE_BATCH_ROWS = 5000  # Записей sensor_records в одной пачке
+EDGE_BATCH_FRAMES = 200  # Кадров формы сигнала в одной пачке (каждый — тысячи отсчётов)
+EDGE_FORWARD_INTERVAL = 10.0  # Секунд между попытками, когда узел догнал центр или центр недоступен
+EDGE_HTTP_TIMEOUT = 30.0  # Таймаут запроса к центральному экземпляру, сек
+EDGE_MAX_BATCH_BYTES = 256 * 1024 * 1024  # Потолок распакованной пачки на центральном экземпляре
+EPOCH = datetime(1970, 1, 1)
+
+
+class Edge_Batch_Error(Exception):
+    """Пачку нельзя принять; status — код ответа HTTP."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_micros(moment: datetime) -> int:
+    # Время — целыми микросекундами: без потерь точности float и компактно после gzip
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def unpack_batch(body: bytes, compressed: bool = True) -> dict:
+    if compressed:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = inflater.decompress(body, EDGE_MAX_BATCH_BYTES)
+        if inflater.unconsumed_tail:
+            raise Edge_Batch_Error(413, 'Batch is too large')
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise Edge_Batch_Error(400, f"Invalid batch: {e}")
+
+
+def read_batch(stream: str, after_id: int, limit: int) -> Optional[dict]:
+    """
+    Пачка строк локальной таблицы с id > after_id — по столбцам (сжимается лучше строк).
+    Идентификаторы датчиков и параметров у узла и центра разные, поэтому серии
+    передаются с именами датчика и параметра. None — новых строк нет.
+    Строки пишет единственный поток-флашер, поэтому id растут в порядке commit.
+    """
+    if stream == STREAM_RECORDS:
+        rows = db.session.execute(
+            db.select(Sensor_Record.id, Sensor_Record.timestamp, Sensor_Record.value,
+                      Sensor_Record.sensor_id, Sensor_Record.parameter_id)
+              .filter(Sensor_Record.id > after_id).order_by(Sensor_Record.id).limit(limit)
+        ).all()
+        if not rows:
+            return None
+        columns = {
+            'id': [row.id for row in rows],
+            'timestamp': [_to_micros(row.timestamp) for row in rows],
+            'value': [row.value for row in rows],
+        }
+    else:
+        rows = db.session.execute(
+            db.select(Waveform_Frame.id, Waveform_Frame.start_time, Waveform_Frame.sample_rate,
+                      Waveform_Frame.dtype, Waveform_Frame.samples,
+                      Waveform_Frame.sensor_id, Waveform_Frame.parameter_id)
+              .filter(Waveform_Frame.id > after_id).order_by(Waveform_Frame.id).limit(limit)
+        ).all()
+        if not rows:
+            return None
+        columns = {
+            'id': [row.id for row in rows],
+            'start_time': [_to_micros(row.start_time) for row in rows],
+            'sample_rate': [row.sample_rate for row in rows],
+            'dtype': [row.dtype for row in rows],
+            'samples': [base64.b64encode(row.samples).decode('ascii') for row in rows],
+        }
+    columns['sensor_id'] = [row.sensor_id for row in rows]
+    columns['parameter_id'] = [row.parameter_id for row in rows]
+    return {'stream': stream, 'last_id': rows[-1].id, 'columns': columns,
+            'series': series_names(set(zip(columns['sensor_id'], columns['parameter_id'])))}
+
+
+def series_names(pairs) -> List[list]:
+    sensor_ids = {sensor_id for sensor_id, _ in pairs}
+    parameter_ids = {parameter_id for _, parameter_id in pairs}
+    sensors = dict(db.session.execute(db.select(Sensor.id, Sensor.name).filter(Sensor.id.in_(sensor_ids))).all())
+    parameters = dict(db.session.execute(
+        db.select(Parameter.id, Parameter.name).filter(Parameter.id.in_(parameter_ids))).all())
+    return [[sensor_id, parameter_id, sensors.get(sensor_id), parameters.get(parameter_id)]
+            for sensor_id, parameter_id in sorted(pairs)]
+
+
+def resolve_series(series: List[list]) -> Tuple[Dict[tuple, tuple], List[str]]:
+    """(id датчика, id параметра) узла → те же на центре по именам; второй элемент — ненайденные серии."""
+    mapping = {}
+    missing = []
+    for sensor_id, parameter_id, sensor_name, parameter_name in series:
+        row = db.session.execute(
+            db.select(Sensor_parameter.sensor_id, Sensor_parameter.parameter_id)
+              .join(Sensor, Sensor.id == Sensor_parameter.sensor_id)
+              .join(Parameter, Parameter.id == Sensor_parameter.parameter_id)
+              .filter(Sensor.name == sensor_name, Parameter.name == parameter_name)
+        ).first()
+        if row is None:
+            missing.append(f"{sensor_name}/{parameter_name}")
+        else:
+            mapping[(sensor_id, parameter_id)] = (row.sensor_id, row.parameter_id)
+    return mapping, missing
+
+
+def apply_batch(batch: dict, after_commit: Callable = None) -> Tuple[int, int]:
+    """
+    Принимает пачку узла на центральном экземпляре: строки с id не больше курсора
+    узла уже приняты и пропускаются, остальные пишутся вместе со сдвигом курсора
+    в одной транзакции. Возвращает (принято строк, курсор).
+    Если серии узла нет на центре, пачка отклоняется целиком (409) — данные
+    остаются на узле, пока датчик не заведут.
+    """
+    node_id, stream = batch.get('node_id'), batch.get('stream')
+    if not node_id or stream not in EDGE_STREAMS:
+        raise Edge_Batch_Error(400, f"node_id and stream ({', '.join(EDGE_STREAMS)}) are required")
+    columns = batch.get('columns') or {}
+    try:
+        cursor = db.session.get(Edge_Cursor, (node_id, stream), with_for_update=True)
+        if cursor is None:
+            cursor = Edge_Cursor(node_id=node_id, stream=stream, last_id=0, rows=0, updated_at=_utcnow())
+            db.session.add(cursor)
+        keep = [index for index, row_id in enumerate(columns.get('id', [])) if row_id > cursor.last_id]
+        if not keep:
+            # Повтор уже принятой пачки (ответ потерялся по дороге к узлу)
+            last_id = cursor.last_id
+            db.session.rollback()
+            return 0, last_id
+
+        mapping, missing = resolve_series(batch.get('series', []))
+        if missing:
+            raise Edge_Batch_Error(409, f"Unknown series on central instance: {', '.join(missing)}")
+        series = [mapping.get((columns['sensor_id'][index], columns['parameter_id'][index])) for index in keep]
+        if None in series:
+            raise Edge_Batch_Error(400, 'Batch rows reference series missing from the series list')
+
+        records, frames = [], []
+        if stream == STREAM_RECORDS:
+            records = [(_from_micros(columns['timestamp'][index]) if columns['timestamp'][index] is not None else None,
+                        record_value(columns['value'][index]), sensor_id, parameter_id)
+                       for index, (sensor_id, parameter_id) in zip(keep, series)]
+            write_records(records)
+        else:
+            frames = [(_from_micros(columns['start_time'][index]), columns['sample_rate'][index],
+                       np.frombuffer(base64.b64decode(columns['samples'][index]), dtype=columns['dtype'][index]),
+                       sensor_id, parameter_id)
+                      for index, (sensor_id, parameter_id) in zip(keep, series)]
+            write_frames(frames)
+        cursor.last_id = max(columns['id'][index] for index in keep)
+        cursor.rows += len(keep)
+        cursor.updated_at = _utcnow()
+        last_id = cursor.last_id
+        db.session.commit()
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        db.session.rollback()
+        raise Edge_Batch_Error(400, f"Invalid batch: {e}")
+    except Exception:
+        db.session.rollback()
+        raise
+    if after_commit is not None:
+        try:
+            after_commit(records, frames)
+        except Exception as e:
+            print(f"After-commit handler failed: {e}")
+    return len(keep), last_id
+
+
+class Edge_Forwarder:
+    """
+    Граничный узел: принимает MQTT и пишет в локальную БД как обычно, а этот поток
+    пересылает записанные строки центральному экземпляру крупными сжатыми пачками
+    (POST /api/edge/batches). Курсор хранится на центре и сдвигается в одной
+    транзакции с записью пачки: при обрыве WAN данные ждут в локальной БД,
+    после перезапуска узел спрашивает курсор у центра и продолжает с него.
+    """
+
+    def __init__(self, url: str, node_id: str = None, token: str = None,
+                 interval: float = EDGE_FORWARD_INTERVAL, batch_rows: int = EDGE_BATCH_ROWS,
+                 timeout: float = EDGE_HTTP_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.node_id = node_id or socket.gethostname()
+        self.token = token
+        self.interval = interval
+        self.limits = {STREAM_RECORDS: batch_rows, STREAM_FRAMES: EDGE_BATCH_FRAMES}
+        self.timeout = timeout
+        self.cursors: Optional[Dict[str, int]] = None  # Подтверждённые центром id по таблицам
+        self.local_ids = {stream: 0 for stream in EDGE_STREAMS}  # Последний id в локальной БД
+        self.batches = 0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.raw_bytes = 0
+        self.last_success = None
+        self.last_error = None
+        self.app = None
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self, app):
+        self.app = app
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="edge-forwarder", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def forward_pending(self) -> int:
+        """Отправляет всё, что накопилось; возвращает число принятых центром строк (в контексте приложения)."""
+        if self.cursors is None:
+            self.cursors = {stream: 0 for stream in EDGE_STREAMS}
+            self.cursors.update(self._request('GET', f"/api/edge/cursors/{self.node_id}"))
+        accepted = 0
+        for stream in EDGE_STREAMS:
+            while not self.stopped.is_set():
+                batch = read_batch(stream, self.cursors[stream], self.limits[stream])
+                db.session.rollback()  # Не держим транзакцию чтения, пока ждём центр
+                if batch is None:
+                    break
+                batch['node_id'] = self.node_id
+                self.local_ids[stream] = max(self.local_ids[stream], batch['last_id'])
+                response = self._request('POST', '/api/edge/batches', batch)
+                self.cursors[stream] = max(self.cursors[stream], response['cursor'])
+                accepted += response['accepted']
+                self.batches += 1
+                self.rows += response['accepted']
+                self.last_success = time.time()
+                self.last_error = None
+                if len(batch['columns']['id']) < self.limits[stream]:
+                    break
+        return accepted
+
+    def stats(self) -> dict:
+        cursors = self.cursors or {}
+        return {
+            'node_id': self.node_id,
+            'central': self.url,
+            'cursors': cursors,
+            'backlog': {stream: max(self.local_ids[stream] - cursors.get(stream, 0), 0) for stream in EDGE_STREAMS},
+            'batches': self.batches,
+            'rows': self.rows,
+            'bytes_sent': self.bytes_sent,
+            'compression_ratio': self.raw_bytes / self.bytes_sent if self.bytes_sent else None,
+            'seconds_since_success': time.time() - self.last_success if self.last_success else None,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self._refresh_local_ids()
+                    self.forward_pending()
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"Edge forwarding to {self.url} failed: {e}")
+                self.last_error = str(e)
+            self.stopped.wait(self.interval)
+
+    def _refresh_local_ids(self):
+        # Для отставания в stats: сколько строк узел ещё не переслал
+        self.local_ids[STREAM_RECORDS] = db.session.execute(db.select(db.func.max(Sensor_Record.id))).scalar() or 0
+        self.local_ids[STREAM_FRAMES] = db.session.execute(db.select(db.func.max(Waveform_Frame.id))).scalar() or 0
+        db.session.rollback()
+
+    def _request(self, method: str, path: str, batch: dict = None) -> dict:
+        headers = {'Accept': 'application/json'}
+        body = None
+        if batch is not None:
+            raw = json.dumps(batch, separators=(',', ':')).encode('utf-8')
+            body = gzip.compress(raw, 6)
+            self.raw_bytes += len(raw)
+            self.bytes_sent += len(body)
+            headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        if self.token:
+            headers['X-Edge-Token'] = self.token
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode('utf-8', 'replace')
+            try:
+                detail = json.loads(detail).get('error', detail)
+            except ValueError:
+                pass
+            raise RuntimeError(f"{method} {path}: HTTP {e.code} {detail}") from None
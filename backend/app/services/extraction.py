@@ -0,0 +1,273 @@
+# backend/app/services/extraction.py
+
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.codecs import DEFAULT_FORMAT, get_codec
+from app.services.record_block import Record_Block, uniform_times
+
+TIMESTAMP_FORMAT = '%Y-%m-%d-%H:%M:%S'
+DEVICE_KEY = 'device'
+# Способы хранения значений параметра (Sensor_parameter.storage)
+STORAGE_RECORDS = 'records'
+STORAGE_WAVEFORM = 'waveform'
+# Делитель для перевода числовых меток пакетного формата в секунды
+TIME_UNITS = {'s': 1, 'ms': 1000, 'us': 1000000}
+# Начало эпохи для меток пакетных сообщений (наивное UTC)
+EPOCH = datetime(1970, 1, 1)
+
+_KEY_PART = re.compile(r'([^\[\]]*)((?:\[[^\[\]]*\])*)')
+_KEY_BRACKET = re.compile(r'\[([^\[\]]*)\]')
+
+def parse_key(path: str) -> Tuple[tuple, Optional[slice]]:
+    """
+    Разбирает ключ параметра в шаги доступа. Кроме вложенных ключей через точку,
+    поддерживаются индексы и срезы массивов: 'telemetry.vibration[0:512]',
+    'telemetry.channels[2]', 'telemetry.samples[:]'.
+    Срез в конце ключа возвращается отдельно: по нему считаются метки времени отсчётов.
+    """
+    steps = []
+    for part in path.split('.'):
+        match = _KEY_PART.fullmatch(part)
+        if not match:
+            raise ValueError(f"Invalid key '{path}'")
+        name, brackets = match.groups()
+        if name:
+            steps.append(name)
+        for index in _KEY_BRACKET.findall(brackets):
+            if ':' in index:
+                start, stop = (int(bound) if bound.strip() else None for bound in index.split(':', 1))
+                steps.append(slice(start, stop))
+            else:
+                steps.append(int(index))
+    final_slice = steps.pop() if steps and isinstance(steps[-1], slice) else None
+    return tuple(steps), final_slice
+
+
+def compile_getter(path) -> Callable[[Any], Any]:
+    """
+    Строит функцию извлечения значения по ключу вида 'telemetry.current_rms'
+    (или по уже разобранным шагам). Ключ разбирается один раз, при компиляции,
+    а не на каждое сообщение. Отсутствующий ключ даёт KeyError/TypeError/IndexError.
+    """
+    keys = tuple(path.split('.')) if isinstance(path, str) else tuple(path)
+    if len(keys) == 1:
+        k0, = keys
+        return lambda payload: payload[k0]
+    if len(keys) == 2:
+        k0, k1 = keys
+        return lambda payload: payload[k0][k1]
+
+    def getter(payload):
+        value = payload
+        for key in keys:
+            value = value[key]
+        return value
+    return getter
+
+
+def record_value(value) -> Optional[float]:
+    """
+    Значение записи sensor_records: число приводится к float (bool — к 1.0 / 0.0),
+    None остаётся NULL. Объекты, массивы и нечисловые строки дают TypeError / ValueError —
+    такой ключ сообщения считается неверным, а не уходит в запись (и в журнал на диске).
+    """
+    return None if value is None else float(value)
+
+
+def batch_clock(device: Dict[str, Any]) -> Callable[[int], datetime]:
+    """
+    Метки времени пакетного сообщения: по номеру отсчёта возвращает datetime.
+    device.t0 — базовое время в эпохе, device.dt — интервал между отсчётами,
+    либо device.timestamps — явный массив меток; единицы — device.time_unit (s | ms | us).
+    Метки — наивное UTC, как и всё время в sensor_records.
+    """
+    divider = TIME_UNITS[device.get('time_unit', 'ms')]
+    if 'timestamps' in device:
+        stamps = device['timestamps']
+        return lambda index: EPOCH + timedelta(seconds=stamps[index] / divider)
+    base = EPOCH + timedelta(seconds=device['t0'] / divider)
+    step = timedelta(seconds=device.get('dt', 0) / divider)
+    return lambda index: base + step * index
+
+
+def batch_step(device: Dict[str, Any]) -> Optional[int]:
+    """Шаг равномерных отсчётов пакетного сообщения в микросекундах (как у batch_clock); None — явные метки."""
+    if 'timestamps' in device:
+        return None
+    divider = TIME_UNITS[device.get('time_unit', 'ms')]
+    return timedelta(seconds=device.get('dt', 0) / divider) // timedelta(microseconds=1)
+
+
+def batch_rate(device: Dict[str, Any]) -> Optional[float]:
+    """Частота дискретизации пакетного сообщения (Гц); None — отсчёты неравномерны."""
+    if 'timestamps' in device or not device.get('dt'):
+        return None
+    return TIME_UNITS[device.get('time_unit', 'ms')] / device['dt']
+
+
+class Timestamp_Parser:
+    """
+    Разбор метки времени формата '%Y-%m-%d-%H:%M:%S' без strptime.
+    Запоминает последнюю строку: сообщения одной секунды разбираются один раз.
+    """
+
+    def __init__(self):
+        # Пара (строка, datetime) хранится одним кортежем, чтобы замена была атомарной
+        self.last = (None, None)
+
+    def __call__(self, value: str) -> datetime:
+        last_string, last_value = self.last
+        if value == last_string:
+            return last_value
+        try:
+            # Быстрый путь — только для строки ровно этого формата: разделители на местах,
+            # поля из ASCII-цифр (int принял бы и ' 1', '+1', '1_0'); иначе решает strptime
+            digits = value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19]
+            if len(value) != 19 or value[4:17:3] != '---::' or not (digits.isascii() and digits.isdigit()):
+                raise ValueError(value)
+            parsed = datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                              int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        except (ValueError, TypeError):
+            parsed = datetime.strptime(value, TIMESTAMP_FORMAT)
+        self.last = (value, parsed)
+        return parsed
+
+
+class Extraction_Plan:
+    """
+    Скомпилированный план разбора сообщений одного топика:
+    заранее построенные функции извлечения для каждого параметра датчика.
+
+    Поддерживаются два формата сообщения:
+      - одиночный: device.timestamp строкой '%Y-%m-%d-%H:%M:%S', по одному значению на ключ;
+      - пакетный: device.t0 (+ device.dt) или device.timestamps в числах эпохи,
+        по массиву отсчётов на ключ. Равномерные отсчёты (t0 + dt) остаются массивами —
+        блоком Record_Block, отсчёты с явными метками становятся отдельными записями.
+
+    Параметры с хранением 'waveform' вместо записей дают кадры формы сигнала
+    (start_time, sample_rate, samples, sensor_id, parameter_id), где samples — массив NumPy.
+    """
+
+    def __init__(self, sensor_id: int, data_keys: List[tuple], payload_format: str = DEFAULT_FORMAT):
+        self.sensor_id = sensor_id
+        # Элементы data_keys: (key, parameter_id) или (key, parameter_id, storage)
+        self.source = tuple((tuple(entry) + (STORAGE_RECORDS,))[:3] for entry in data_keys)
+        self.payload_format = payload_format or DEFAULT_FORMAT
+        # Декодер сообщений топика: json, msgpack, cbor или float_frame
+        self.decode = get_codec(self.payload_format)
+        self.getters = []
+        self.broken_keys = []
+        for key, parameter_id, storage in self.source:
+            try:
+                steps, final_slice = parse_key(key)
+            except ValueError:
+                self.broken_keys.append(key)
+                continue
+            self.getters.append((parameter_id, key, compile_getter(steps), final_slice,
+                                 storage == STORAGE_WAVEFORM))
+        self.parse_timestamp = Timestamp_Parser()
+
+    def extract(self, payload: Dict[str, Any]) -> Tuple[List[tuple], List[Record_Block], List[tuple], List[str]]:
+        """
+        Возвращает записи (timestamp, value, sensor_id, parameter_id), блоки равномерных
+        отсчётов, кадры формы сигнала и список ключей, которых не оказалось в сообщении.
+        """
+        device = payload[DEVICE_KEY]
+        if 'timestamp' in device:
+            timestamp = self.parse_timestamp(device['timestamp'])
+            clock = None
+        else:
+            clock = batch_clock(device)
+            timestamp = clock(0)
+            step = batch_step(device)
+        sensor_id = self.sensor_id
+        records = []
+        blocks = []
+        frames = []
+        invalid_keys = list(self.broken_keys)
+        for parameter_id, key, getter, final_slice, as_waveform in self.getters:
+            try:
+                value = getter(payload)
+                if final_slice is not None or isinstance(value, (list, np.ndarray)):
+                    if clock is None:
+                        # Массив отсчётов без меток времени пакетного формата не сохранить
+                        raise TypeError(key)
+                    indices = range(len(value))
+                    if final_slice is not None:
+                        indices = indices[final_slice]
+                        value = value[final_slice]
+                    if as_waveform:
+                        # Кадр требует равномерных отсчётов с шагом 1
+                        rate = batch_rate(device)
+                        if rate is None or indices.step != 1 or not len(indices):
+                            raise TypeError(key)
+                        samples = value if isinstance(value, np.ndarray) else np.asarray(value, dtype=np.float64)
+                        frames.append((clock(indices.start), rate, samples, sensor_id, parameter_id))
+                        continue
+                    # Приведение к float64 — один проход в C (массив NumPy из кодека — без копии);
+                    # нечисловой отсчёт делает неверным весь ключ
+                    value = np.asarray(value, dtype=np.float64)
+                    if step is not None:
+                        if len(indices):
+                            blocks.append(Record_Block(uniform_times(timestamp, step, indices), value,
+                                                       sensor_id, parameter_id))
+                        continue
+                    records.extend((clock(index), sample, sensor_id, parameter_id)
+                                   for index, sample in zip(indices, value.tolist()))
+                    continue
+                value = record_value(value)
+            except (KeyError, TypeError, IndexError, ValueError):
+                invalid_keys.append(key)
+                continue
+            records.append((timestamp, value, sensor_id, parameter_id))
+        return records, blocks, frames, invalid_keys
+
+
+def compile_plan(sensor_id: int, data_keys: List[tuple],
+                 payload_format: str = DEFAULT_FORMAT) -> Optional[Extraction_Plan]:
+    if not sensor_id:
+        return None
+    return Extraction_Plan(sensor_id, data_keys, payload_format)
+
+
+# Планы, скомпилированные внутри процесса-декодера (режим INGEST_WORKER_MODE=process).
+# Ключ включает набор ключей датчика, поэтому после изменений настроек копятся устаревшие
+# планы — при переполнении кэш очищается целиком и заполняется заново
+PROCESS_PLAN_CACHE = 1024
+_process_plans: Dict[tuple, Extraction_Plan] = {}
+
+
+def decode_batch(items: List[Tuple[int, tuple, str, bytes]]) \
+        -> Tuple[List[tuple], List[Record_Block], List[tuple], List[str], int]:
+    """
+    Декодирует пачку сообщений в отдельном процессе.
+    items — кортежи (sensor_id, plan.source, plan.payload_format, payload); возвращает записи,
+    блоки равномерных отсчётов, кадры формы сигнала, отсутствующие ключи
+    и число сообщений, которые не удалось разобрать.
+    """
+    records = []
+    blocks = []
+    frames = []
+    invalid_keys = []
+    errors = 0
+    for sensor_id, source, payload_format, payload in items:
+        plan = _process_plans.get((sensor_id, source, payload_format))
+        if plan is None:
+            if len(_process_plans) >= PROCESS_PLAN_CACHE:
+                _process_plans.clear()
+            plan = Extraction_Plan(sensor_id, list(source), payload_format)
+            _process_plans[(sensor_id, source, payload_format)] = plan
+        try:
+            message_records, message_blocks, message_frames, message_invalid = plan.extract(plan.decode(payload))
+        except Exception:
+            errors += 1
+            continue
+        records.extend(message_records)
+        blocks.extend(message_blocks)
+        frames.extend(message_frames)
+        invalid_keys.extend(message_invalid)
+    return records, blocks, frames, invalid_keys, errors
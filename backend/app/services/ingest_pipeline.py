@@ -0,0 +1,180 @@
+# backend/app/services/ingest_pipeline.py
+
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from threading import Thread, BoundedSemaphore, Lock
+from typing import Callable
+
+from app.services.extraction import decode_batch
+from app.services.brokers import broker_label
+from app.services.metrics import INGEST_MESSAGES, INGEST_UNROUTED, INGEST_INVALID_KEYS, INGEST_DECODE_SECONDS
+
+# Настройки конвейера по умолчанию
+INGEST_QUEUE_SIZE = 10000  # Ёмкость очереди сырых сообщений
+INGEST_PUT_TIMEOUT = 1.0  # Сколько поток сети ждёт места в очереди, прежде чем отбросить сообщение
+INGEST_DECODE_WORKERS = 2  # Число потоков/процессов декодирования
+INGEST_PROCESS_BATCH = 500  # Сообщений в одной пачке для процесса-декодера
+INGEST_PROCESS_BATCH_WAIT = 0.05  # Сек ожидания добора пачки для процесса-декодера
+
+
+class Ingest_Pipeline:
+    """
+    Конвейер приёма: поток сети → декодеры → писатель.
+    Колбэк MQTT только кладёт (topic, payload, received_at, broker_id) в ограниченную очередь;
+    сообщения всех брокеров идут в одну очередь и один писатель.
+    пул декодеров превращает сообщения в записи, блоки отсчётов и кадры и отдаёт их
+    в sink(records, blocks, frames, received) —
+    буфер MQTT_Buffer, единственный поток которого пишет пачками в БД.
+
+    mode='thread' — декодеры-потоки вызывают handle(topic, payload, received_at, broker_id);
+    handle возвращает False, если сообщение разобрать не удалось.
+    mode='process' — один поток-диспетчер собирает пачки, находит план топика
+    через resolve(topic, broker_id) и отдаёт разбор в пул процессов (extraction.decode_batch),
+    чтобы JSON разбирался на нескольких ядрах.
+    """
+
+    def __init__(self, handle: Callable, resolve: Callable, sink: Callable,
+                 workers: int = INGEST_DECODE_WORKERS, mode: str = 'thread',
+                 queue_size: int = INGEST_QUEUE_SIZE):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown ingest worker mode '{mode}'")
+        self.handle = handle
+        self.resolve = resolve
+        self.sink = sink
+        self.workers = max(int(workers), 1)
+        self.mode = mode
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.executor = None
+        self.in_flight = BoundedSemaphore(self.workers * 2)
+        self.in_flight_count = 0
+        self.counters_lock = Lock()
+        self.dropped = 0
+        self.decode_errors = 0
+        self.running = False
+
+    def start(self, wrap: Callable = None):
+        """
+        Запускает стадию декодирования. wrap(target) оборачивает цель потока,
+        например, чтобы поток работал внутри контекста приложения Flask.
+        """
+        if self.running:
+            return
+        self.running = True
+        if self.mode == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            targets = [self._dispatch_to_processes]
+        else:
+            targets = [self._decode_in_thread] * self.workers
+        for index, target in enumerate(targets):
+            thread = Thread(target=wrap(target) if wrap else target,
+                            name=f"ingest-decode-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def submit(self, topic: str, payload: bytes, received_at: float = None, broker_id: int = None):
+        # Вызывается в потоке сети: никакой работы, кроме постановки в очередь
+        item = (topic, payload, received_at if received_at is not None else time.time(), broker_id)
+        try:
+            self.queue.put(item, timeout=INGEST_PUT_TIMEOUT)
+        except queue.Full:
+            with self.counters_lock:
+                self.dropped += 1
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'decode_workers': self.workers,
+            'raw_queue_depth': self.queue.qsize(),
+            'raw_queue_limit': self.queue.maxsize,
+            'decode_in_flight': self.in_flight_count,
+            'dropped': self.dropped,
+            'decode_errors': self.decode_errors,
+        }
+
+    def _decode_in_thread(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.handle(*item) is False:
+                with self.counters_lock:
+                    self.decode_errors += 1
+
+    def _next_batch(self):
+        # Блокирующе ждём первое сообщение, затем добираем пачку в пределах короткого окна
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + INGEST_PROCESS_BATCH_WAIT
+        while len(batch) < INGEST_PROCESS_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Сигнал остановки: возвращаем его в очередь и дообрабатываем пачку
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _dispatch_to_processes(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            items = []
+            received = []
+            for topic, payload, received_at, broker_id in batch:
+                sensor_id, plan = self.resolve(topic, broker_id)
+                if sensor_id:
+                    items.append((sensor_id, plan.source, plan.payload_format, bytes(payload)))
+                    received.append(received_at)
+                    INGEST_MESSAGES.inc(broker_label(broker_id), topic)
+                else:
+                    INGEST_UNROUTED.inc()
+            if not items:
+                continue
+            # Ограничиваем число пачек в работе — так очередь сырых сообщений
+            # остаётся единственным местом, где копится отставание
+            self.in_flight.acquire()
+            with self.counters_lock:
+                self.in_flight_count += 1
+            future = self.executor.submit(decode_batch, items)
+            future.add_done_callback(partial(self._on_decoded, received, time.perf_counter()))
+
+    def _on_decoded(self, received, started, future):
+        try:
+            records, blocks, frames, invalid_keys, errors = future.result()
+            INGEST_DECODE_SECONDS.observe(time.perf_counter() - started)
+            for key in set(invalid_keys):
+                print(f"Invalid key: {key}")
+            if invalid_keys:
+                INGEST_INVALID_KEYS.inc(value=len(invalid_keys))
+            self.sink(records, blocks, frames, received)
+            with self.counters_lock:
+                self.decode_errors += errors
+        except Exception as e:
+            print(f"Ingest decode error: {e}")
+        finally:
+            with self.counters_lock:
+                self.in_flight_count -= 1
+            self.in_flight.release()
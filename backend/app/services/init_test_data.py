@@ -72,8 +72,14 @@ def insert_bulk_data(count):
         time.sleep(0.0001)
         batch.append(data)
 
-    # Вставляем весь список сразу одной транзакцией
+    # Секции sensor_records под эти записи (на PostgreSQL), затем весь список одной транзакцией
+    # и агрегаты серий в ней же
+    from app.services.partitions import partition_manager
+    from app.services.rollups import rollup_manager
+    rows = [(data.timestamp, data.value, data.sensor_id, data.parameter_id) for data in batch]
+    partition_manager.ensure(db.session.connection(), rows)
     db.session.bulk_save_objects(batch)
+    rollup_manager.update(db.session.connection(), rows)
     db.session.commit()
 
     print(f"Inserted {count} rows in bulk!")
@@ -109,8 +115,20 @@ def create_tables():
     from app.models.sensor import Sensor
     from app.models.sensor_parameter import Sensor_parameter
     from app.models.sensor_record import Sensor_Record
+    from app.models.sensor_rollup import Sensor_Rollup_1s, Sensor_Rollup_1m, Sensor_Rollup_1h, Rollup_Watermark
+    from app.models.waveform_frame import Waveform_Frame
+    from app.models.capture import Capture_Trigger, Capture
+    from app.models.derived_parameter import Derived_Parameter
+    from app.models.alarm import Alarm_Rule, Alarm_Event
+    from app.models.anomaly import Anomaly
+    from app.models.ingest_worker import Ingest_Worker
+    from app.models.broker import Broker
+    from app.models.edge_cursor import Edge_Cursor
+    from app.models.routing_change import Routing_Change
     from app.models.equipment import Equipment
     from app.models.configuration import Configuration
+    from app.models.standing_result import Standing_Result
+    from app.models.series_stat import Series_Stat
 
     # Очистка и пересоздание таблиц
     db.drop_all()
@@ -120,10 +138,20 @@ def create_tables():
     Role.query.delete()
     User.query.delete()
     Sensor.query.delete()
+    Broker.query.delete()
     Sensor_Record.query.delete()
+    Waveform_Frame.query.delete()
+    Capture.query.delete()
+    Capture_Trigger.query.delete()
+    Derived_Parameter.query.delete()
+    Alarm_Event.query.delete()
+    Anomaly.query.delete()
+    Alarm_Rule.query.delete()
     Sensor_parameter.query.delete()
     Sensor_type.query.delete()
     Parameter.query.delete()
     Equipment.query.delete()
     Configuration.query.delete()
+    Ingest_Worker.query.delete()
+    Edge_Cursor.query.delete()
     db.session.commit()
\ No newline at end of file
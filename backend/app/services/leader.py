@@ -0,0 +1,147 @@
+# backend/app/services/leader.py
+
+import os
+from typing import Optional
+
+from sqlalchemy import text
+
+from app import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LEADER_NONE = 'none'  # Без защиты: каждый процесс с приёмом подключается к MQTT
+LEADER_FILE = 'file'  # Блокировка файла — процессы на одном хосте
+LEADER_DB = 'db'  # Advisory-блокировка PostgreSQL — процессы на любых хостах с общей БД
+LEADER_AUTO = 'auto'  # db для PostgreSQL, иначе file
+LEADER_KINDS = (LEADER_NONE, LEADER_FILE, LEADER_DB, LEADER_AUTO)
+LEADER_RETRY = 5.0  # Секунд между попытками резервного процесса стать лидером
+LEADER_LOCK_KEY = 0x43564449  # Ключ pg_advisory_lock лидера приёма ("CVDI")
+
+
+class File_Leader_Lock:
+    """
+    Эксклюзивная блокировка файла. Снимается ОС при завершении процесса,
+    в том числе аварийном, поэтому «зависшего» лидера не бывает.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def acquire(self) -> bool:
+        if self.file is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(f"{os.getpid()}\n")
+        file.flush()
+        self.file = file
+        return True
+
+    def check(self) -> bool:
+        return self.file is not None
+
+    def release(self):
+        if self.file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+    def describe(self) -> str:
+        return f"file {self.path}"
+
+
+class Db_Leader_Lock:
+    """
+    Сессионная advisory-блокировка PostgreSQL на отдельном соединении вне пула.
+    Держится, пока живо соединение: при падении процесса или обрыве связи
+    с БД её сразу может взять резервный процесс.
+    """
+
+    def __init__(self, app, key: int = LEADER_LOCK_KEY):
+        self.app = app
+        self.key = key
+        self.connection = None
+
+    def acquire(self) -> bool:
+        if self.connection is not None:
+            return True
+        with self.app.app_context():
+            connection = db.engine.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': self.key}).scalar()
+            # Сессионная блокировка переживает commit, а соединение не висит «idle in transaction»
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    def check(self) -> bool:
+        # Обрыв соединения означает потерю блокировки: лидером уже может быть другой процесс
+        if self.connection is None:
+            return False
+        try:
+            self.connection.execute(text("SELECT 1"))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print(f"Ingest leader lock connection lost: {e}")
+            self.connection.invalidate()
+            self.connection = None
+            return False
+
+    def release(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': self.key})
+            self.connection.commit()
+        except Exception as e:
+            print(f"Failed to release ingest leader lock: {e}")
+        finally:
+            self.connection.close()
+            self.connection = None
+
+    def describe(self) -> str:
+        return f"postgresql advisory lock {self.key}"
+
+
+def make_leader_lock(app) -> Optional[object]:
+    """Блокировка лидера приёма по INGEST_LEADER_LOCK; None — защита не нужна."""
+    kind = app.config.get('INGEST_LEADER_LOCK', LEADER_AUTO)
+    if kind not in LEADER_KINDS:
+        raise ValueError(f"Unknown ingest leader lock '{kind}'")
+    if kind == LEADER_NONE:
+        return None
+    if kind == LEADER_AUTO:
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        kind = LEADER_DB if uri.startswith('postgresql') else LEADER_FILE
+    if kind == LEADER_DB:
+        return Db_Leader_Lock(app)
+    path = app.config.get('INGEST_LEADER_LOCK_FILE') or os.path.join(app.instance_path, 'ingest.lock')
+    return File_Leader_Lock(path)
@@ -0,0 +1,188 @@
+# backend/app/services/metrics.py
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Границы корзин гистограмм по умолчанию, сек (как в клиентах Prometheus)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0)
+DECODE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25)
+BATCH_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 50000)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_sample(name: str, labels: Dict[str, str], value) -> str:
+    if labels:
+        pairs = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        return f"{name}{{{pairs}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+class Counter:
+    """Монотонный счётчик с метками; inc вызывается в потоках приёма, поэтому под локом."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = Lock()
+        self.values = {}
+
+    def inc(self, *label_values, value=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + value
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        with self.lock:
+            values = list(self.values.items())
+        if not values and not self.labels:
+            values = [((), 0)]
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in values]
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами (le — включительно).
+    observe_many раскладывает массив значений по корзинам одним вызовом NumPy —
+    для задержек всех сообщений пачки после commit.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.lock = Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def observe_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return
+        counts = np.bincount(np.searchsorted(self.buckets, values, side='left'), minlength=len(self.counts))
+        total = float(values.sum())
+        with self.lock:
+            for index, count in enumerate(counts.tolist()):
+                self.counts[index] += count
+            self.sum += total
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", {'le': _format_value(float(bound))}, cumulative))
+        samples.append((f"{self.name}_sum", {}, total))
+        samples.append((f"{self.name}_count", {}, cumulative))
+        return samples
+
+
+class Metrics_Registry:
+    """
+    Метрики процесса в текстовом формате Prometheus (версия 0.0.4).
+    Счётчики и гистограммы обновляются по ходу приёма; состояние (глубины
+    очередей, подключения брокеров) снимают сборщики в момент опроса.
+    Сборщик возвращает [(имя, тип, описание, [(метки, значение), ...]), ...].
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors: List[Callable[[], list]] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], list]):
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        families = [(metric.name, metric.kind, metric.help, metric.samples()) for metric in self.metrics]
+        for collect in self.collectors:
+            try:
+                families.extend((name, kind, help, [(name, labels, value) for labels, value in values])
+                                for name, kind, help, values in collect())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_format_sample(sample_name, labels, value) for sample_name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+class _Metrics_Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') not in ('/metrics', '/api/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """HTTP-сервер только для /metrics — в процессе приёма без веб-приложения (APP_MODE=ingest)."""
+    server = ThreadingHTTPServer((host, port), _Metrics_Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics listening on {host}:{server.server_port}/metrics")
+    return server
+
+
+metrics = Metrics_Registry()
+
+# Метрики конвейера приёма (обновляются в mqtt_service и ingest_pipeline)
+INGEST_MESSAGES = metrics.counter('cv_ingest_messages_total', 'MQTT messages routed to a sensor', ('broker', 'topic'))
+INGEST_UNROUTED = metrics.counter('cv_ingest_unrouted_messages_total', 'MQTT messages on topics without a sensor')
+INGEST_INVALID_KEYS = metrics.counter('cv_ingest_invalid_keys_total', 'Telemetry keys not matching a sensor parameter')
+INGEST_DECODE_SECONDS = metrics.histogram('cv_ingest_decode_seconds',
+                                          'Decode time of one message (of one batch in process mode)', DECODE_BUCKETS)
+INGEST_FLUSH_BATCH = metrics.histogram('cv_ingest_flush_batch_size',
+                                       'Records, frames and events written by one flush', BATCH_BUCKETS)
+INGEST_COMMIT_SECONDS = metrics.histogram('cv_ingest_commit_seconds', 'Duration of one flush write and commit')
+INGEST_FLUSH_FAILURES = metrics.counter('cv_ingest_flush_failures_total', 'Flushes that failed to commit')
+INGEST_RECEIVE_TO_COMMIT = metrics.histogram('cv_ingest_receive_to_commit_seconds',
+                                             'Time from MQTT receive to DB commit per message', LAG_BUCKETS)
@@ -1,139 +1,691 @@
 import json
-from threading import Lock
+import time
+from threading import Lock, Condition, Thread
 from collections import defaultdict
 from datetime import datetime
 
-from app import db, mqtt, cache
+from app import db, mqtt
 
-from app.models.sensor_record import Sensor_Record
-from app.models.sensor_parameter import Sensor_parameter
-from app.models.sensor import Sensor
+from app.services.record_writer import write_records, write_frames, write_events
+from app.services.record_block import block_rows
+from app.services.codecs import set_json_decoder
+from app.services.topic_router import topic_router, subscription_filters
+from app.services.spill_log import Spill_Log
+from app.services.dedup import Recent_Key_Window, DEDUP_WINDOW
+from app.services.compression import Series_Compressor
+from app.services.capture import Capture_Engine
+from app.services.derived import Derived_Engine
+from app.services.alarms import Alarm_Engine
+from app.services.running_stats import Running_Stats, STATS_HORIZONS, store_snapshot
+from app.services.anomaly import Anomaly_Detector
+from app.services.standing import standing_engine, STANDING_MAX_POINTS, STANDING_REFRESH_INTERVAL
+from app.services.brokers import broker_manager, broker_label, DEFAULT_BROKER
+from app.services.metrics import metrics, INGEST_MESSAGES, INGEST_UNROUTED, INGEST_INVALID_KEYS, \
+    INGEST_DECODE_SECONDS, INGEST_FLUSH_BATCH, INGEST_COMMIT_SECONDS, INGEST_FLUSH_FAILURES, INGEST_RECEIVE_TO_COMMIT
+from app.services.sharding import Shard_Coordinator, shared_filters, SHARD_NONE, SHARD_HASH, SHARD_SHARED, \
+    SHARD_HEARTBEAT, SHARD_TIMEOUT
+from app.services.ingest_pipeline import Ingest_Pipeline, INGEST_DECODE_WORKERS, INGEST_QUEUE_SIZE
+from app.services.edge import Edge_Forwarder, EDGE_FORWARD_INTERVAL, EDGE_BATCH_ROWS
+from app.services.partitions import partition_manager
 # Настройки буферизации
-BUFFER_MAX_SIZE = 1000  # Максимальный размер буфера перед записью
+BUFFER_MAX_SIZE = 1000  # Стартовый размер пачки, при котором флашер будится досрочно
 BUFFER_FLUSH_INTERVAL = 10  # Секунд между записями (если буфер не заполнен)
+BUFFER_MIN_BATCH = 100  # Нижняя граница адаптивного размера пачки
+BUFFER_MAX_BATCH = 20000  # Верхняя граница адаптивного размера пачки
+BUFFER_TARGET_COMMIT_LATENCY = 0.5  # Желаемое время одного commit (сек)
+BUFFER_MEMORY_LIMIT = 100000  # Потолок записей в памяти, сверх него — журнал на диске
 
 app = None  # Глобальная переменная
 
 def init_app(flask_app):
+    """Запускает приём: подключение к брокерам, конвейер декодирования и флашер буфера."""
     global app
     app = flask_app
+    set_json_decoder(app.config.get('MQTT_JSON_DECODER', 'auto'))
+    if app.config.get('MQTT_ALARM_TOPIC'):
+        mqtt_buffer.publish = publish_alarm
+    mqtt_buffer.configure(spill_dir=app.config.get('MQTT_SPILL_DIR'),
+                          memory_limit=app.config.get('MQTT_BUFFER_MEMORY_LIMIT', BUFFER_MEMORY_LIMIT),
+                          dedup_window=app.config.get('MQTT_DEDUP_WINDOW', DEDUP_WINDOW),
+                          stats_horizons=app.config.get('MQTT_STATS_HORIZONS', STATS_HORIZONS))
+    standing_engine.max_points = app.config.get('STANDING_MAX_POINTS', STANDING_MAX_POINTS)
+    shard_mode = app.config.get('INGEST_SHARD_MODE', SHARD_NONE)
+    # Процесс шарда видит только часть пачек — серии постоянных конфигураций перечитываются из БД
+    standing_engine.refresh_interval = None if shard_mode == SHARD_NONE else \
+        app.config.get('STANDING_REFRESH_INTERVAL', STANDING_REFRESH_INTERVAL)
+    standing_engine.owns = None
+    mqtt_buffer.after_commit = standing_engine.on_commit
+    mqtt_buffer.start()
+
+    global ingest_pipeline
+    ingest_pipeline = Ingest_Pipeline(handle=process_message,
+                                      resolve=get_sensor_and_params,
+                                      sink=lambda records, blocks, frames, received:
+                                          mqtt_buffer.add_to_buffer(None, records, frames, received, blocks),
+                                      workers=app.config.get('INGEST_DECODE_WORKERS', INGEST_DECODE_WORKERS),
+                                      mode=app.config.get('INGEST_WORKER_MODE', 'thread'),
+                                      queue_size=app.config.get('INGEST_QUEUE_SIZE', INGEST_QUEUE_SIZE))
+    ingest_pipeline.start(wrap=_with_app_context)
+    broker_manager.on_message = submit_broker_message
+    broker_manager.client_id = app.config.get('MQTT_CLIENT_ID', '')
+    if shard_mode == SHARD_HASH:
+        global shard_coordinator
+        shard_coordinator = Shard_Coordinator(app.config.get('INGEST_WORKER_ID'),
+                                              heartbeat=app.config.get('INGEST_SHARD_HEARTBEAT', SHARD_HEARTBEAT),
+                                              timeout=app.config.get('INGEST_SHARD_TIMEOUT', SHARD_TIMEOUT))
+        topic_router.owns = shard_coordinator.owns
+        standing_engine.owns = shard_coordinator.owns
+        shard_coordinator.start(app, on_change=topic_router.invalidate)
+    if app.config.get('EDGE_FORWARD_URL'):
+        global edge_forwarder
+        edge_forwarder = Edge_Forwarder(app.config['EDGE_FORWARD_URL'], app.config.get('EDGE_NODE_ID'),
+                                        token=app.config.get('EDGE_FORWARD_TOKEN'),
+                                        interval=app.config.get('EDGE_FORWARD_INTERVAL', EDGE_FORWARD_INTERVAL),
+                                        batch_rows=app.config.get('EDGE_FORWARD_BATCH', EDGE_BATCH_ROWS))
+        edge_forwarder.start(app)
+    # Секции sensor_records наперёд и сроки хранения — забота процесса приёма
+    partition_manager.start(app)
+    # Подключение к брокеру по умолчанию — только в процессе приёма (в веб-процессах MQTT не нужен)
+    mqtt.init_app(app)
     connect_to_topics()
 
+
+def shutdown():
+    """
+    Штатная остановка приёма: сначала отключаемся от брокеров, затем дожидаемся
+    разбора уже принятых сообщений и записываем буфер, после чего уходим из шардов.
+    """
+    global ingest_pipeline, shard_coordinator, edge_forwarder
+    if ingest_pipeline is None:
+        return
+    mqtt.client.disconnect()
+    mqtt.client.loop_stop()
+    broker_manager.stop()
+    ingest_pipeline.stop()
+    mqtt_buffer.stop()
+    if shard_coordinator is not None:
+        shard_coordinator.stop()
+        shard_coordinator = None
+    if edge_forwarder is not None:
+        edge_forwarder.stop()
+        edge_forwarder = None
+    partition_manager.stop()
+    ingest_pipeline = None
+    print("MQTT ingest stopped")
+
 class MQTT_Buffer:
+    """
+    Двойной буфер записей с отдельным потоком-флашером.
+    Поток MQTT только дописывает записи в активный буфер под локом,
+    флашер подменяет буфер на пустой и пишет в БД уже вне лока,
+    поэтому commit в PostgreSQL не блокирует приём сообщений.
+
+    Объём буфера в памяти ограничен memory_limit записями: сверх него,
+    а также при неудачной записи в БД, флашер переносит записи в журнал на диске
+    (Spill_Log), который воспроизводится по порядку, когда БД снова доступна.
+    Пока идёт запись пачки в БД, буфер может временно превысить memory_limit:
+    поток приёма под локом только дописывает буфер, а всё медленное — запись
+    на диск, вычисление производных параметров и аномалий, публикация тревог —
+    делает флашер вне лока.
+
+    Повторные доставки (QoS 1) отсеиваются окном недавних ключей ещё до буфера;
+    то, что старше окна, отбрасывает уникальный ключ таблицы при вставке.
+    Серии с настроенным сжатием (deadband, swinging door) попадают в буфер
+    только опорными точками, с прореживанием — каждым N-м отсчётом, кроме окон
+    захвата вокруг событий (Capture_Engine). Производные параметры вычисляются
+    по входным сериям один раз на пачку при подмене буфера (Derived_Engine).
+    Правила тревог (Alarm_Engine) и текущая статистика серий (Running_Stats)
+    считаются по полному потоку отсчётов и по производным параметрам.
+    Равномерные отсчёты пакетных сообщений (Record_Block) остаются массивами
+    до COPY; в записи разворачиваются только блоки серий, которые какая-то
+    из стадий выше смотрит поотсчётно.
+    """
+
     def __init__(self):
         self.buffer = defaultdict(list)
+        self.blocks = []  # Блоки равномерных отсчётов (Record_Block) — массивами до самого COPY
+        self.frames = []  # Кадры формы сигнала (Waveform_Frame) пишутся в той же транзакции
+        self.events = []  # События стадий приёма: (имя таблицы, строка-словарь)
+        self.received = []  # Время приёма сообщений буфера — для задержки «приём → commit»
+        self.size = 0
         self.lock = Lock()
+        self.flush_requested = Condition(self.lock)
         self.last_flush_time = datetime.now()
+        self.batch_size = BUFFER_MAX_SIZE
+        self.last_commit_latency = 0.0
+        self.memory_limit = BUFFER_MEMORY_LIMIT
+        self.spill_log = None
+        self.recent_keys = Recent_Key_Window()
+        self.compressor = Series_Compressor()
+        self.capture = Capture_Engine()
+        self.derived = Derived_Engine()
+        self.alarms = Alarm_Engine()
+        self.running_stats = Running_Stats()
+        self.anomaly = Anomaly_Detector()
+        # Серии, которые стадии приёма смотрят поотсчётно: их блоки разворачиваются в записи
+        self.per_sample = set()
+        # Вызывается после каждого успешного commit пачки (постоянные конфигурации)
+        self.after_commit = None
+        # Публикация тревоги (строки alarm_events) и тревоги, ждущие публикации флашером
+        self.publish = None
+        self.to_publish = []
+        self.running = False
+        self.thread = None
+
+    def configure(self, spill_dir=None, memory_limit=BUFFER_MEMORY_LIMIT, dedup_window=DEDUP_WINDOW,
+                  stats_horizons=STATS_HORIZONS):
+        self.memory_limit = memory_limit
+        self.recent_keys = Recent_Key_Window(dedup_window)
+        self.running_stats = Running_Stats(stats_horizons)
+        if spill_dir:
+            self.spill_log = Spill_Log(spill_dir)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, name="mqtt-buffer-flusher", daemon=True)
+        self.thread.start()
 
-    def add_to_buffer(self, topic, records):
+    def configure_stages(self, table):
+        # Настройки стадий перед буфером берутся из снимка таблицы маршрутизации
         with self.lock:
+            self.capture.configure(table.triggers, table.decimation)
+            self.derived.configure(table.derived)
+            self.alarms.configure(table.alarm_rules)
+            self.anomaly.configure(table.anomaly_thresholds)
+            released = self.compressor.configure(table.compression)
+            self.buffer[None].extend(released)
+            self.size += len(released)
+            self.per_sample = (self.derived.input_keys | set(self.anomaly.thresholds) | set(self.alarms.rules)
+                               | set(self.capture.triggers) | set(self.capture.pre_windows)
+                               | set(self.capture.decimation) | set(self.compressor.settings))
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            # Удержанные компрессором последние точки серий тоже должны попасть в БД
+            released = self.compressor.drain()
+            self.buffer[None].extend(released)
+            self.size += len(released)
+            self.events.extend(self.capture.drain())
+            self.flush_requested.notify()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        # Дописываем то, что осталось после остановки потока
+        alarms, self.to_publish = self.to_publish, []
+        self._publish(alarms)
+        self.flush_buffer()
+
+    def add_to_buffer(self, topic, records, frames=(), received=(), blocks=()):
+        with self.lock:
+            records = self.recent_keys.filter_records(records)
+            frames = self.recent_keys.filter_frames(frames)
+            blocks = self.recent_keys.filter_blocks(blocks)
+            if (records or frames or blocks) and len(self.received) < self.memory_limit:
+                # При долгом отказе БД задержку не теряем для самых старых сообщений — они и самые отстающие
+                self.received.extend(received)
+            if blocks:
+                blocks, expanded = self._split_blocks(blocks)
+                records = records + expanded
+                self.running_stats.update_blocks(blocks)
+                self.blocks.extend(blocks)
+                self.size += block_rows(blocks)
+            self.derived.collect(records)
+            self.anomaly.collect(records)
+            self.running_stats.update(records)
+            alarms = self.alarms.apply(records)
+            if alarms and self.publish is not None:
+                # Публикует флашер — здесь только очередь
+                self.to_publish.extend(alarms)
+            # Захват событий идёт по полному потоку отсчётов, сжатие — уже после прореживания
+            records, events = self.capture.apply(records)
+            events.extend(alarms)
+            records = self.compressor.apply(records)
             self.buffer[topic].extend(records)
-            if self.should_flush():
-                self.flush_buffer()
+            self.frames.extend(frames)
+            self.events.extend(events)
+            self.size += len(records) + len(frames) + len(events)
+            if self.to_publish or self.should_flush() or self.over_limit():
+                self.flush_requested.notify()
 
+    def _split_blocks(self, blocks):
+        # Блоки серий без поотсчётных стадий идут дальше массивами, остальные — записями
+        if not self.per_sample:
+            return blocks, []
+        kept, expanded = [], []
+        for block in blocks:
+            if block.key in self.per_sample:
+                expanded.extend(block.records())
+            else:
+                kept.append(block)
+        return kept, expanded
+
+    def stats(self):
+        return {
+            'buffer_depth': self.size,
+            'batch_size': self.batch_size,
+            'memory_limit': self.memory_limit,
+            'last_commit_latency': self.last_commit_latency,
+            'duplicates_dropped': self.recent_keys.duplicates,
+            'compressed_away': self.compressor.compressed_away,
+            'decimated_away': self.capture.decimated_away,
+            'captures': self.capture.captures,
+            'derived_records': self.derived.derived_records,
+            'alarms_raised': self.alarms.raised,
+            'alarms_cleared': self.alarms.cleared,
+            'anomalies': self.anomaly.anomalies,
+            'spilled_pending': self.spill_log.pending_rows if self.spill_log is not None else 0,
+            'spill_quarantined': self.spill_log.quarantined if self.spill_log is not None else 0,
+        }
 
     def should_flush(self):
-        buffer_size = sum(len(records) for records in self.buffer.values())
         time_since_flush = (datetime.now() - self.last_flush_time).total_seconds()
-        return buffer_size >= BUFFER_MAX_SIZE or time_since_flush >= BUFFER_FLUSH_INTERVAL
+        return self.size >= self.batch_size or time_since_flush >= BUFFER_FLUSH_INTERVAL
 
-    def flush_buffer(self):
-        try:
-            all_records = []
-            for topic, records in self.buffer.items():
-                all_records.extend(records)
+    def over_limit(self):
+        return self.spill_log is not None and self.size >= self.memory_limit
 
-            if all_records:
+    def _run(self):
+        retry_at = 0.0  # После неудачной записи БД не трогаем до этого момента (time.monotonic)
+        while True:
+            with self.lock:
+                # Ждём заполнения пачки или истечения интервала — по реальному таймеру,
+                # а не при приходе следующего сообщения; тревоги и переполнение будят сразу
+                while self.running and not self.to_publish and not self.over_limit() \
+                        and not (self.should_flush() and time.monotonic() >= retry_at):
+                    remaining = BUFFER_FLUSH_INTERVAL - (datetime.now() - self.last_flush_time).total_seconds()
+                    self.flush_requested.wait(timeout=max(remaining, retry_at - time.monotonic(), 0.01))
+                if not self.running:
+                    return
+                alarms, self.to_publish = self.to_publish, []
+            self._publish(alarms)
+            if time.monotonic() < retry_at:
+                if self.over_limit():
+                    # БД недавно отказала: не ждём её, а переносим буфер на диск, чтобы память не росла.
+                    # Всё, что в журнале, старше того, что остаётся в памяти — порядок сохраняется
+                    self._spill()
+            elif self.should_flush() or self.over_limit():
+                # БД недоступна — не крутим неудачные попытки в цикле, ждём интервал
+                retry_at = 0.0 if self.flush_buffer() else time.monotonic() + BUFFER_FLUSH_INTERVAL
 
-                with app.app_context():
-                    db.session.bulk_save_objects(all_records)
-                    db.session.commit()
-                    print(f"Flushed {len(all_records)} records to DB")
+    def _publish(self, alarms):
+        if self.publish is None:
+            return
+        for _, row in alarms:
+            try:
+                self.publish(row)
+            except Exception as e:
+                print(f"Failed to publish alarm: {e}")
 
-            self.buffer.clear()
+    def _spill(self):
+        batch, received = self._swap()
+        self.spill_log.append(*batch)
+        self._restore_received(received)
+
+    def _take_all(self):
+        # Вызывается под локом: только отцепляет текущий буфер и входы вычислений на пачку
+        buffer, self.buffer = self.buffer, defaultdict(list)
+        blocks, self.blocks = self.blocks, []
+        frames, self.frames = self.frames, []
+        events, self.events = self.events, []
+        self.size = 0
+        all_records = []
+        for topic, records in buffer.items():
+            all_records.extend(records)
+        return all_records, frames, events, blocks, self.derived.take(), self.anomaly.take()
+
+    def _swap(self):
+        # Подмена активного буфера под локом: дальше работаем с отцепленной копией
+        with self.lock:
+            # Окна захвата замолчавших серий закрываются по часам — иначе строка captures не появится
+            self.events.extend(self.capture.expire())
+            all_records, frames, events, blocks, derived_inputs, anomaly_inputs = self._take_all()
+            received, self.received = self.received, []
             self.last_flush_time = datetime.now()
+        # Производные параметры — одним векторным вычислением на всю пачку, вне лока
+        derived = self.derived.evaluate(derived_inputs)
+        if derived:
+            all_records.extend(derived)
+            with self.lock:
+                # Статистика и правила тревог общие с потоком приёма — их под локом, это O(пачки)
+                self.running_stats.update(derived)
+                alarms = self.alarms.apply(derived)
+            self._publish(alarms)
+            events.extend(alarms)
+            anomaly_inputs.extend(self.anomaly.select(derived))
+        # Оценка аномалий — тоже раз на пачку, включая производные серии
+        events.extend(self.anomaly.evaluate(anomaly_inputs))
+        return (all_records, frames, events, blocks), received
+
+    def _restore_received(self, received):
+        # Неудачная запись: время приёма учтём при commit, когда бы он ни случился
+        with self.lock:
+            self.received = received + self.received
+
+    def _restore(self, all_records, frames, events, blocks=()):
+        # Без журнала возвращаем неудачно записанные записи в начало буфера, сохраняя порядок
+        with self.lock:
+            self.size += len(all_records) + len(frames) + len(events) + block_rows(blocks)
+            buffer = defaultdict(list)
+            buffer[None] = list(all_records)
+            for topic, records in self.buffer.items():
+                buffer[topic].extend(records)
+            self.buffer = buffer
+            self.blocks = list(blocks) + self.blocks
+            self.frames = frames + self.frames
+            self.events = events + self.events
+
+    def _adapt_batch_size(self, latency, count):
+        # Подстраиваем размер пачки под измеренное время commit.
+        # Растём только если пачка была полной: флаш по таймеру ничего не говорит о пределе
+        self.last_commit_latency = latency
+        if latency < BUFFER_TARGET_COMMIT_LATENCY / 2 and count >= self.batch_size:
+            self.batch_size = min(self.batch_size * 2, BUFFER_MAX_BATCH)
+        elif latency > BUFFER_TARGET_COMMIT_LATENCY:
+            self.batch_size = max(self.batch_size // 2, BUFFER_MIN_BATCH)
+
+    def _write_batch(self, all_records, frames=(), events=(), blocks=()):
+        with app.app_context():
+            try:
+                write_records(all_records, blocks=blocks)
+                write_frames(frames)
+                write_events(events)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            self._notify_commit(all_records, frames, blocks)
+
+    def _notify_commit(self, all_records, frames, blocks=()):
+        # Ошибка подписчика не должна возвращать уже записанную пачку в буфер
+        if self.after_commit is None:
+            return
+        try:
+            self.after_commit(all_records, frames, blocks)
+        except Exception as e:
+            print(f"After-commit handler failed: {e}")
+
+    def flush_buffer(self):
+        # Сначала воспроизводим журнал: в нём более старые записи
+        if self.spill_log is not None and self.spill_log.has_pending():
+            try:
+                replayed = self.spill_log.replay(self._write_batch)
+                if replayed:
+                    print(f"Replayed {replayed} spilled records to DB")
+            except Exception as e:
+                print(f"Failed to replay spill log: {e}")
+                batch, received = self._swap()
+                self.spill_log.append(*batch)
+                self._restore_received(received)
+                return False
+
+        (all_records, frames, events, blocks), received = self._swap()
+        if not all_records and not frames and not events and not blocks:
+            # Пустой флаш по таймеру: даём дочитать новые постоянные конфигурации
+            with app.app_context():
+                self._notify_commit([], [])
+            self._store_stats()
+            return True
+
+        started = time.perf_counter()
+        try:
+            self._write_batch(all_records, frames, events, blocks)
         except Exception as e:
-            db.session.rollback()
             print(f"Failed to flush buffer: {e}")
+            INGEST_FLUSH_FAILURES.inc()
+            if self.spill_log is not None:
+                self.spill_log.append(all_records, frames, events, blocks)
+            else:
+                self._restore(all_records, frames, events, blocks)
+            self._restore_received(received)
+            return False
+        latency = time.perf_counter() - started
+        committed_at = time.time()
+        record_count = len(all_records) + block_rows(blocks)
+        count = record_count + len(frames) + len(events)
+        INGEST_COMMIT_SECONDS.observe(latency)
+        INGEST_FLUSH_BATCH.observe(count)
+        INGEST_RECEIVE_TO_COMMIT.observe_many([committed_at - received_at for received_at in received])
+        self._adapt_batch_size(latency, count)
+        print(f"Flushed {record_count} records and {len(frames)} frames to DB in {latency:.3f}s "
+              f"(batch size {self.batch_size})")
+        self._store_stats()
+        return True
+
+    def _store_stats(self):
+        # Снимок изменившихся серий — под локом, запись в series_stats — уже без него
+        with self.lock:
+            rows = self.running_stats.snapshot()
+        if not rows:
+            return
+        with app.app_context():
+            try:
+                store_snapshot(rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to store series stats: {e}")
+                with self.lock:
+                    self.running_stats.restore(rows)
 
 mqtt_buffer = MQTT_Buffer()
+ingest_pipeline = None  # Создаётся в init_app по настройкам приложения
+shard_coordinator = None  # Только в режиме INGEST_SHARD_MODE=hash
+edge_forwarder = None  # Только на граничном узле (задан EDGE_FORWARD_URL)
 
 @mqtt.on_connect()
 def handle_connect(client, userdata, flags, rc):
     print("MQTT Connected")
+    broker_manager.stats_for(DEFAULT_BROKER).connection(True)
+
+
+@mqtt.on_disconnect()
+def handle_disconnect(*args):
+    broker_manager.stats_for(DEFAULT_BROKER).connection(False)
 
 
 @mqtt.on_message()
 def handle_message(client, userdata, message):
-    with app.app_context():
-        try:
-            topic = message.topic
-            payload = json.loads(message.payload.decode())
-
-            # Получаем sensor_id и параметры из кэша/БД
-            sensor_id, data_keys = get_sensor_and_params(topic)
-            if not sensor_id:
-                return
-
-            # Формируем записи для буфера
-            records = []
-            timestamp = datetime.strptime(payload['device']['timestamp'], '%Y-%m-%d-%H:%M:%S')
-
-            for key in data_keys:
-                keys = key.key.split('.')
-                value = payload
-                key_is_valid = True
-                for nested_key in keys:
-                    if isinstance(value, dict) and nested_key in value:
-                        value = value[nested_key]
-                    else:
-                        key_is_valid = False
-                        break
-                if not key_is_valid:
-                    print(f"Invalid key: {key.key}")
-                    continue
-
-                records.append(Sensor_Record(
-                    sensor_id=sensor_id,
-                    parameter_id=key.parameter_id,
-                    value=value,
-                    timestamp=timestamp
-                ))
-
-            # Добавляем в буфер
-            mqtt_buffer.add_to_buffer(topic, records)
-
-        except json.JSONDecodeError as e:
-            print(f"JSON Error: {e}")
-        except Exception as e:
-            print(f"MQTT Handler Error: {e}")
+    # Поток сети только ставит сырое сообщение в очередь конвейера
+    received_at = time.time()
+    broker_manager.stats_for(DEFAULT_BROKER).message(len(message.payload), received_at)
+    ingest_pipeline.submit(message.topic, message.payload, received_at)
+
+
+def submit_broker_message(broker_id, topic, payload, received_at):
+    # Сообщения дополнительных брокеров идут в тот же конвейер, что и брокера по умолчанию
+    ingest_pipeline.submit(topic, payload, received_at, broker_id)
+
+
+def process_message(topic, payload, received_at=None, broker_id=DEFAULT_BROKER):
+    """Стадия декодирования: сырое сообщение → записи в буфер."""
+    if isinstance(payload, memoryview):
+        payload = bytes(payload)
+    started = time.perf_counter()
+    try:
+        # Получаем скомпилированный план разбора топика из таблицы маршрутизации
+        sensor_id, plan = get_sensor_and_params(topic, broker_id)
+        if not sensor_id:
+            INGEST_UNROUTED.inc()
+            return
+        INGEST_MESSAGES.inc(broker_label(broker_id), topic)
+
+        # Декодер определяется форматом датчика (или его типа): json, msgpack, cbor, float_frame
+        payload = plan.decode(payload)
+
+        # Формируем записи для буфера: (timestamp, value, sensor_id, parameter_id)
+        # и кадры формы сигнала для параметров с хранением waveform
+        records, blocks, frames, invalid_keys = plan.extract(payload)
+        for key in invalid_keys:
+            print(f"Invalid key: {key}")
+        if invalid_keys:
+            INGEST_INVALID_KEYS.inc(value=len(invalid_keys))
+        if received_at is not None and (records or blocks):
+            # Задержка доставки по брокеру: от метки времени последнего отсчёта до приёма
+            stats = broker_manager.stats_for(broker_id)
+            newest = max([record[0] for record in records if record[0] is not None]
+                         + [block.end() for block in blocks], default=None)
+            if stats is not None and newest is not None:
+                stats.delivery_lag(received_at - newest.timestamp())
+
+        INGEST_DECODE_SECONDS.observe(time.perf_counter() - started)
+
+        # Добавляем в буфер
+        mqtt_buffer.add_to_buffer(topic, records, frames, (received_at,) if received_at is not None else (), blocks)
+
+    except json.JSONDecodeError as e:
+        print(f"JSON Error: {e}")
+        return False
+    except Exception as e:
+        print(f"MQTT Handler Error: {e}")
+        return False
+    return True
+
+
+def publish_alarm(event):
+    # Тревога публикуется флашером сразу, не дожидаясь записи в БД; publish только ставит сообщение в очередь клиента
+    topic = f"{app.config['MQTT_ALARM_TOPIC']}/{event['sensor_id']}/{event['parameter_id']}"
+    mqtt.publish(topic, json.dumps(event, default=str), qos=1)
+
+
+def _with_app_context(target):
+    # Потоки-декодеры работают внутри контекста приложения (нужен для кэша и БД)
+    def run():
+        with app.app_context():
+            target()
+    return run
+
+
+def ingest_stats():
+    """Глубина очередей по стадиям конвейера приёма."""
+    stats = {'decode': ingest_pipeline.stats(), 'writer': mqtt_buffer.stats(), 'brokers': broker_manager.all_stats()}
+    if shard_coordinator is not None:
+        stats['shard'] = shard_coordinator.stats()
+    if edge_forwarder is not None:
+        stats['edge'] = edge_forwarder.stats()
+    return stats
+
+
+def _collect_ingest_metrics():
+    # Состояние конвейера на момент опроса /api/metrics; счётчики стадий — из их stats()
+    if ingest_pipeline is None:
+        return [('cv_ingest_running', 'gauge', 'Whether this process runs MQTT ingest', [({}, 0)])]
+    stats = ingest_stats()
+    decode, writer = stats['decode'], stats['writer']
+    families = [
+        ('cv_ingest_running', 'gauge', 'Whether this process runs MQTT ingest', [({}, 1)]),
+        ('cv_ingest_raw_queue_depth', 'gauge', 'Raw messages waiting for decode', [({}, decode['raw_queue_depth'])]),
+        ('cv_ingest_raw_queue_limit', 'gauge', 'Capacity of the raw message queue', [({}, decode['raw_queue_limit'])]),
+        ('cv_ingest_decode_in_flight', 'gauge', 'Batches being decoded in worker processes',
+         [({}, decode['decode_in_flight'])]),
+        ('cv_ingest_dropped_total', 'counter', 'Messages dropped because the raw queue was full',
+         [({}, decode['dropped'])]),
+        ('cv_ingest_decode_errors_total', 'counter', 'Messages that failed to decode', [({}, decode['decode_errors'])]),
+        ('cv_ingest_buffer_depth', 'gauge', 'Records, frames and events waiting for flush',
+         [({}, writer['buffer_depth'])]),
+        ('cv_ingest_buffer_limit', 'gauge', 'In-memory buffer limit before spilling to disk',
+         [({}, writer['memory_limit'])]),
+        ('cv_ingest_batch_size', 'gauge', 'Current adaptive flush batch size', [({}, writer['batch_size'])]),
+        ('cv_ingest_spilled_pending', 'gauge', 'Rows waiting in the disk spill log', [({}, writer['spilled_pending'])]),
+        ('cv_ingest_spill_quarantined_total', 'counter', 'Spill log segments moved to quarantine',
+         [({}, writer['spill_quarantined'])]),
+        ('cv_ingest_duplicates_dropped_total', 'counter', 'Redelivered samples dropped by the dedup window',
+         [({}, writer['duplicates_dropped'])]),
+        ('cv_ingest_compressed_away_total', 'counter', 'Samples dropped by series compression',
+         [({}, writer['compressed_away'])]),
+        ('cv_ingest_decimated_away_total', 'counter', 'Samples dropped by decimation', [({}, writer['decimated_away'])]),
+    ]
+    brokers = stats['brokers'].items()
+    families += [
+        ('cv_ingest_broker_connected', 'gauge', 'MQTT broker connection state',
+         [({'broker': label, 'name': broker['name']}, int(broker['connected'])) for label, broker in brokers]),
+        ('cv_ingest_broker_messages_total', 'counter', 'Messages received from the broker',
+         [({'broker': label}, broker['messages']) for label, broker in brokers]),
+        ('cv_ingest_broker_bytes_total', 'counter', 'Payload bytes received from the broker',
+         [({'broker': label}, broker['bytes']) for label, broker in brokers]),
+        ('cv_ingest_broker_delivery_lag_seconds', 'gauge', 'Smoothed lag from sample timestamp to receive',
+         [({'broker': label}, broker['delivery_lag']) for label, broker in brokers if broker['delivery_lag'] is not None]),
+        ('cv_ingest_broker_seconds_since_last_message', 'gauge', 'Seconds since the last message from the broker',
+         [({'broker': label}, broker['seconds_since_last_message']) for label, broker in brokers
+          if broker['seconds_since_last_message'] is not None]),
+    ]
+    if 'edge' in stats:
+        edge = stats['edge']
+        families += [
+            ('cv_edge_forwarded_rows_total', 'counter', 'Rows accepted by the central instance',
+             [({}, edge['rows'])]),
+            ('cv_edge_sent_bytes_total', 'counter', 'Compressed batch bytes sent to the central instance',
+             [({}, edge['bytes_sent'])]),
+            ('cv_edge_backlog_rows', 'gauge', 'Local rows not yet accepted by the central instance',
+             [({'stream': stream}, backlog) for stream, backlog in edge['backlog'].items()]),
+        ]
+    return families
+
+
+metrics.collector(_collect_ingest_metrics)
+
+
+def get_sensor_and_params(topic, broker_id=DEFAULT_BROKER):
+    # Маршрут берётся из снимка в памяти процесса — без кэша и БД на каждое сообщение
+    return topic_router.lookup(topic, broker_id)
+
+
+# Фильтры, на которые подписаны клиенты MQTT сейчас: broker_id → фильтры
+_subscribed = {}
 
+def sync_subscriptions(table):
+    """
+    Приводит подписки клиентов всех брокеров к наборам фильтров, покрывающим топики их датчиков.
+    Вызывается после каждой перестройки таблицы маршрутизации.
+    MQTT_TOPIC_FILTERS относятся к брокеру по умолчанию.
+    В режиме hash подписка только на топики этого шарда, без MQTT_TOPIC_FILTERS;
+    в режиме shared — общие подписки, сообщения между процессами группы делит брокер.
+    """
+    shard_mode = app.config.get('INGEST_SHARD_MODE', SHARD_NONE)
+    wanted = {}
+    for broker_id in [DEFAULT_BROKER] + sorted(table.brokers):
+        if shard_mode == SHARD_HASH:
+            filters = subscription_filters(table.data_sources(broker_id))
+        else:
+            configured = app.config.get('MQTT_TOPIC_FILTERS') if broker_id is DEFAULT_BROKER else None
+            filters = subscription_filters(table.data_sources(broker_id), configured)
+        if shard_mode == SHARD_SHARED:
+            filters = shared_filters(filters, app.config.get('INGEST_SHARED_GROUP', 'cv-ingest'))
+        wanted[broker_id] = set(filters)
+    if shard_mode == SHARD_HASH:
+        shard_coordinator.topics = sum(len(filters) for filters in wanted.values())
 
-def get_sensor_and_params(topic):
+    for broker_id in set(_subscribed) | set(wanted):
+        client = mqtt if broker_id is DEFAULT_BROKER else broker_manager.client(broker_id)
+        subscribed = _subscribed.setdefault(broker_id, set())
+        filters = wanted.get(broker_id, set())
+        if client is None:
+            # Брокер отключён вместе с клиентом — его подписки ушли с ним
+            subscribed.clear()
+        else:
+            for topic_filter in sorted(subscribed - filters):
+                client.unsubscribe(topic_filter)
+                subscribed.discard(topic_filter)
+            for topic_filter in sorted(filters - subscribed):
+                client.subscribe(topic_filter)
+                subscribed.add(topic_filter)
+        if not subscribed and broker_id is not DEFAULT_BROKER:
+            del _subscribed[broker_id]
+    print("MQTT subscriptions: " + ", ".join(
+        f"{'default' if broker_id is DEFAULT_BROKER else 'broker ' + str(broker_id)}: {sorted(filters)}"
+        for broker_id, filters in _subscribed.items()))
 
-    # Кэшируем данные, чтобы не дергать БД каждый раз
-    cache_key = f"sensor_params_{topic}"
-    cached = cache.get(cache_key)
 
-    if cached:
-        return cached["sensor_id"], cached["data_keys"]
-    with app.app_context():
-        sensor = Sensor.query.filter_by(data_source=topic).first()
-        if not sensor:
-            return None, None
-        query = Sensor_parameter.query.filter(Sensor_parameter.sensor_id == sensor.id)
-        data_keys = query.with_entities(Sensor_parameter.key, Sensor_parameter.parameter_id).distinct().all()
+def on_routing_rebuilt(table):
+    mqtt_buffer.configure_stages(table)
+    standing_engine.configure(table.standing, table.compression)
+    broker_manager.configure(table.brokers)
+    sync_subscriptions(table)
 
-    cache.set(cache_key, {"sensor_id": sensor.id, "data_keys": data_keys}, timeout=3600)
-    return sensor.id, data_keys
 
 def connect_to_topics():
-    from app.models.sensor import Sensor
-
-    with app.app_context():
-        # Базовый запрос
-        query = Sensor.query
-        data_sources = [result.data_source for result in query.with_entities(Sensor.data_source).distinct().all()]
-        print(data_sources)
-        for source in data_sources:
-            mqtt.subscribe(source)
+    # Строит таблицу маршрутизации и подписывается на фильтры; дальше подписки
+    # и настройки сжатия обновляются сами при изменениях Sensor / Sensor_parameter
+    topic_router.start(app, on_rebuild=on_routing_rebuilt)
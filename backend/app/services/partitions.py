@@ -0,0 +1,299 @@
+# backend/app/services/partitions.py
+
+import re
+import time
+from datetime import datetime, timedelta
+from threading import Event, Thread
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from app import db
+from app.models.parameter import Parameter
+from app.models.sensor_record import Sensor_Record
+from app.services.rollups import rollup_manager
+
+PARTITION_DAY = 'day'
+PARTITION_MONTH = 'month'
+PARTITION_INTERVALS = (PARTITION_DAY, PARTITION_MONTH)
+PARTITIONS_AHEAD = 2  # Сколько следующих периодов держать созданными заранее
+RETENTION_DAYS = 0  # Срок хранения по умолчанию (для параметров без своего), 0 — бессрочно
+PARTITION_MAINTENANCE_INTERVAL = 3600.0  # Секунд между проходами обслуживания
+PARTITION_LOCK_KEY = 0x43565054  # pg_advisory_xact_lock на создание и удаление секций ("CVPT")
+PARTITION_DDL_LOCK_TIMEOUT = '10s'  # Сколько создание секции при записи ждёт блокировку родителя
+
+_LIST_BOUND = re.compile(r"IN \((\d+)\)")
+_RANGE_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition_Manager:
+    """
+    Секции sensor_records на PostgreSQL: таблица секционирована LIST по parameter_id,
+    секция параметра — RANGE по timestamp на дни или месяцы.
+
+    Секции текущего и PARTITIONS_AHEAD следующих периодов создаются заранее
+    фоновым обслуживанием — только в процессе приёма (лидере или шарде), первый
+    проход сразу при его запуске. Запоздавшие или новые параметры досоздаются при
+    записи (ensure): пачка лишь сверяется с каталогом, а DDL идёт отдельной короткой
+    транзакцией, не удерживая блокировки в транзакции пачки. Срок хранения задаётся
+    на параметр (retention_days) и применяется удалением целых секций, без DELETE.
+
+    На других СУБД (и на несекционированной таблице, созданной до этого) срок
+    хранения применяется DELETE по тем же правилам. Агрегаты серий (rollups.py)
+    старше срока хранения удаляются вместе с записями.
+    """
+
+    def __init__(self, interval: str = PARTITION_MONTH, ahead: int = PARTITIONS_AHEAD,
+                 retention_days: int = RETENTION_DAYS,
+                 maintenance_interval: float = PARTITION_MAINTENANCE_INTERVAL):
+        self.configure(interval, ahead, retention_days, maintenance_interval)
+        self.partitioned = None  # Таблица секционирована (проверяется при обслуживании)
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self.app = None
+        self.stopped = Event()
+        self.thread = None
+
+    def configure(self, interval: str = PARTITION_MONTH, ahead: int = PARTITIONS_AHEAD,
+                  retention_days: int = RETENTION_DAYS,
+                  maintenance_interval: float = PARTITION_MAINTENANCE_INTERVAL):
+        if interval not in PARTITION_INTERVALS:
+            raise ValueError(f"Unknown partition interval '{interval}'")
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.maintenance_interval = maintenance_interval
+
+    def start(self, app):
+        # Вызывается при запуске приёма: первый проход — сразу, дальше раз в maintenance_interval
+        self.app = app
+        self.stopped.clear()
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="partition-maintenance", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def period_start(self, moment) -> datetime:
+        if self.interval == PARTITION_DAY:
+            return datetime(moment.year, moment.month, moment.day)
+        return datetime(moment.year, moment.month, 1)
+
+    def period_end(self, start: datetime) -> datetime:
+        if self.interval == PARTITION_DAY:
+            return start + timedelta(days=1)
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+    @staticmethod
+    def parameter_partition(parameter_id: int) -> str:
+        return f"{Sensor_Record.__tablename__}_p{int(parameter_id)}"
+
+    def period_partition(self, parameter_id: int, start: datetime) -> str:
+        return f"{self.parameter_partition(parameter_id)}_{start:%Y%m%d}"
+
+    def ensure(self, connection, rows, separate: bool = True, blocks=()) -> List[str]:
+        """
+        Досоздаёт секции под пачку записей (timestamp, value, sensor_id, parameter_id)
+        и блоков отсчётов (Record_Block); возвращает имена созданных. В транзакции пачки connection — один запрос к каталогу,
+        недостающие секции создаются отдельной транзакцией и фиксируются до записи пачки.
+        separate=False — в самой connection (таблица ещё не зафиксирована, как при переводе схемы).
+        """
+        if not (rows or blocks) or not self._is_partitioned(connection):
+            return []
+        # Сначала сводим к дням (дёшево), затем к периодам секций
+        days = {(row[3], row[0].date()) for row in rows if row[0] is not None}
+        for block in blocks:
+            days.update((block.parameter_id, day) for day in np.unique(block.times.astype('datetime64[D]')).tolist())
+        keys = {(parameter_id, self.period_start(day)) for parameter_id, day in days}
+        if not separate:
+            return self._create_missing(connection, keys)
+        if not self._missing(connection, self._names(keys)):
+            return []
+        with connection.engine.begin() as ddl:
+            # Родитель занят долгим запросом — пачка лучше упадёт и повторится, чем повиснет
+            ddl.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_DDL_LOCK_TIMEOUT}'"))
+            return self._create_missing(ddl, keys)
+
+    def maintain(self, now: datetime = None) -> dict:
+        """Создаёт секции наперёд и применяет сроки хранения (в контексте приложения)."""
+        now = now or datetime.utcnow()
+        connection = db.session.connection()
+        self.partitioned = None
+        result = {'created': [], 'dropped': [], 'deleted': 0}
+        try:
+            parameters = dict(connection.execute(db.select(Parameter.id, Parameter.retention_days)).all())
+            if self._is_partitioned(connection):
+                # С периода «вчера» — на случай устройств с местным временем вместо UTC
+                last = self.period_start(now)
+                for _ in range(self.ahead):
+                    last = self.period_end(last)
+                starts = [self.period_start(now - timedelta(days=1))]
+                while starts[-1] < last:
+                    starts.append(self.period_end(starts[-1]))
+                result['created'] = self._create_missing(
+                    connection, {(parameter_id, start) for parameter_id in parameters for start in starts})
+                result['dropped'] = self._drop_expired(connection, parameters, now)
+            else:
+                result['deleted'] = self._delete_expired(connection, parameters, now)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.last_run = time.time()
+        self.last_result = result
+        self.last_error = None
+        if result['created'] or result['dropped'] or result['deleted']:
+            print(f"Partitions: created {len(result['created'])}, dropped {len(result['dropped'])}, "
+                  f"deleted {result['deleted']} expired records")
+        return result
+
+    def list_partitions(self) -> List[dict]:
+        """Секции периодов: параметр, границы и оценка числа строк по статистике PostgreSQL."""
+        connection = db.session.connection()
+        if not self._is_partitioned(connection):
+            return []
+        partitions = []
+        for parameter_id, name in self._parameter_partitions(connection).items():
+            for child, start, end, rows in self._period_partitions(connection, name):
+                partitions.append({'name': child, 'parameter_id': parameter_id,
+                                   'from': start, 'to': end, 'rows_estimate': rows})
+        return sorted(partitions, key=lambda partition: (partition['parameter_id'], partition['from']))
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'ahead': self.ahead,
+            'retention_days': self.retention_days,
+            'partitioned': self.partitioned,
+            'last_run': self.last_run,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.maintain()
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+                self.last_error = str(e)
+            if self.stopped.wait(self.maintenance_interval):
+                return
+
+    def _is_partitioned(self, connection) -> bool:
+        if connection.dialect.name != 'postgresql':
+            self.partitioned = False
+            return False
+        if self.partitioned is None:
+            self.partitioned = bool(connection.execute(
+                text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+                {'table': Sensor_Record.__tablename__}).scalar())
+        return self.partitioned
+
+    def _names(self, keys) -> Dict[str, tuple]:
+        # Имя секции → (parameter_id, начало периода или None для секции параметра)
+        names = {self.period_partition(parameter_id, start): (parameter_id, start) for parameter_id, start in keys}
+        names.update({self.parameter_partition(parameter_id): (parameter_id, None) for parameter_id, _ in keys})
+        return names
+
+    @staticmethod
+    def _missing(connection, names) -> set:
+        if not names:
+            return set()
+        return set(connection.execute(
+            text("SELECT name FROM unnest(CAST(:names AS text[])) AS name WHERE to_regclass(name) IS NULL"),
+            {'names': list(names)}).scalars())
+
+    def _create_missing(self, connection, keys) -> List[str]:
+        names = self._names(keys)
+        missing = self._missing(connection, names)
+        if not missing:
+            return []
+        # Параллельные процессы приёма создают одни и те же секции по очереди
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': PARTITION_LOCK_KEY})
+        table = Sensor_Record.__tablename__
+        created = []
+        # Секции параметров (без периода) идут первыми — в них создаются секции периодов
+        for name in sorted(missing, key=lambda name: names[name][1] is not None):
+            parameter_id, start = names[name]
+            if start is None:
+                connection.exec_driver_sql(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES IN ({int(parameter_id)}) PARTITION BY RANGE (timestamp)")
+            else:
+                connection.exec_driver_sql(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.parameter_partition(parameter_id)} "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{self.period_end(start):%Y-%m-%d}')")
+            created.append(name)
+        return created
+
+    def _drop_expired(self, connection, parameters: Dict[int, Optional[int]], now: datetime) -> List[str]:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': PARTITION_LOCK_KEY})
+        dropped = []
+        for parameter_id, name in self._parameter_partitions(connection).items():
+            if parameter_id not in parameters:
+                # Параметр удалён (строк у него нет — внешний ключ RESTRICT)
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+                dropped.append(name)
+                continue
+            cutoff = self._cutoff(parameters[parameter_id], now)
+            if cutoff is None:
+                continue
+            rollup_manager.purge(connection, parameter_id, cutoff)
+            # Секция удаляется, только когда истёк срок у всего её периода
+            for child, start, end, rows in self._period_partitions(connection, name):
+                if end <= cutoff:
+                    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {child}")
+                    dropped.append(child)
+        return dropped
+
+    def _delete_expired(self, connection, parameters: Dict[int, Optional[int]], now: datetime) -> int:
+        deleted = 0
+        for parameter_id, retention_days in parameters.items():
+            cutoff = self._cutoff(retention_days, now)
+            if cutoff is not None:
+                deleted += connection.execute(
+                    db.delete(Sensor_Record).where(Sensor_Record.parameter_id == parameter_id,
+                                                   Sensor_Record.timestamp < cutoff)).rowcount
+                rollup_manager.purge(connection, parameter_id, cutoff)
+        return deleted
+
+    def _cutoff(self, retention_days: Optional[int], now: datetime) -> Optional[datetime]:
+        days = retention_days if retention_days is not None else self.retention_days
+        return now - timedelta(days=days) if days else None
+
+    def _parameter_partitions(self, connection) -> Dict[int, str]:
+        rows = connection.execute(text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"), {'table': Sensor_Record.__tablename__}).all()
+        partitions = {}
+        for name, bound in rows:
+            match = _LIST_BOUND.search(bound or '')
+            if match:
+                partitions[int(match.group(1))] = name
+        return partitions
+
+    def _period_partitions(self, connection, parent: str) -> List[tuple]:
+        rows = connection.execute(text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:parent)"), {'parent': parent}).all()
+        partitions = []
+        for name, bound, reltuples in rows:
+            match = _RANGE_BOUND.search(bound or '')
+            if match:
+                start, end = (datetime.fromisoformat(value) for value in match.groups())
+                # reltuples = -1 — таблицу ещё не анализировали
+                partitions.append((name, start, end, int(reltuples) if reltuples >= 0 else None))
+        return partitions
+
+
+partition_manager = Partition_Manager()
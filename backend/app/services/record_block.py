@@ -0,0 +1,63 @@
+# backend/app/services/record_block.py
+
+from datetime import datetime
+from typing import Iterable, List
+
+import numpy as np
+
+# Метки времени блока — целые микросекунды без пояса, как столбец sensor_records.timestamp
+TIME_DTYPE = np.dtype('datetime64[us]')
+
+
+class Record_Block:
+    """
+    Равномерные отсчёты одной серии пакетного сообщения (device.t0 + device.dt):
+    метки времени (datetime64[us]) и значения (float64) — массивами NumPy,
+    без кортежа и datetime на каждый отсчёт. Так блок проходит буфер приёма
+    и доходит до COPY (record_writer). Серии, которые стадии приёма смотрят
+    поотсчётно (сжатие, прореживание, тревоги и т. п.), разворачиваются
+    в обычные записи (timestamp, value, sensor_id, parameter_id) — records().
+    """
+
+    __slots__ = ('times', 'values', 'sensor_id', 'parameter_id')
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, sensor_id: int, parameter_id: int):
+        self.times = times
+        self.values = values
+        self.sensor_id = sensor_id
+        self.parameter_id = parameter_id
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def key(self) -> tuple:
+        return self.sensor_id, self.parameter_id
+
+    def start(self) -> datetime:
+        return self.times[0].item()
+
+    def end(self) -> datetime:
+        return self.times[-1].item()
+
+    def records(self) -> List[tuple]:
+        # Отсчёты блока обычными записями — для стадий, которым нужен каждый отсчёт
+        sensor_id, parameter_id = self.sensor_id, self.parameter_id
+        return [(t, v, sensor_id, parameter_id) for t, v in zip(self.times.tolist(), self.values.tolist())]
+
+
+def uniform_times(start: datetime, step_us: int, indices: range) -> np.ndarray:
+    """Метки start + step * index для номеров отсчётов indices — целочисленно, в микросекундах."""
+    offsets = np.arange(indices.start, indices.stop, indices.step, dtype=np.int64) * step_us
+    return np.datetime64(start, 'us') + offsets.astype('timedelta64[us]')
+
+
+def expand(blocks: Iterable[Record_Block]) -> List[tuple]:
+    records = []
+    for block in blocks:
+        records.extend(block.records())
+    return records
+
+
+def block_rows(blocks: Iterable[Record_Block]) -> int:
+    return sum(len(block) for block in blocks)
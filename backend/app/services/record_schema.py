@@ -0,0 +1,111 @@
+# backend/app/services/record_schema.py
+#
+# Перевод существующей таблицы sensor_records на компактную схему строки
+# (BIGINT id, value DOUBLE PRECISION, на PostgreSQL — первичный ключ по серии
+# с value в индексе и секционирование). db.create_all() существующие таблицы
+# не меняет, поэтому данные процесса приёма переводятся командой:
+#   APP_MODE=ingest flask --app app upgrade-records
+# Приём на время перевода нужно остановить: DDL берёт эксклюзивные блокировки.
+
+from sqlalchemy import inspect, text
+from sqlalchemy.types import BigInteger, Double
+
+from app import db
+from app.models.sensor_record import Sensor_Record, SERIES_KEY
+from app.services.partitions import partition_manager
+
+COLUMNS = ('id', 'timestamp', 'value', 'sensor_id', 'parameter_id')
+
+
+def needs_upgrade() -> bool:
+    """Таблица sensor_records есть, но со старой схемой строки."""
+    connection = db.session.connection()
+    inspector = inspect(connection)
+    table = Sensor_Record.__tablename__
+    if not inspector.has_table(table):
+        return False
+    columns = {column['name']: column['type'] for column in inspector.get_columns(table)}
+    if not isinstance(columns['value'], Double):
+        return True
+    if connection.dialect.name != 'postgresql':
+        return False
+    primary_key = inspector.get_pk_constraint(table)['constrained_columns']
+    return not isinstance(columns['id'], BigInteger) or tuple(primary_key) != SERIES_KEY
+
+
+def upgrade_records() -> str:
+    """
+    Переводит sensor_records на текущую схему с сохранением данных; возвращает описание.
+    Несекционированная таблица переписывается в новую (на PostgreSQL — секционированную),
+    секционированная меняется на месте: типы столбцов и первичный ключ.
+    """
+    if not needs_upgrade():
+        return "sensor_records is up to date"
+    connection = db.session.connection()
+    try:
+        if connection.dialect.name == 'postgresql' and _relkind(connection) == 'p':
+            result = _alter_partitioned(connection)
+        else:
+            result = _copy_to_new_table(connection)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    partition_manager.partitioned = None
+    return result
+
+
+def _relkind(connection) -> str:
+    return connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+                              {'table': Sensor_Record.__tablename__}).scalar()
+
+
+def _alter_partitioned(connection) -> str:
+    # Секции уже есть — меняем на месте (ALTER распространяется на все секции)
+    table = Sensor_Record.__tablename__
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+    connection.exec_driver_sql(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey")
+    connection.exec_driver_sql(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS uq_sensor_records_series_time")
+    connection.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN id TYPE bigint, "
+                               f"ALTER COLUMN value TYPE double precision, "
+                               f"ALTER COLUMN sensor_id SET NOT NULL")
+    if sequence:
+        connection.exec_driver_sql(f"ALTER SEQUENCE {sequence} AS bigint")
+    connection.exec_driver_sql(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(SERIES_KEY)}) INCLUDE (value)")
+    connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_sensor_records_id ON {table} (id)")
+    rows = connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+    return f"sensor_records altered in place ({rows} records)"
+
+
+def _copy_to_new_table(connection) -> str:
+    table = Sensor_Record.__tablename__
+    old = f"{table}_old"
+    postgresql = connection.dialect.name == 'postgresql'
+    if postgresql:
+        # Имена индексов и последовательности заняты старой таблицей — освобождаем их
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+        connection.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {old}")
+        connection.exec_driver_sql(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {old}_pkey")
+        connection.exec_driver_sql(f"ALTER INDEX IF EXISTS uq_sensor_records_series_time RENAME TO uq_{old}_series_time")
+        if sequence:
+            connection.exec_driver_sql(f"ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq")
+    else:
+        connection.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {old}")
+    Sensor_Record.__table__.create(connection)
+
+    # Строки без серии или времени новая схема не допускает — они не переносятся
+    complete = "sensor_id IS NOT NULL AND parameter_id IS NOT NULL AND timestamp IS NOT NULL"
+    if postgresql:
+        partition_manager.partitioned = None
+        periods = connection.execute(text(
+            f"SELECT DISTINCT date_trunc('day', timestamp), NULL, NULL, parameter_id FROM {old} WHERE {complete}")).all()
+        # Новая таблица ещё не зафиксирована — секции создаются в той же транзакции
+        partition_manager.ensure(connection, periods, separate=False)
+    columns = ', '.join(COLUMNS)
+    copied = connection.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old} WHERE {complete}")).rowcount
+    skipped = connection.execute(text(f"SELECT COUNT(*) FROM {old}")).scalar() - copied
+    if postgresql:
+        connection.execute(text(f"SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                                f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"), {'table': table})
+    connection.exec_driver_sql(f"DROP TABLE {old}")
+    return f"sensor_records rewritten: {copied} records copied, {skipped} incomplete records dropped"
@@ -0,0 +1,167 @@
+# backend/app/services/record_writer.py
+
+import io
+import struct
+from typing import Iterable, List, Tuple, Any
+
+import numpy as np
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.sensor_record import Sensor_Record
+from app.models.waveform_frame import Waveform_Frame
+from app.services.partitions import partition_manager
+from app.services.record_block import Record_Block, block_rows, expand
+from app.services.rollups import rollup_manager
+
+# Запись хранится как простой кортеж, без ORM-объекта:
+# (timestamp, value, sensor_id, parameter_id)
+RecordRow = Tuple[Any, Any, int, int]
+RECORD_COLUMNS = ('timestamp', 'value', 'sensor_id', 'parameter_id')
+COPY_NULL = '\\N'
+# Двоичный формат COPY (big-endian): заголовок, строки «число полей, затем длина и значение
+# каждого поля», завершающее -1. timestamp — микросекунды от 2000-01-01 (timestamp without time zone)
+COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_BINARY_TRAILER = struct.pack('>h', -1)
+COPY_BINARY_ROW = np.dtype([('fields', '>i2'),
+                            ('timestamp_size', '>i4'), ('timestamp', '>i8'),
+                            ('value_size', '>i4'), ('value', '>f8'),
+                            ('sensor_id_size', '>i4'), ('sensor_id', '>i4'),
+                            ('parameter_id_size', '>i4'), ('parameter_id', '>i4')])
+PG_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+
+
+def write_records(rows: List[RecordRow], table=None, blocks: List[Record_Block] = ()) -> int:
+    """
+    Пишет пачку записей и блоков отсчётов (Record_Block) в sensor_records в текущей
+    транзакции db.session. На PostgreSQL использует COPY FROM STDIN во временную таблицу
+    (записи — текстом, блоки — двоичным форматом прямо из массивов) и
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, на остальных диалектах —
+    Core insert().executemany с пропуском конфликтов, где диалект это умеет.
+    Строки с уже записанным (sensor_id, parameter_id, timestamp) пропускаются.
+    Недостающие секции sensor_records создаются до записи отдельной короткой
+    транзакцией (partitions.py), агрегаты серий (rollups.py) обновляются в той же
+    транзакции, что и записи. Commit остаётся за вызывающим кодом.
+    """
+    if not rows and not blocks:
+        return 0
+    table = table if table is not None else Sensor_Record.__table__
+    connection = db.session.connection()
+    if table is Sensor_Record.__table__:
+        partition_manager.ensure(connection, rows, blocks=blocks)
+    if connection.dialect.name != 'postgresql' or not _copy_rows(connection, table, rows, blocks):
+        connection.execute(_insert_ignore(connection, table),
+                           [dict(zip(RECORD_COLUMNS, row)) for row in list(rows) + expand(blocks)])
+    if table is Sensor_Record.__table__:
+        rollup_manager.update(connection, rows, blocks)
+    return len(rows) + block_rows(blocks)
+
+
+def write_frames(frames: List[tuple]) -> int:
+    """
+    Пишет кадры формы сигнала (start_time, sample_rate, samples, sensor_id, parameter_id)
+    в waveform_frames: отсчёты — одним бинарным полем little-endian.
+    """
+    if not frames:
+        return 0
+    rows = []
+    for start_time, sample_rate, samples, sensor_id, parameter_id in frames:
+        samples = np.asarray(samples)
+        samples = samples.astype(samples.dtype.newbyteorder('<'), copy=False)
+        rows.append({'start_time': start_time, 'sample_rate': sample_rate, 'sample_count': len(samples),
+                     'dtype': samples.dtype.str, 'samples': samples.tobytes(),
+                     'sensor_id': sensor_id, 'parameter_id': parameter_id})
+    connection = db.session.connection()
+    connection.execute(_insert_ignore(connection, Waveform_Frame.__table__), rows)
+    return len(rows)
+
+
+def write_events(events: List[tuple]) -> int:
+    """
+    Пишет события стадий приёма (захваты, тревоги и т. п.) — пары (имя таблицы, строка-словарь).
+    Строки из журнала на диске приходят с датами строками ISO — приводим их к datetime.
+    """
+    if not events:
+        return 0
+    by_table = {}
+    for table_name, row in events:
+        by_table.setdefault(table_name, []).append(row)
+    connection = db.session.connection()
+    for table_name, rows in by_table.items():
+        table = db.metadata.tables[table_name]
+        dates = [column.name for column in table.columns if isinstance(column.type, db.DateTime)]
+        for row in rows:
+            for name in dates:
+                if isinstance(row.get(name), str):
+                    row[name] = datetime.fromisoformat(row[name])
+        connection.execute(insert(table), rows)
+    return len(events)
+
+
+def _insert_ignore(connection, table):
+    # Вставка, пропускающая строки с уже существующим уникальным ключом
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def _copy_rows(connection, table, rows: List[RecordRow], blocks: List[Record_Block] = ()) -> bool:
+    # COPY доступен только через сырое соединение драйвера (psycopg2)
+    dbapi_connection = connection.connection.dbapi_connection
+    cursor = dbapi_connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        cursor.close()
+        return False
+    try:
+        # COPY не поддерживает ON CONFLICT: грузим во временную таблицу сеанса
+        # (очищается при commit) и переносим из неё, пропуская дубликаты
+        columns = ', '.join(RECORD_COLUMNS)
+        stage = f"{table.name}_stage"
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS "
+                       f"AS SELECT {columns} FROM {table.name} WITH NO DATA")
+        if rows:
+            cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN", io.StringIO(_to_copy_text(rows)))
+        if blocks:
+            cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN WITH (FORMAT binary)",
+                               io.BytesIO(_to_copy_binary(blocks)))
+        cursor.execute(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {stage} "
+                       f"ON CONFLICT DO NOTHING")
+        cursor.execute(f"TRUNCATE {stage}")
+    finally:
+        cursor.close()
+    return True
+
+
+def _to_copy_text(rows: Iterable[RecordRow]) -> str:
+    # Текстовый формат COPY: поля через табуляцию, NULL как \N
+    lines = []
+    for timestamp, value, sensor_id, parameter_id in rows:
+        ts = timestamp.isoformat(' ') if timestamp is not None else COPY_NULL
+        val = COPY_NULL if value is None else value
+        lines.append(f"{ts}\t{val}\t{sensor_id}\t{parameter_id}\n")
+    return ''.join(lines)
+
+
+def _to_copy_binary(blocks: Iterable[Record_Block]) -> bytes:
+    # Двоичный формат COPY: строки собираются структурным массивом NumPy по блоку целиком —
+    # без строки и datetime на отсчёт
+    parts = [COPY_BINARY_HEADER]
+    for block in blocks:
+        tuples = np.empty(len(block), dtype=COPY_BINARY_ROW)
+        tuples['fields'] = len(RECORD_COLUMNS)
+        tuples['timestamp_size'] = 8
+        tuples['timestamp'] = (block.times - PG_EPOCH).astype(np.int64)
+        tuples['value_size'] = 8
+        tuples['value'] = block.values
+        tuples['sensor_id_size'] = 4
+        tuples['sensor_id'] = block.sensor_id
+        tuples['parameter_id_size'] = 4
+        tuples['parameter_id'] = block.parameter_id
+        parts.append(tuples.tobytes())
+    parts.append(COPY_BINARY_TRAILER)
+    return b''.join(parts)
@@ -0,0 +1,455 @@
+# backend/app/services/rollups.py
+
+import io
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, column, delete, func, select, table as table_clause, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.sensor_record import Sensor_Record
+from app.models.sensor_rollup import Sensor_Rollup_1s, Sensor_Rollup_1m, Sensor_Rollup_1h, Rollup_Watermark
+
+ROLLUP_POINT_BUDGET = 2000  # Точек на источник одних графиков по умолчанию (source_points), 0 — всегда исходные записи
+
+# Разрешение агрегатов: имя, модель, шаг и поля datetime, которые обнуляются до начала интервала
+Rollup_Level = namedtuple('Rollup_Level', 'name model step reset')
+LEVEL_1S = Rollup_Level('1s', Sensor_Rollup_1s, timedelta(seconds=1), {'microsecond': 0})
+LEVEL_1M = Rollup_Level('1min', Sensor_Rollup_1m, timedelta(minutes=1), {'second': 0, 'microsecond': 0})
+LEVEL_1H = Rollup_Level('1h', Sensor_Rollup_1h, timedelta(hours=1), {'minute': 0, 'second': 0, 'microsecond': 0})
+ROLLUP_LEVELS = (LEVEL_1S, LEVEL_1M, LEVEL_1H)  # От мелкого к крупному
+# Шаги 1 с и 1 мин в микросекундах — для векторной агрегации блоков отсчётов
+MICROSECONDS_1S = 1000000
+MICROSECONDS_1M = 60 * MICROSECONDS_1S
+
+# Агрегат в памяти: [count, min, max, sum, sum_squares]
+Bucket_Key = Tuple[int, int, datetime]
+ROLLUP_COLUMNS = ('sensor_id', 'parameter_id', 'bucket', 'count', 'min', 'max', 'mean', 'sum_squares')
+
+
+class Rollup_Manager:
+    """
+    Агрегаты серий sensor_records с разрешением 1 с, 1 мин и 1 ч (app/models/sensor_rollup.py),
+    по которым длинные интервалы читаются без выборки всех записей.
+
+    Обновляются в транзакции каждой записанной пачки (write_records). Отметка серии
+    (Rollup_Watermark) — время последней учтённой записи: записи новее неё добавляются
+    к агрегатам слиянием (count, min, max, mean, sum_squares), а запоздавшие
+    и повторные — не старше отметки — не складываются, а пересчитываются из sensor_records
+    по затронутым минутам (1 с и 1 мин) и затем часам (из 1 мин). Поэтому повторная
+    доставка не удваивает агрегаты, а запоздавшая запись попадает в свой интервал.
+
+    Чтение (read) — бюджет точек как потолок: выбирается самое мелкое разрешение,
+    которое ещё укладывается в запрошенное число точек; если в него укладываются сами
+    записи — None, и вызывающий читает исходные записи.
+    """
+
+    def __init__(self, enabled: bool = True, point_budget: int = ROLLUP_POINT_BUDGET):
+        self.configure(enabled, point_budget)
+
+    def configure(self, enabled: bool = True, point_budget: int = ROLLUP_POINT_BUDGET):
+        self.enabled = enabled
+        self.point_budget = point_budget
+
+    def update(self, connection, rows, blocks=()) -> None:
+        """
+        Учитывает пачку записей (timestamp, value, sensor_id, parameter_id) и блоков отсчётов
+        (Record_Block), уже записанную в sensor_records в транзакции connection.
+        Блоки агрегируются по секундам векторно. Commit остаётся за вызывающим кодом.
+        """
+        if not self.enabled or not (rows or blocks) or _upsert(connection) is None:
+            return
+        series: Dict[Tuple[int, int], Dict[datetime, float]] = {}
+        for timestamp, value, sensor_id, parameter_id in rows:
+            if timestamp is None or value is None:
+                continue
+            # Повтор ключа в пачке sensor_records не пишет — учитываем первое значение
+            series.setdefault((sensor_id, parameter_id), {}).setdefault(naive_utc(timestamp), float(value))
+        arrays: Dict[Tuple[int, int], list] = {}
+        for block in blocks:
+            if block.key in series:
+                # Серия пришла и записями: повторы ключей проще свести в общем словаре
+                for timestamp, value in zip(block.times.tolist(), block.values.tolist()):
+                    series[block.key].setdefault(timestamp, value)
+            else:
+                arrays.setdefault(block.key, []).append(block)
+        if not series and not arrays:
+            return
+
+        watermarks = self._watermarks(connection, list(series) + list(arrays))
+        latest = {key: max(points) for key, points in series.items()}
+        on_time, late_minutes = [], set()
+        for (sensor_id, parameter_id), points in series.items():
+            # У новой серии отметки нет — её первая пачка пересчитывается целиком
+            watermark = watermarks.get((sensor_id, parameter_id))
+            for timestamp, value in points.items():
+                if watermark is not None and timestamp > watermark:
+                    on_time.append((sensor_id, parameter_id, timestamp, value))
+                else:
+                    late_minutes.add((sensor_id, parameter_id, timestamp.replace(**LEVEL_1M.reset)))
+        seconds = {}
+        for key, series_blocks in arrays.items():
+            latest[key] = self._aggregate_blocks(key, series_blocks, watermarks.get(key), seconds, late_minutes)
+        late_hours = {(sensor_id, parameter_id, minute.replace(**LEVEL_1H.reset))
+                      for sensor_id, parameter_id, minute in late_minutes}
+
+        # Новые записи в пересчитываемых интервалах учтёт сам пересчёт
+        if late_minutes:
+            on_time = [point for point in on_time
+                       if (point[0], point[1], point[2].replace(**LEVEL_1M.reset)) not in late_minutes]
+        seconds.update(_aggregate(on_time, LEVEL_1S))
+        minutes = _combine(seconds, LEVEL_1M)
+        hours = _combine({key: acc for key, acc in minutes.items()
+                          if (key[0], key[1], key[2].replace(**LEVEL_1H.reset)) not in late_hours}, LEVEL_1H)
+        self._write(connection, LEVEL_1S, seconds, merge=True)
+        self._write(connection, LEVEL_1M, minutes, merge=True)
+        recomputed = self._recompute_minutes(connection, _spans(late_minutes, LEVEL_1M.step))
+        # Часы пересчитываются из минут — после того, как минуты обновлены
+        self._write(connection, LEVEL_1H, hours, merge=True)
+        self._recompute_hours(connection, _spans(late_hours, LEVEL_1H.step))
+        self._advance(connection, latest, watermarks, recomputed)
+
+    @staticmethod
+    def _aggregate_blocks(key, blocks, watermark, seconds, late_minutes) -> datetime:
+        # Отсчёты блоков серии новее отметки — в секундные агрегаты (count, min, max, sum, sum_squares),
+        # остальные — минутами в late_minutes; возвращает время последнего отсчёта
+        times = np.concatenate([block.times for block in blocks]).view(np.int64)
+        values = np.concatenate([block.values for block in blocks])
+        if len(times) > 1 and not (np.diff(times) > 0).all():
+            # Повтор ключа sensor_records не пишет — учитываем первое значение
+            times, first = np.unique(times, return_index=True)
+            values = values[first]
+        minutes = times // MICROSECONDS_1M
+        late = np.ones(len(times), dtype=bool) if watermark is None else \
+            times <= np.datetime64(watermark, 'us').astype(np.int64)
+        if late.any():
+            late_keys = np.unique(minutes[late])
+            late_times = (late_keys * MICROSECONDS_1M).astype('datetime64[us]').tolist()
+            late_minutes.update(key + (minute,) for minute in late_times)
+            # Новые отсчёты в пересчитываемых минутах учтёт сам пересчёт
+            late |= np.isin(minutes, late_keys)
+        on_time = ~late
+        if on_time.any():
+            buckets = times[on_time] // MICROSECONDS_1S
+            values = values[on_time]
+            starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+            counts = np.diff(np.append(starts, len(buckets)))
+            columns = (counts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts),
+                       np.add.reduceat(values, starts), np.add.reduceat(values * values, starts))
+            bucket_times = (buckets[starts] * MICROSECONDS_1S).astype('datetime64[us]').tolist()
+            for bucket, *acc in zip(bucket_times, *(column.tolist() for column in columns)):
+                seconds[key + (bucket,)] = acc
+        return np.datetime64(int(times[-1]), 'us').item()
+
+    def read(self, sensor_id: int, parameter_id: int, points: int, start: datetime = None,
+             end: datetime = None, after: datetime = None) -> Optional[Tuple[list, list]]:
+        """
+        Серия не длиннее points точек в [start, end] (или после after): (начала интервалов,
+        средние значения) самого мелкого из агрегатов 1 с / 1 мин / 1 ч, который укладывается
+        в бюджет; если не укладывается даже 1 ч — агрегаты 1 ч.
+        None — исходных записей не больше points (или агрегаты не подходят: выключены,
+        покрывают серию не полностью), читать нужно sensor_records.
+        """
+        if not self.enabled or not points or points <= 0:
+            return None
+        connection = db.session.connection()
+        if _upsert(connection) is None:
+            return None
+        complete = connection.execute(
+            select(Rollup_Watermark.complete).filter_by(sensor_id=sensor_id, parameter_id=parameter_id)).scalar()
+        if not complete:
+            return None
+        # Счёт идёт от грубого к мелкому и останавливается на первом переполнении бюджета:
+        # каждое следующее разрешение считает не больше 60 * points строк
+        chosen = None
+        for level in reversed(ROLLUP_LEVELS):
+            table = level.model.__table__
+            conditions = self._conditions(table, level, sensor_id, parameter_id, start, end, after)
+            count, records = connection.execute(
+                select(func.count(), func.sum(table.c.count)).select_from(table).where(*conditions)).one()
+            if count > points:
+                break
+            chosen = (table, conditions)
+            if level is ROLLUP_LEVELS[0] and (records or 0) <= points:
+                # Даже 1 с не сокращает серию до бюджета — исходные записи и так в него укладываются
+                return None
+        if chosen is None:
+            # Бюджет меньше числа часов в интервале — грубее агрегатов нет
+            level = ROLLUP_LEVELS[-1]
+            table = level.model.__table__
+            chosen = (table, self._conditions(table, level, sensor_id, parameter_id, start, end, after))
+        table, conditions = chosen
+        rows = connection.execute(select(table.c.bucket, table.c.mean).where(*conditions).order_by(table.c.bucket)).all()
+        return [row.bucket for row in rows], [row.mean for row in rows]
+
+    @staticmethod
+    def _conditions(table, level: Rollup_Level, sensor_id: int, parameter_id: int,
+                    start: datetime = None, end: datetime = None, after: datetime = None) -> list:
+        conditions = [table.c.sensor_id == sensor_id, table.c.parameter_id == parameter_id]
+        if start is not None:
+            # Интервал, в который попадает start, входит целиком
+            conditions.append(table.c.bucket >= start.replace(**level.reset))
+        if end is not None:
+            conditions.append(table.c.bucket <= end)
+        if after is not None:
+            conditions.append(table.c.bucket > after)
+        return conditions
+
+    def purge(self, connection, parameter_id: int, cutoff: datetime) -> int:
+        """Удаляет агрегаты параметра старше cutoff (срок хранения, см. partitions.py)."""
+        deleted = 0
+        for level in ROLLUP_LEVELS:
+            table = level.model.__table__
+            deleted += connection.execute(
+                delete(table).where(table.c.parameter_id == parameter_id, table.c.bucket < cutoff)).rowcount
+        return deleted
+
+    def needs_rebuild(self) -> bool:
+        """В sensor_records есть записи, не учтённые агрегатами (данные до их включения)."""
+        if not self.enabled:
+            return False
+        connection = db.session.connection()
+        if connection.execute(select(Rollup_Watermark.sensor_id).filter_by(complete=False).limit(1)).first():
+            return True
+        if connection.execute(select(Rollup_Watermark.sensor_id).limit(1)).first():
+            return False
+        return connection.execute(select(Sensor_Record.id).limit(1)).first() is not None
+
+    def rebuild(self) -> str:
+        """
+        Пересчитывает агрегаты всех серий из sensor_records по суткам (транзакция на серию)
+        и отмечает их полными. Приём на время пересчёта нужно остановить.
+        """
+        records = Sensor_Record.__table__
+        try:
+            connection = db.session.connection()
+            for level in ROLLUP_LEVELS:
+                connection.execute(delete(level.model.__table__))
+            connection.execute(delete(Rollup_Watermark.__table__))
+            series = connection.execute(
+                select(records.c.sensor_id, records.c.parameter_id,
+                       func.min(records.c.timestamp), func.max(records.c.timestamp))
+                .where(records.c.value.isnot(None))
+                .group_by(records.c.sensor_id, records.c.parameter_id)).all()
+            db.session.commit()
+            total = 0
+            for sensor_id, parameter_id, first, last in series:
+                connection = db.session.connection()
+                day = first.replace(hour=0, minute=0, second=0, microsecond=0)
+                while day <= last:
+                    span = [(sensor_id, parameter_id, day, day + timedelta(days=1))]
+                    total += sum(self._recompute_minutes(connection, span).values())
+                    self._recompute_hours(connection, span)
+                    day += timedelta(days=1)
+                connection.execute(Rollup_Watermark.__table__.insert(),
+                                   {'sensor_id': sensor_id, 'parameter_id': parameter_id,
+                                    'watermark': last, 'complete': True})
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return f"rollups rebuilt: {len(series)} series, {total} records"
+
+    def _watermarks(self, connection, keys) -> Dict[Tuple[int, int], datetime]:
+        table = Rollup_Watermark.__table__
+        rows = connection.execute(
+            select(table.c.sensor_id, table.c.parameter_id, table.c.watermark)
+            .where(tuple_(table.c.sensor_id, table.c.parameter_id).in_(keys))).all()
+        return {(sensor_id, parameter_id): watermark for sensor_id, parameter_id, watermark in rows}
+
+    def _advance(self, connection, latest, watermarks, recomputed):
+        # latest — время последней записи пачки по каждой серии
+        rows = []
+        for key, last in latest.items():
+            row = {'sensor_id': key[0], 'parameter_id': key[1], 'watermark': last, 'complete': True}
+            if key not in watermarks:
+                # Новая серия: агрегаты полны, если других записей, кроме пересчитанных, у неё нет
+                counted = recomputed.get(key, 0)
+                row['complete'] = self._count_records(connection, key, counted + 1) == counted
+            rows.append(row)
+        table = Rollup_Watermark.__table__
+        statement = _upsert(connection)(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.sensor_id, table.c.parameter_id],
+            set_={'watermark': case((statement.excluded.watermark > table.c.watermark, statement.excluded.watermark),
+                                    else_=table.c.watermark)})
+        connection.execute(statement, rows)
+
+    @staticmethod
+    def _count_records(connection, key, limit: int) -> int:
+        # Не больше limit: на серии с долгой историей считать всё незачем
+        records = Sensor_Record.__table__
+        limited = select(records.c.timestamp).where(
+            records.c.sensor_id == key[0], records.c.parameter_id == key[1],
+            records.c.value.isnot(None)).limit(limit).subquery()
+        return connection.execute(select(func.count()).select_from(limited)).scalar()
+
+    def _write(self, connection, level, buckets: Dict[Bucket_Key, list], merge: bool = False):
+        # merge — слияние с сохранёнными агрегатами (интервалы без строк вставляются),
+        # иначе простая вставка (интервалы перед этим очищены)
+        if not buckets:
+            return
+        table = level.model.__table__
+        statement = _upsert(connection)(table)
+        stage = _copy_stage(connection, table, buckets) if connection.dialect.name == 'postgresql' else None
+        if stage is not None:
+            statement = statement.from_select(ROLLUP_COLUMNS, select(*stage.c))
+            rows = None
+        else:
+            rows = _bucket_rows(buckets)
+        if merge:
+            old, new = table.c, statement.excluded
+            count = old['count'] + new['count']
+            statement = statement.on_conflict_do_update(
+                index_elements=[old.sensor_id, old.parameter_id, old.bucket],
+                set_={'count': count,
+                      'min': case((new['min'] < old['min'], new['min']), else_=old['min']),
+                      'max': case((new['max'] > old['max'], new['max']), else_=old['max']),
+                      'mean': (old.mean * old['count'] + new.mean * new['count']) / count,
+                      'sum_squares': old.sum_squares + new.sum_squares})
+        connection.execute(statement, rows)
+        if stage is not None:
+            connection.exec_driver_sql(f"TRUNCATE {stage.name}")
+
+    def _recompute_minutes(self, connection, spans) -> Dict[Tuple[int, int], int]:
+        # Интервалы 1 с и 1 мин в диапазонах [start, end) заново из sensor_records;
+        # возвращает, сколько записей каждой серии учтено
+        records = Sensor_Record.__table__
+        seconds, minutes, counted = {}, {}, {}
+        for sensor_id, parameter_id, start, end in spans:
+            points = connection.execute(
+                select(records.c.timestamp, records.c.value).where(
+                    records.c.sensor_id == sensor_id, records.c.parameter_id == parameter_id,
+                    records.c.timestamp >= start, records.c.timestamp < end,
+                    records.c.value.isnot(None))).all()
+            for timestamp, value in points:
+                _add(seconds, (sensor_id, parameter_id, timestamp.replace(**LEVEL_1S.reset)), value)
+                _add(minutes, (sensor_id, parameter_id, timestamp.replace(**LEVEL_1M.reset)), value)
+            counted[(sensor_id, parameter_id)] = counted.get((sensor_id, parameter_id), 0) + len(points)
+            for level in (LEVEL_1S, LEVEL_1M):
+                self._clear(connection, level, sensor_id, parameter_id, start, end)
+        self._write(connection, LEVEL_1S, seconds)
+        self._write(connection, LEVEL_1M, minutes)
+        return counted
+
+    def _recompute_hours(self, connection, spans):
+        # Часы в диапазонах [start, end) заново из минутных агрегатов
+        table = LEVEL_1M.model.__table__
+        minutes = {}
+        for sensor_id, parameter_id, start, end in spans:
+            rows = connection.execute(
+                select(table.c.bucket, table.c['count'], table.c['min'], table.c['max'],
+                       table.c.mean, table.c.sum_squares).where(
+                    table.c.sensor_id == sensor_id, table.c.parameter_id == parameter_id,
+                    table.c.bucket >= start, table.c.bucket < end)).all()
+            for bucket, count, low, high, mean, sum_squares in rows:
+                minutes[(sensor_id, parameter_id, bucket)] = [count, low, high, mean * count, sum_squares]
+            self._clear(connection, LEVEL_1H, sensor_id, parameter_id, start, end)
+        self._write(connection, LEVEL_1H, _combine(minutes, LEVEL_1H))
+
+    @staticmethod
+    def _clear(connection, level, sensor_id, parameter_id, start, end):
+        table = level.model.__table__
+        connection.execute(delete(table).where(
+            table.c.sensor_id == sensor_id, table.c.parameter_id == parameter_id,
+            table.c.bucket >= start, table.c.bucket < end))
+
+
+def _upsert(connection):
+    # Слияние агрегатов — INSERT ... ON CONFLICT DO UPDATE; на других СУБД агрегаты не ведутся
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert
+    return None
+
+
+def _copy_stage(connection, table, buckets: Dict[Bucket_Key, list]):
+    """
+    Агрегаты во временную таблицу сеанса через COPY (как записи в record_writer):
+    executemany psycopg2 — отдельный запрос на строку. None — драйвер без COPY.
+    """
+    cursor = connection.connection.dbapi_connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        cursor.close()
+        return None
+    stage = f"{table.name}_stage"
+    # Текстовый формат COPY; str(datetime) — 'YYYY-MM-DD HH:MM:SS[.ffffff]', repr(float) — без потери точности
+    lines = [f"{sensor_id}\t{parameter_id}\t{bucket}\t{count}\t{low!r}\t{high!r}\t{total / count!r}\t{sum_squares!r}\n"
+             for (sensor_id, parameter_id, bucket), (count, low, high, total, sum_squares) in buckets.items()]
+    try:
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS "
+                       f"AS SELECT {', '.join(ROLLUP_COLUMNS)} FROM {table.name} WITH NO DATA")
+        cursor.copy_expert(f"COPY {stage} ({', '.join(ROLLUP_COLUMNS)}) FROM STDIN", io.StringIO(''.join(lines)))
+    finally:
+        cursor.close()
+    return table_clause(stage, *[column(name) for name in ROLLUP_COLUMNS])
+
+
+def naive_utc(moment: datetime) -> datetime:
+    # sensor_records хранит время без пояса (UTC)
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _add(buckets: Dict[Bucket_Key, list], key: Bucket_Key, value: float):
+    acc = buckets.get(key)
+    if acc is None:
+        buckets[key] = [1, value, value, value, value * value]
+    else:
+        acc[0] += 1
+        if value < acc[1]:
+            acc[1] = value
+        if value > acc[2]:
+            acc[2] = value
+        acc[3] += value
+        acc[4] += value * value
+
+
+def _aggregate(points, level) -> Dict[Bucket_Key, list]:
+    # points: (sensor_id, parameter_id, timestamp, value)
+    buckets = {}
+    for sensor_id, parameter_id, timestamp, value in points:
+        _add(buckets, (sensor_id, parameter_id, timestamp.replace(**level.reset)), value)
+    return buckets
+
+
+def _combine(buckets: Dict[Bucket_Key, list], level) -> Dict[Bucket_Key, list]:
+    # Агрегаты мелкого разрешения → более крупного (count, min, max, sum, sum_squares складываются)
+    combined = {}
+    for (sensor_id, parameter_id, bucket), (count, low, high, total, sum_squares) in buckets.items():
+        key = (sensor_id, parameter_id, bucket.replace(**level.reset))
+        acc = combined.get(key)
+        if acc is None:
+            combined[key] = [count, low, high, total, sum_squares]
+        else:
+            acc[0] += count
+            if low < acc[1]:
+                acc[1] = low
+            if high > acc[2]:
+                acc[2] = high
+            acc[3] += total
+            acc[4] += sum_squares
+    return combined
+
+
+def _bucket_rows(buckets: Dict[Bucket_Key, list]) -> List[dict]:
+    return [{'sensor_id': sensor_id, 'parameter_id': parameter_id, 'bucket': bucket, 'count': count,
+             'min': low, 'max': high, 'mean': total / count, 'sum_squares': sum_squares}
+            for (sensor_id, parameter_id, bucket), (count, low, high, total, sum_squares) in buckets.items()]
+
+
+def _spans(keys, step: timedelta) -> List[tuple]:
+    # (sensor_id, parameter_id, начало интервала) → диапазоны [start, end); подряд идущие сливаются
+    spans = []
+    for sensor_id, parameter_id, start in sorted(keys):
+        if spans and spans[-1][:2] == (sensor_id, parameter_id) and spans[-1][3] == start:
+            spans[-1] = (sensor_id, parameter_id, spans[-1][2], start + step)
+        else:
+            spans.append((sensor_id, parameter_id, start, start + step))
+    return spans
+
+
+rollup_manager = Rollup_Manager()
@@ -0,0 +1,185 @@
+# backend/app/services/running_stats.py
+
+import math
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.signal import lfilter
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.series_stat import Series_Stat
+from app.services.record_block import Record_Block
+
+STATS_HORIZONS = (60.0, 3600.0)  # Горизонты экспоненциально затухающих оценок, сек
+
+
+class Series_Stats:
+    """
+    Статистика одной серии с момента запуска: число отсчётов, среднее и дисперсия
+    по Уэлфорду (устойчиво к накоплению ошибки), минимум, максимум, а также
+    экспоненциально затухающие среднее и дисперсия по времени для каждого горизонта.
+    """
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'first_time', 'last_time', 'last_value', 'ewm')
+
+    def __init__(self, horizons):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.first_time = None
+        self.last_time = None
+        self.last_value = None
+        self.ewm = [[horizon, 0.0, 0.0] for horizon in horizons]  # [горизонт, среднее, дисперсия]
+
+    def update(self, t, v):
+        self.count += 1
+        delta = v - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (v - self.mean)
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+
+        if self.last_time is None:
+            self.first_time = t
+            for state in self.ewm:
+                state[1] = v
+        else:
+            # Вес нового отсчёта зависит от прошедшего времени, а не от числа отсчётов,
+            # поэтому оценка не зависит от частоты публикации
+            elapsed = max((t - self.last_time).total_seconds(), 0.0)
+            for state in self.ewm:
+                alpha = 1.0 - math.exp(-elapsed / state[0])
+                diff = v - state[1]
+                increment = alpha * diff
+                state[1] += increment
+                state[2] = (1.0 - alpha) * (state[2] + diff * increment)
+        if self.last_time is None or t >= self.last_time:
+            self.last_time = t
+            self.last_value = v
+
+    def update_block(self, times: np.ndarray, values: np.ndarray):
+        # Первый отсчёт — как одиночный (шаг от прошлого отсчёта серии произвольный), остальные
+        # равномерны: моменты блока сливаются с накопленными (Чан и др.), затухающие
+        # оценки с постоянным весом считает фильтр первого порядка
+        self.update(times[0].item(), float(values[0]))
+        if len(values) < 2:
+            return
+        rest = values[1:]
+        count = len(rest)
+        mean = float(rest.mean())
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += float(np.square(rest - mean).sum()) + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, float(rest.min()))
+        self.max = max(self.max, float(rest.max()))
+
+        elapsed = max((times[1] - times[0]) / np.timedelta64(1, 's'), 0.0)
+        for state in self.ewm:
+            alpha = 1.0 - math.exp(-elapsed / state[0])
+            means = lfilter([alpha], [1.0, alpha - 1.0], rest, zi=[(1.0 - alpha) * state[1]])[0]
+            diff = rest - np.concatenate(([state[1]], means[:-1]))
+            variances = lfilter([(1.0 - alpha) * alpha], [1.0, alpha - 1.0], diff * diff,
+                                zi=[(1.0 - alpha) * state[2]])[0]
+            state[1], state[2] = float(means[-1]), float(variances[-1])
+        t = times[-1].item()
+        if t >= self.last_time:
+            self.last_time = t
+            self.last_value = float(values[-1])
+
+    def to_dict(self) -> dict:
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'variance': variance,
+            'min': self.min,
+            'max': self.max,
+            'first_time': self.first_time,
+            'last_time': self.last_time,
+            'last_value': self.last_value,
+            'ewm': {f"{horizon:g}": {'mean': mean, 'std': math.sqrt(max(variance, 0.0))}
+                    for horizon, mean, variance in self.ewm},
+        }
+
+
+class Running_Stats:
+    """
+    Текущая статистика по каждой серии (sensor_id, parameter_id), обновляемая на приёме
+    за O(1) на отсчёт (блоки равномерных отсчётов — векторно). Позволяет отвечать
+    на вопросы «среднее/СКО/мин/макс с запуска и за последний час» без чтения sensor_records.
+    Не потокобезопасен: обновляется под локом MQTT_Buffer; флашер под тем же локом
+    забирает снимок изменившихся серий (snapshot) и пишет его в series_stats уже без лока.
+    """
+
+    def __init__(self, horizons=STATS_HORIZONS):
+        self.horizons = tuple(horizons)
+        self.series: Dict[Tuple[int, int], Series_Stats] = {}
+        self.dirty = set()  # Серии, изменившиеся после последнего снимка
+        self.started_at = datetime.now()
+
+    def update(self, records: List[tuple]):
+        # Запись: (timestamp, value, sensor_id, parameter_id)
+        series = self.series
+        dirty = self.dirty
+        for timestamp, value, sensor_id, parameter_id in records:
+            if timestamp is None or value is None:
+                continue
+            try:
+                v = float(value)
+            except (TypeError, ValueError):
+                continue
+            key = (sensor_id, parameter_id)
+            stats = series.get(key)
+            if stats is None:
+                stats = series[key] = Series_Stats(self.horizons)
+            stats.update(timestamp, v)
+            dirty.add(key)
+
+    def update_blocks(self, blocks: List[Record_Block]):
+        # Блоки равномерных отсчётов — векторно, без записи на отсчёт
+        for block in blocks:
+            key = block.key
+            stats = self.series.get(key)
+            if stats is None:
+                stats = self.series[key] = Series_Stats(self.horizons)
+            stats.update_block(block.times, block.values)
+            self.dirty.add(key)
+
+    def snapshot(self) -> List[dict]:
+        """Строки series_stats для серий, изменившихся после прошлого снимка; O(изменившихся серий)."""
+        now = datetime.now()
+        rows = []
+        for sensor_id, parameter_id in self.dirty:
+            stats = self.series[(sensor_id, parameter_id)]
+            rows.append(dict(sensor_id=sensor_id, parameter_id=parameter_id, started_at=self.started_at,
+                             updated_at=now, **stats.to_dict()))
+        self.dirty = set()
+        return rows
+
+    def restore(self, rows: List[dict]):
+        # Снимок не записался — серии попадут в следующий
+        self.dirty.update((row['sensor_id'], row['parameter_id']) for row in rows)
+
+
+def store_snapshot(rows: List[dict]):
+    """Пишет снимок в series_stats (INSERT ... ON CONFLICT DO UPDATE; на других СУБД — merge). Commit — за вызывающим."""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        for row in rows:
+            db.session.merge(Series_Stat(**row))
+        return
+    insert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(Series_Stat.__table__)
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=['sensor_id', 'parameter_id'],
+        set_={column: insert.excluded[column] for column in rows[0] if column not in ('sensor_id', 'parameter_id')}
+    ), rows)
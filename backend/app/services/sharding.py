@@ -0,0 +1,147 @@
+# backend/app/services/sharding.py
+
+import hashlib
+import os
+import socket
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from threading import Event, Thread
+from typing import Callable, List, Optional, Tuple
+
+from app import db
+from app.models.ingest_worker import Ingest_Worker
+
+SHARD_NONE = 'none'  # Один процесс приёма получает все топики
+SHARD_HASH = 'hash'  # Топики делятся между процессами согласованным хешированием
+SHARD_SHARED = 'shared'  # Общие подписки MQTT ($share/<группа>/<фильтр>), делит брокер
+SHARD_MODES = (SHARD_NONE, SHARD_HASH, SHARD_SHARED)
+SHARD_REPLICAS = 128  # Виртуальных узлов кольца на процесс
+SHARD_HEARTBEAT = 5.0  # Секунд между отметками процесса в ingest_workers
+SHARD_TIMEOUT = 15.0  # Процесс без отметки дольше этого считается ушедшим
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _point(value: str) -> int:
+    # Хеш не зависит от процесса (в отличие от встроенного hash со случайной солью)
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def shared_filters(filters: List[str], group: str) -> List[str]:
+    """Фильтры общих подписок: брокер отдаёт каждое сообщение одному подписчику группы."""
+    return [f"$share/{group}/{topic_filter}" for topic_filter in filters]
+
+
+class Hash_Ring:
+    """
+    Кольцо согласованного хеширования. При уходе или добавлении процесса
+    меняют владельца только его топики (≈ 1/N), остальные остаются на месте.
+    """
+
+    def __init__(self, workers: List[str], replicas: int = SHARD_REPLICAS):
+        self.workers = tuple(sorted(workers))
+        points = sorted((_point(f"{worker}#{index}"), worker)
+                        for worker in self.workers for index in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self.hashes:
+            return None
+        index = bisect_right(self.hashes, _point(key)) % len(self.hashes)
+        return self.owners[index]
+
+
+class Shard_Coordinator:
+    """
+    Координация шардов через БД: процесс раз в heartbeat секунд отмечается
+    в ingest_workers и читает список живых процессов. Если состав изменился
+    (процесс пришёл, остановился или перестал отмечаться дольше timeout),
+    кольцо перестраивается и вызывается on_change — маршрутизатор пересобирает
+    таблицу и подписки только на свои топики.
+    Сообщения, пришедшие двум процессам на время перебалансировки, отсеивает
+    уникальный ключ sensor_records.
+    """
+
+    def __init__(self, worker_id: str = None, heartbeat: float = SHARD_HEARTBEAT, timeout: float = SHARD_TIMEOUT):
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.ring = Hash_Ring([self.worker_id])
+        self.started_at = _utcnow()
+        self.topics = 0
+        self.rebalances = 0
+        self.app = None
+        self.on_change: Optional[Callable[[], None]] = None
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self, app, on_change: Callable[[], None] = None):
+        self.app = app
+        self.on_change = on_change
+        # Первая отметка — сразу, чтобы первая таблица маршрутизации учла уже живые процессы
+        self.beat()
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="shard-coordinator", daemon=True)
+            self.thread.start()
+
+    def owns(self, data_source: str) -> bool:
+        return self.ring.owner(data_source) == self.worker_id
+
+    def workers(self) -> Tuple[str, ...]:
+        return self.ring.workers
+
+    def beat(self):
+        now = _utcnow()
+        with self.app.app_context():
+            try:
+                db.session.merge(Ingest_Worker(worker_id=self.worker_id, hostname=socket.gethostname(),
+                                               pid=os.getpid(), started_at=self.started_at,
+                                               heartbeat_at=now, topics=self.topics))
+                workers = db.session.execute(
+                    db.select(Ingest_Worker.worker_id)
+                      .filter(Ingest_Worker.heartbeat_at >= now - timedelta(seconds=self.timeout))
+                ).scalars().all()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        if tuple(sorted(workers)) != self.ring.workers:
+            self.ring = Hash_Ring(workers)
+            self.rebalances += 1
+            print(f"Ingest shards rebalanced: {len(self.ring.workers)} workers {list(self.ring.workers)}")
+            if self.on_change:
+                self.on_change()
+
+    def stop(self):
+        # Уходим сразу, не дожидаясь timeout: остальные заберут топики на следующей отметке
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        with self.app.app_context():
+            try:
+                db.session.execute(db.delete(Ingest_Worker).filter_by(worker_id=self.worker_id))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to leave ingest shards: {e}")
+
+    def stats(self) -> dict:
+        return {'worker_id': self.worker_id, 'workers': list(self.ring.workers),
+                'topics': self.topics, 'rebalances': self.rebalances}
+
+    def _run(self):
+        while not self.stopped.wait(self.heartbeat):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"Ingest shard heartbeat failed: {e}")
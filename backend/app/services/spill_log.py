@@ -0,0 +1,198 @@
+# backend/app/services/spill_log.py
+
+import base64
+import json
+import os
+from datetime import datetime
+from threading import Lock
+from typing import Callable, List, Tuple
+
+import numpy as np
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+
+from app.services.record_block import Record_Block, block_rows
+
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # Размер сегмента, после которого начинается новый файл
+SEGMENT_SUFFIX = '.seg'
+QUARANTINE_DIR = 'quarantine'  # Подкаталог для сегментов, которые БД не принимает
+REPLAY_MAX_ATTEMPTS = 3  # Сколько раз БД может отвергнуть сегмент, прежде чем он уйдёт в карантин
+# Ошибки связи с БД: сегмент не виноват, его повторяют без ограничения
+CONNECTION_ERRORS = (OperationalError, InterfaceError, DisconnectionError, ConnectionError, TimeoutError)
+
+
+class Spill_Log:
+    """
+    Журнал записей на локальном диске (append-only), куда буфер MQTT
+    сбрасывает данные, пока БД недоступна или не успевает.
+    Журнал разбит на сегменты; сегменты воспроизводятся в порядке записи
+    и удаляются после успешного commit. Сегмент, который БД отвергает не из-за связи
+    (например, значение не приводится к типу столбца) REPLAY_MAX_ATTEMPTS раз подряд,
+    переносится в подкаталог quarantine, как только следом за ним записался следующий
+    сегмент: так журнал не застревает на одной плохой строке, а при общей беде с БД
+    (нет таблицы, нет прав) в карантин ничего не уходит.
+    Формат строки сегмента — JSON-массив записей [timestamp, value, sensor_id, parameter_id]
+    либо объект {"frames": [[start_time, sample_rate, dtype, samples_base64, sensor_id, parameter_id], ...]}
+    для кадров формы сигнала, {"blocks": [[times_base64, values_base64, sensor_id, parameter_id], ...]}
+    для блоков отсчётов (метки — int64 мкс, значения — float64, little-endian),
+    либо {"events": [[table, row], ...]} для событий стадий приёма.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 max_attempts: int = REPLAY_MAX_ATTEMPTS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_attempts = max_attempts
+        self.lock = Lock()
+        self.active = None
+        self.active_path = None
+        self.pending_rows = 0
+        self.attempts = {}  # Сегмент → сколько раз БД его отвергла
+        self.quarantined = 0
+        os.makedirs(directory, exist_ok=True)
+        self.next_index = self._last_index() + 1
+
+    def _segments(self) -> List[str]:
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _last_index(self) -> int:
+        segments = self._segments()
+        if not segments:
+            return 0
+        return int(os.path.basename(segments[-1])[:-len(SEGMENT_SUFFIX)])
+
+    def has_pending(self) -> bool:
+        with self.lock:
+            return self.active is not None or bool(self._segments())
+
+    def append(self, rows: List[tuple], frames: List[tuple] = (), events: List[tuple] = (),
+               blocks: List[Record_Block] = ()):
+        if not rows and not frames and not events and not blocks:
+            return
+        lines = []
+        if rows:
+            lines.append(json.dumps([[ts.isoformat(), value, sensor_id, parameter_id]
+                                     for ts, value, sensor_id, parameter_id in rows], default=str))
+        if frames:
+            lines.append(json.dumps({'frames': [
+                [start_time.isoformat(), sample_rate, np.asarray(samples).dtype.str,
+                 base64.b64encode(np.asarray(samples).tobytes()).decode('ascii'), sensor_id, parameter_id]
+                for start_time, sample_rate, samples, sensor_id, parameter_id in frames]}))
+        if blocks:
+            lines.append(json.dumps({'blocks': [
+                [_b64(block.times.astype('<M8[us]')), _b64(block.values.astype('<f8')),
+                 block.sensor_id, block.parameter_id] for block in blocks]}))
+        if events:
+            lines.append(json.dumps({'events': [[table, row] for table, row in events]}, default=_isoformat))
+        with self.lock:
+            if self.active is None:
+                self.active_path = os.path.join(self.directory, f"{self.next_index:012d}{SEGMENT_SUFFIX}")
+                self.next_index += 1
+                self.active = open(self.active_path, 'a', encoding='utf-8')
+            self.active.write(''.join(line + '\n' for line in lines))
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            self.pending_rows += len(rows) + len(frames) + len(events) + block_rows(blocks)
+            if self.active.tell() >= self.segment_max_bytes:
+                self._roll()
+
+    def _roll(self):
+        # Закрываем активный сегмент: дальше он только читается при воспроизведении
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+            self.active_path = None
+
+    def replay(self, write_batch: Callable[[List[tuple], List[tuple], List[tuple], List[Record_Block]], None]) -> int:
+        """
+        Воспроизводит сегменты по порядку через write_batch(rows, frames, events, blocks) (запись + commit).
+        Сегмент удаляется только после успешной записи; при ошибке
+        воспроизведение останавливается и исключение пробрасывается дальше —
+        кроме сегмента, отвергнутого БД max_attempts раз: его пропускают, и если
+        следующий сегмент записался, он уходит в карантин.
+        """
+        with self.lock:
+            self._roll()
+            segments = self._segments()
+
+        replayed = 0
+        suspect = None  # Сегмент, отвергнутый max_attempts раз: в карантин, если следующий запишется
+        for path in segments:
+            rows, frames, events, blocks = _read_segment(path)
+            count = len(rows) + len(frames) + len(events) + block_rows(blocks)
+            try:
+                write_batch(rows, frames, events, blocks)
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                attempts = self.attempts.get(path, 0) + 1
+                self.attempts[path] = attempts
+                if suspect is not None or attempts < self.max_attempts:
+                    raise
+                suspect = (path, count, e)
+                continue
+            os.remove(path)
+            self.attempts.pop(path, None)
+            replayed += count
+            with self.lock:
+                self.pending_rows = max(self.pending_rows - count, 0)
+            if suspect is not None:
+                # Следующий сегмент записался — значит, дело в данных отвергнутого
+                self._quarantine(*suspect)
+                suspect = None
+        if suspect is not None:
+            raise suspect[2]
+        return replayed
+
+    def _quarantine(self, path: str, count: int, error: Exception):
+        # Сегмент не удаляется: его можно разобрать и воспроизвести вручную
+        directory = os.path.join(self.directory, QUARANTINE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        os.replace(path, os.path.join(directory, os.path.basename(path)))
+        self.attempts.pop(path, None)
+        print(f"Quarantined spill segment {path} ({count} rows) after {self.max_attempts} failed attempts: {error}")
+        with self.lock:
+            self.pending_rows = max(self.pending_rows - count, 0)
+            self.quarantined += 1
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _b64(array: np.ndarray) -> str:
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def _read_segment(path: str) -> Tuple[List[tuple], List[tuple], List[tuple], List[Record_Block]]:
+    rows = []
+    frames = []
+    events = []
+    blocks = []
+    with open(path, encoding='utf-8') as segment:
+        for line_number, line in enumerate(segment, 1):
+            try:
+                batch = json.loads(line)
+            except json.JSONDecodeError:
+                # Недописанная строка после аварийной остановки процесса
+                print(f"Skipping broken line {line_number} in {path}")
+                continue
+            if isinstance(batch, dict) and 'events' in batch:
+                events.extend((table, row) for table, row in batch['events'])
+                continue
+            if isinstance(batch, dict) and 'blocks' in batch:
+                blocks.extend(Record_Block(np.frombuffer(base64.b64decode(times), dtype='<M8[us]'),
+                                           np.frombuffer(base64.b64decode(values), dtype='<f8'),
+                                           sensor_id, parameter_id)
+                              for times, values, sensor_id, parameter_id in batch['blocks'])
+                continue
+            if isinstance(batch, dict):
+                frames.extend((datetime.fromisoformat(start_time), sample_rate,
+                               np.frombuffer(base64.b64decode(samples), dtype=dtype), sensor_id, parameter_id)
+                              for start_time, sample_rate, dtype, samples, sensor_id, parameter_id in batch['frames'])
+                continue
+            rows.extend((datetime.fromisoformat(ts), value, sensor_id, parameter_id)
+                        for ts, value, sensor_id, parameter_id in batch)
+    return rows, frames, events, blocks
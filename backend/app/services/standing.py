@@ -0,0 +1,299 @@
+# backend/app/services/standing.py
+
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from app.core.block_processor import Block_Processor, serialize_result, get_data, get_waveform, \
+    apply_last_update, source_mode, source_points, feeds_charts_only
+from app.models.standing_result import Standing_Result
+from app.models.waveform_frame import Waveform_Frame
+from app.services.compression import reconstruct_segments
+from app.services.record_block import Record_Block, expand
+from app.services.rollups import rollup_manager, naive_utc
+
+STANDING_MAX_POINTS = 100000  # Сколько последних точек источника держать в памяти
+STANDING_REFRESH_INTERVAL = 10  # Секунд между перечитываниями при шардированном приёме
+MODE_RECORDS = 'records'
+MODE_WAVEFORM = 'waveform'
+
+
+def configuration_sources(config: dict) -> set:
+    """Серии (sensor_id, parameter_id, mode, points), которые читают блоки-источники конфигурации."""
+    sources = set()
+    for block_id, block in (config.get('blocks') or {}).items():
+        if block.get('type') != 'dataSource':
+            continue
+        parameters = block.get('parameters') or {}
+        try:
+            sid = int(parameters.get('sensor_id'))
+            pid = int(parameters.get('parameter_id'))
+        except (TypeError, ValueError):
+            continue
+        mode = source_mode(parameters)
+        points = source_points(parameters, feeds_charts_only(config, block_id)) if mode == MODE_RECORDS else None
+        sources.add((sid, pid, mode, points))
+    return sources
+
+
+class Standing_Series:
+    """
+    Серия источника в памяти: то же, что вернули бы get_data / get_waveform с моментом
+    /apply и бюджетом точек блока. Серии, которые get_data отдаёт записями (без бюджета,
+    сжатые серии, формы сигнала), дополняются записанными пачками; серии с бюджетом
+    точек могут уйти в агрегаты и после каждой затронувшей их пачки перечитываются.
+    """
+
+    __slots__ = ('key', 'compression', 'loaded', 'x', 'y', 'rate', 'origin')
+
+    def __init__(self, key, compression=None):
+        self.key = key  # (sensor_id, parameter_id, mode, points)
+        self.compression = compression  # Метод сжатия серии на приёме или None
+        self.loaded = False
+        self.x = []
+        self.y = []
+        self.rate = None
+        self.origin = None  # Начало первого кадра (для x формы сигнала)
+
+    def appendable(self) -> bool:
+        # get_data без агрегатов: сжатые серии и бюджет 0 (или агрегаты выключены)
+        mode, points = self.key[2:]
+        return mode == MODE_WAVEFORM or bool(self.compression) or not points or not rollup_manager.enabled
+
+    def load(self, since, max_points: int):
+        sensor_id, parameter_id, mode, points = self.key
+        if mode == MODE_WAVEFORM:
+            self.x, self.y, self.rate = get_waveform(sensor_id, parameter_id, since)
+            self.origin = db.session.execute(
+                db.select(db.func.min(Waveform_Frame.start_time))
+                  .filter_by(sensor_id=sensor_id, parameter_id=parameter_id)
+            ).scalar()
+        else:
+            self.x, self.y = get_data(sensor_id, parameter_id, since, points)
+            self.x, self.y = list(self.x), list(self.y)
+        self.loaded = True
+        self._trim(max_points)
+
+    def append_records(self, rows: List[tuple], max_points: int):
+        # Запись: (timestamp, value); порядок как у get_data — по времени
+        rows = sorted((t, float(v)) for t, v in rows)
+        if self.compression:
+            # Сжатая серия: восстанавливаем участок от последней показанной опорной точки
+            if self.x:
+                rows = [(self.x[-1], self.y[-1])] + [row for row in rows if row[0] > self.x[-1]]
+            timestamps, values = reconstruct_segments([t for t, _ in rows], [v for _, v in rows])
+            start = 1 if self.x else 0
+            self.x.extend(timestamps[start:])
+            self.y.extend(values[start:])
+        elif self.x and rows[0][0] < self.x[-1]:
+            # Запоздавшие отсчёты — пересортировываем серию целиком
+            merged = sorted(list(zip(self.x, self.y)) + rows, key=lambda row: row[0])
+            self.x = [t for t, _ in merged]
+            self.y = [v for _, v in merged]
+        else:
+            self.x.extend(t for t, _ in rows)
+            self.y.extend(v for _, v in rows)
+        self._trim(max_points)
+
+    def append_frames(self, frames: List[tuple], max_points: int):
+        # Кадр: (start_time, sample_rate, samples); x — секунды от начала первого кадра серии
+        frames = sorted(frames, key=lambda frame: frame[0])
+        if self.origin is None:
+            self.origin = frames[0][0]
+        xs = [np.asarray(self.x, dtype=np.float64)]
+        ys = [np.asarray(self.y, dtype=np.float64)]
+        for start_time, sample_rate, samples in frames:
+            samples = np.asarray(samples, dtype=np.float64)
+            offset = (start_time - self.origin).total_seconds()
+            xs.append(offset + np.arange(len(samples)) / sample_rate)
+            ys.append(samples)
+            self.rate = sample_rate
+        self.x = np.concatenate(xs)
+        self.y = np.concatenate(ys)
+        self._trim(max_points)
+
+    def _trim(self, max_points: int):
+        if max_points and len(self.x) > max_points:
+            self.x = self.x[-max_points:]
+            self.y = self.y[-max_points:]
+
+
+class Standing_Engine:
+    """
+    Постоянные (standing) конфигурации: граф блоков вычисляется не на каждый запрос
+    /apply, а после каждой записанной пачки приёма, и готовый ответ пишется в
+    standing_results — его отдаёт любой процесс API. Источники читаются так же, как
+    их читает /apply (с apply_last_update и бюджетом points блока); серии без агрегатов
+    дополняются записанными записями и кадрами, граф пересчитывается, только если пачка
+    затронула его источники.
+    При шардированном приёме процесс видит только часть пачек, поэтому серии не
+    дополняются, а раз в refresh_interval перечитываются из БД; owns — какие
+    конфигурации считает этот процесс (режим hash), без него — все.
+    configure вызывается при перестройке таблицы маршрутизации, on_commit — флашером.
+    """
+
+    def __init__(self, max_points: int = STANDING_MAX_POINTS):
+        self.max_points = max_points
+        self.refresh_interval: Optional[float] = None
+        self.owns: Optional[Callable[[str], bool]] = None
+        self.refreshed_at = 0.0
+        self.since = naive_utc(apply_last_update())
+        self.lock = Lock()
+        self.configurations: Dict[Tuple[int, int], dict] = {}
+        self.sources: Dict[Tuple[int, int], set] = {}
+        self.series: Dict[tuple, Standing_Series] = {}
+        self.removed = set()  # Конфигурации, чьи ответы надо удалить из standing_results
+        self.dirty = set()
+        self.evaluations = 0
+        self.materialized = 0
+
+    def configure(self, configurations: Dict[Tuple[int, int], dict], compression: Dict[Tuple[int, int], tuple]):
+        # configurations: (user_id, equipment_id) → граф; compression — как в Routing_Table
+        with self.lock:
+            changed = {key for key, config in configurations.items() if self.configurations.get(key) != config}
+            self.removed = (self.removed | (set(self.configurations) - set(configurations))) - set(configurations)
+            self.configurations = dict(configurations)
+            self.sources = {key: configuration_sources(config) for key, config in configurations.items()}
+            self.dirty = (self.dirty | changed) & set(configurations)
+
+            needed = set().union(*self.sources.values()) if self.sources else set()
+            series = {}
+            for key in needed:
+                method = compression.get(key[:2], (None,))[0] if key[2] == MODE_RECORDS else None
+                current = self.series.get(key)
+                if current is None or current.compression != method:
+                    # Новая серия или сменилось сжатие — перечитаем из БД
+                    current = Standing_Series(key, method)
+                    self.dirty |= {view for view, sources in self.sources.items() if key in sources}
+                series[key] = current
+            self.series = series
+
+    def on_commit(self, records: List[tuple], frames: List[tuple], blocks: List[Record_Block] = ()):
+        """Дополняет серии записанной пачкой, пересчитывает затронутые конфигурации и пишет ответы (в контексте приложения)."""
+        with self.lock:
+            if not self.configurations and not self.removed:
+                return
+            if self.refresh_interval:
+                views, touched = self._refresh_views(), set()
+            else:
+                views, touched = set(self.sources), self._append(records, frames, blocks)
+
+            # Незагруженные серии (новые или с агрегатами) читаются из БД — уже вместе с этой пачкой
+            for key in set().union(*(self.sources[view] for view in views)) if views else ():
+                series = self.series[key]
+                if series.loaded:
+                    continue
+                try:
+                    series.load(self.since, self.max_points)
+                except Exception as e:
+                    print(f"Failed to load standing series {key}: {e}")
+                    continue
+                touched.add(key)
+
+            payloads = {}
+            for view in views:
+                if view in self.dirty or self.sources[view] & touched:
+                    payload = self._evaluate(view)
+                    if payload is not None:
+                        payloads[view] = payload
+            self._store(payloads)
+
+    def _refresh_views(self) -> set:
+        # Шардированный приём: раз в refresh_interval перечитываем серии своих конфигураций
+        now = time.monotonic()
+        if now - self.refreshed_at < self.refresh_interval:
+            return set()
+        self.refreshed_at = now
+        views = {view for view in self.sources
+                 if self.owns is None or self.owns(f"standing/{view[0]}/{view[1]}")}
+        for view in views:
+            for key in self.sources[view]:
+                self.series[key].loaded = False
+        return views
+
+    def _append(self, records: List[tuple], frames: List[tuple], blocks: List[Record_Block] = ()) -> set:
+        # Записи и кадры пачки по сериям (sensor_id, parameter_id, mode); раньше момента /apply — не нужны.
+        # Блоки отсчётов разворачиваются только для серий, которые ведёт движок
+        if blocks:
+            wanted = {series.key[:2] for series in self.series.values() if series.key[2] == MODE_RECORDS}
+            records = list(records) + expand(block for block in blocks if block.key in wanted)
+        rows_by_series: Dict[tuple, List[tuple]] = {}
+        for timestamp, value, sensor_id, parameter_id in records:
+            if timestamp is not None and value is not None and timestamp > self.since:
+                rows_by_series.setdefault((sensor_id, parameter_id, MODE_RECORDS), []).append((timestamp, value))
+        for start_time, sample_rate, samples, sensor_id, parameter_id in frames:
+            if start_time > self.since:
+                rows_by_series.setdefault((sensor_id, parameter_id, MODE_WAVEFORM), []).append(
+                    (start_time, sample_rate, samples))
+
+        touched = set()
+        for series in self.series.values():
+            rows = rows_by_series.get(series.key[:3])
+            if not rows or not series.loaded:
+                continue
+            if not series.appendable():
+                # Серия могла уйти в агрегаты — перечитаем её целиком
+                series.loaded = False
+            elif series.key[2] == MODE_WAVEFORM:
+                series.append_frames(rows, self.max_points)
+                touched.add(series.key)
+            else:
+                series.append_records(rows, self.max_points)
+                touched.add(series.key)
+        return touched
+
+    def _evaluate(self, view: Tuple[int, int]) -> Optional[str]:
+        try:
+            raw_result = Block_Processor(self.configurations[view], sources=self._source).process()
+            payload = current_app.json.dumps({
+                'message': 'Configuration applied successfully',
+                'result': serialize_result(raw_result),
+                'materialized_at': datetime.now(),
+            })
+        except Exception as e:
+            print(f"Failed to evaluate standing configuration {view}: {e}")
+            return None
+        self.dirty.discard(view)
+        self.evaluations += 1
+        return payload
+
+    def _store(self, payloads: Dict[Tuple[int, int], str]):
+        # Ответы пишутся одной транзакцией; materialized_at — время БД, как у updated_at конфигурации
+        if not payloads and not self.removed:
+            return
+        try:
+            for user_id, equipment_id in self.removed:
+                Standing_Result.query.filter_by(user_id=user_id, equipment_id=equipment_id).delete()
+            for (user_id, equipment_id), payload in payloads.items():
+                stored = db.session.get(Standing_Result, (user_id, equipment_id))
+                if stored is None:
+                    stored = Standing_Result(user_id=user_id, equipment_id=equipment_id)
+                    db.session.add(stored)
+                stored.payload = payload
+                stored.materialized_at = db.func.now()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to store standing results: {e}")
+            self.dirty |= set(payloads)
+            return
+        self.removed = set()
+        self.materialized += len(payloads)
+
+    def _source(self, sensor_id: int, parameter_id: int, mode: str, points: Optional[int]):
+        series = self.series.get((sensor_id, parameter_id, mode, points))
+        if series is None or not series.loaded:
+            return [], [], None
+        return series.x, series.y, series.rate
+
+    def stats(self) -> dict:
+        return {'configurations': len(self.configurations), 'materialized': self.materialized,
+                'series': len(self.series), 'evaluations': self.evaluations}
+
+
+standing_engine = Standing_Engine()
@@ -0,0 +1,330 @@
+# backend/app/services/topic_router.py
+
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from paho.mqtt.client import topic_matches_sub
+from sqlalchemy import delete, event, insert
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models.sensor import Sensor
+from app.models.sensor_parameter import Sensor_parameter
+from app.models.sensor_type import Sensor_type
+from app.services.codecs import DEFAULT_FORMAT
+from app.services.extraction import Extraction_Plan, compile_plan, STORAGE_RECORDS
+from app.services.compression import COMPRESSION_NONE
+from app.services.capture import Trigger
+from app.models.capture import Capture_Trigger
+from app.models.derived_parameter import Derived_Parameter
+from app.services.derived import Derived_Definition
+from app.models.alarm import Alarm_Rule
+from app.services.alarms import Rule, active_alarms
+from app.models.configuration import Configuration
+from app.models.broker import Broker
+from app.services.brokers import Broker_Settings, DEFAULT_BROKER
+from app.models.routing_change import Routing_Change
+
+WILDCARDS = ('+', '#')
+ROUTING_POLL_INTERVAL = 5.0  # Секунд между проверками изменений, сделанных другими процессами
+
+
+class Routing_Table:
+    """
+    Неизменяемый снимок маршрутизации: (broker_id, topic) → (sensor_id, план разбора);
+    broker_id — брокер датчика, None — брокер по умолчанию, поэтому одинаковые топики
+    на разных брокерах не смешиваются.
+    Темы с подстановочными символами в Sensor.data_source проверяются отдельным списком.
+    brokers — настройки дополнительных брокеров, на которых есть датчики;
+    compression — настройки сжатия серий: (sensor_id, parameter_id) → (метод, допуск, макс. интервал);
+    decimation — прореживание серий, triggers — условия захвата событий,
+    derived — производные параметры, alarm_rules — включённые правила тревог,
+    anomaly_thresholds — пороги обнаружения аномалий по сериям,
+    standing — постоянные конфигурации: (user_id, equipment_id) → граф блоков.
+    """
+
+    def __init__(self, routes: Dict[Tuple[Optional[int], str], Tuple[int, Extraction_Plan]],
+                 wildcard_routes: List[Tuple[Optional[int], str, Tuple[int, Extraction_Plan]]],
+                 compression: Dict[Tuple[int, int], tuple] = None,
+                 decimation: Dict[Tuple[int, int], int] = None,
+                 triggers: List[Trigger] = None,
+                 derived: List[Derived_Definition] = None,
+                 alarm_rules: List[Rule] = None,
+                 anomaly_thresholds: Dict[Tuple[int, int], float] = None,
+                 standing: Dict[Tuple[int, int], dict] = None,
+                 brokers: Dict[int, Broker_Settings] = None):
+        self.routes = routes
+        self.wildcard_routes = wildcard_routes
+        self.compression = compression or {}
+        self.decimation = decimation or {}
+        self.triggers = triggers or []
+        self.derived = derived or []
+        self.alarm_rules = alarm_rules or []
+        self.anomaly_thresholds = anomaly_thresholds or {}
+        self.standing = standing or {}
+        self.brokers = brokers or {}
+
+    def lookup(self, topic: str, broker_id: Optional[int] = DEFAULT_BROKER) -> Tuple[Optional[int], Optional[Extraction_Plan]]:
+        route = self.routes.get((broker_id, topic))
+        if route is not None:
+            return route
+        for route_broker, topic_filter, route in self.wildcard_routes:
+            if route_broker == broker_id and topic_matches_sub(topic_filter, topic):
+                return route
+        return None, None
+
+    def data_sources(self, broker_id: Optional[int] = DEFAULT_BROKER) -> List[str]:
+        return [topic for route_broker, topic in self.routes if route_broker == broker_id] + \
+               [topic_filter for route_broker, topic_filter, _ in self.wildcard_routes if route_broker == broker_id]
+
+    def routes_count(self) -> int:
+        return len(self.routes) + len(self.wildcard_routes)
+
+
+def shard_key(broker_id: Optional[int], data_source: str) -> str:
+    # Ключ топика для шардирования: одинаковые топики разных брокеров — разные ключи
+    return data_source if broker_id is DEFAULT_BROKER else f"{data_source}@{broker_id}"
+
+
+def load_routing_table(previous: Optional[Routing_Table] = None,
+                       owns: Optional[Callable[[str], bool]] = None) -> Routing_Table:
+    """
+    Строит снимок несколькими запросами (датчики, их параметры, условия захвата,
+    производные параметры, правила тревог, постоянные конфигурации), без запроса на каждый датчик.
+    Планы, ключи которых не изменились, переиспользуются из предыдущего снимка.
+    owns — в шардированном приёме оставляет только топики этого процесса (по shard_key).
+    """
+    # Формат сообщений датчика; если не задан — формат его типа
+    sensors = db.session.execute(
+        db.select(Sensor.id, Sensor.data_source, Sensor.broker_id, Sensor.payload_format, Sensor_type.payload_format)
+          .outerjoin(Sensor_type, Sensor.sensor_type_id == Sensor_type.id)
+          .order_by(Sensor.id)
+    ).all()
+    params = db.session.execute(
+        db.select(Sensor_parameter.sensor_id, Sensor_parameter.key, Sensor_parameter.parameter_id,
+                  Sensor_parameter.storage, Sensor_parameter.compression,
+                  Sensor_parameter.compression_tolerance, Sensor_parameter.compression_max_interval,
+                  Sensor_parameter.decimation, Sensor_parameter.anomaly_threshold)
+          .distinct()
+          .order_by(Sensor_parameter.sensor_id, Sensor_parameter.parameter_id)
+    ).all()
+
+    keys_by_sensor: Dict[int, List[Tuple[str, int, str]]] = {}
+    compression = {}
+    decimation = {}
+    anomaly_thresholds = {}
+    for sensor_id, key, parameter_id, storage, method, tolerance, max_interval, factor, threshold in params:
+        keys_by_sensor.setdefault(sensor_id, []).append((key, parameter_id, storage or STORAGE_RECORDS))
+        if method and method != COMPRESSION_NONE and tolerance is not None:
+            compression[(sensor_id, parameter_id)] = (method, tolerance, max_interval)
+        if factor and factor > 1:
+            decimation[(sensor_id, parameter_id)] = factor
+        if threshold is not None and threshold > 0:
+            anomaly_thresholds[(sensor_id, parameter_id)] = threshold
+
+    triggers = [Trigger(trigger.id, (trigger.sensor_id, trigger.parameter_id),
+                        (trigger.source_sensor_id or trigger.sensor_id,
+                         trigger.source_parameter_id or trigger.parameter_id),
+                        trigger.condition, trigger.threshold, trigger.pre_seconds, trigger.post_seconds)
+                for trigger in db.session.execute(db.select(Capture_Trigger).order_by(Capture_Trigger.id)).scalars()]
+
+    derived = []
+    for item in db.session.execute(db.select(Derived_Parameter).order_by(Derived_Parameter.id)).scalars():
+        try:
+            derived.append(Derived_Definition(item.id, (item.sensor_id, item.parameter_id), item.expression, item.inputs))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Derived parameter {item.id} skipped: {e}")
+
+    alarm_rules = [Rule(rule.id, (rule.sensor_id, rule.parameter_id), rule.kind, rule.limit,
+                        rule.hysteresis, rule.n, rule.m, rule.severity)
+                   for rule in db.session.execute(db.select(Alarm_Rule).filter_by(enabled=True)
+                                                    .order_by(Alarm_Rule.id)).scalars()]
+    # Тревога, поднятая до перезапуска или смены правила, остаётся активной, пока её не снимут
+    raised = {alarm['rule_id'] for alarm in active_alarms()} if alarm_rules else set()
+    for rule in alarm_rules:
+        rule.active = rule.id in raised
+
+    broker_settings = {broker.id: Broker_Settings(broker.id, broker.name, broker.host, broker.port,
+                                                  broker.username, broker.password, broker.keepalive)
+                       for broker in db.session.execute(db.select(Broker)).scalars()}
+
+    standing = {(user_id, equipment_id): config
+                for user_id, equipment_id, config in db.session.execute(
+                    db.select(Configuration.user_id, Configuration.equipment_id, Configuration.config)
+                      .filter_by(standing=True))}
+
+    old_plans = {}
+    if previous is not None:
+        for sensor_id, plan in list(previous.routes.values()) + [route for _, _, route in previous.wildcard_routes]:
+            old_plans[(sensor_id, plan.source, plan.payload_format)] = plan
+
+    routes = {}
+    wildcard_routes = []
+    brokers = {}
+    for sensor_id, data_source, broker_id, sensor_format, type_format in sensors:
+        if not data_source or (owns is not None and not owns(shard_key(broker_id, data_source))):
+            continue
+        if broker_id is not DEFAULT_BROKER and broker_id not in broker_settings:
+            print(f"Sensor {sensor_id} skipped: unknown broker {broker_id}")
+            continue
+        data_keys = keys_by_sensor.get(sensor_id, [])
+        payload_format = sensor_format or type_format or DEFAULT_FORMAT
+        plan = old_plans.get((sensor_id, tuple(data_keys), payload_format))
+        if plan is None:
+            try:
+                plan = compile_plan(sensor_id, data_keys, payload_format)
+            except ValueError as e:
+                print(f"Sensor {sensor_id} skipped: {e}")
+                continue
+        if broker_id is not DEFAULT_BROKER:
+            brokers[broker_id] = broker_settings[broker_id]
+        if any(wildcard in data_source for wildcard in WILDCARDS):
+            wildcard_routes.append((broker_id, data_source, (sensor_id, plan)))
+        elif (broker_id, data_source) not in routes:
+            # Как и раньше, на один топик брокера — первый по id датчик
+            routes[(broker_id, data_source)] = (sensor_id, plan)
+    return Routing_Table(routes, wildcard_routes, compression, decimation, triggers, derived, alarm_rules,
+                         anomaly_thresholds, standing, brokers)
+
+
+def subscription_filters(data_sources: List[str], configured: List[str] = None) -> List[str]:
+    """
+    Минимальный набор подписок, покрывающий все data_source.
+    configured — явно заданные фильтры (MQTT_TOPIC_FILTERS, например sensor/#); без них
+    каждый топик подписывается отдельно: общий фильтр вроде plant/# принёс бы и чужие
+    сообщения, которые пришлось бы разбирать и отбрасывать.
+    Топики, не покрытые фильтрами, подписываются как есть, подстановочные — раньше точных.
+    Фильтры не перекрываются, чтобы брокер не присылал одно сообщение дважды.
+    """
+    filters = list(dict.fromkeys(configured or []))
+    # Сначала '#', затем '+', затем точные топики: более широкий фильтр покрывает узкие
+    ordered = sorted(data_sources, key=lambda source: 0 if '#' in source else 1 if '+' in source else 2)
+    for source in ordered:
+        if not any(topic_matches_sub(topic_filter, source) or topic_filter == source for topic_filter in filters):
+            filters.append(source)
+    return filters
+
+
+class Topic_Router:
+    """
+    Маршрутизатор топиков в памяти процесса. Снимок Routing_Table заменяется
+    целиком одной операцией присваивания, поэтому потоки-декодеры читают его без локов.
+    Изменения датчиков, их параметров, условий захвата, производных параметров, правил тревог,
+    конфигураций и брокеров отмечаются событиями SQLAlchemy: в той же транзакции
+    добавляется строка routing_changes, а после commit снимок перестраивается
+    в отдельном потоке. Изменения из других процессов (веб-процессы APP_MODE=web,
+    не ставшие лидером процессы APP_MODE=all) поток замечает по росту
+    наибольшего id routing_changes, проверяя его раз в poll_interval секунд.
+    После перестройки строки ниже применённого id удаляются: для сравнения нужен только наибольший.
+    """
+
+    def __init__(self):
+        self.table = Routing_Table({}, [])
+        self.app = None
+        self.on_rebuild: Optional[Callable[[Routing_Table], None]] = None
+        # Шардированный приём: принадлежит ли data_source этому процессу (None — все)
+        self.owns: Optional[Callable[[str], bool]] = None
+        self.rebuild_requested = Event()
+        self.rebuild_lock = Lock()
+        self.thread = None
+        self.poll_interval = ROUTING_POLL_INTERVAL
+        self.version = None  # Наибольший id routing_changes на момент последней перестройки
+
+    def start(self, app, on_rebuild: Callable[[Routing_Table], None] = None):
+        self.app = app
+        self.on_rebuild = on_rebuild
+        self.poll_interval = app.config.get('ROUTING_POLL_INTERVAL', ROUTING_POLL_INTERVAL)
+        self.rebuild()
+        if self.thread is None:
+            self.thread = Thread(target=self._run, name="topic-router", daemon=True)
+            self.thread.start()
+
+    def lookup(self, topic: str, broker_id: Optional[int] = DEFAULT_BROKER):
+        return self.table.lookup(topic, broker_id)
+
+    def invalidate(self):
+        self.rebuild_requested.set()
+
+    def rebuild(self):
+        with self.rebuild_lock:
+            with self.app.app_context():
+                # Версию читаем до таблицы: изменение между ними даст ещё одну перестройку
+                version = current_version()
+                table = load_routing_table(self.table, self.owns)
+                prune_changes(version)
+            self.table = table
+            self.version = version
+            print(f"Routing table rebuilt: {table.routes_count()} topics, {len(table.brokers)} extra brokers")
+        if self.on_rebuild:
+            self.on_rebuild(table)
+
+    def changed(self) -> bool:
+        # Изменения, закоммиченные другими процессами после последней перестройки
+        with self.app.app_context():
+            return current_version() != self.version
+
+    def _run(self):
+        while True:
+            requested = self.rebuild_requested.wait(self.poll_interval or None)
+            self.rebuild_requested.clear()
+            try:
+                if requested or self.changed():
+                    self.rebuild()
+            except Exception as e:
+                print(f"Failed to rebuild routing table: {e}")
+
+
+def current_version() -> Optional[int]:
+    """Наибольший id routing_changes (в контексте приложения); None — изменений ещё не было."""
+    return db.session.execute(db.select(db.func.max(Routing_Change.id))).scalar()
+
+
+def prune_changes(version: Optional[int]):
+    """Удаляет отметки routing_changes ниже применённой версии (в контексте приложения); её строка остаётся."""
+    if version is None:
+        return
+    try:
+        db.session.execute(delete(Routing_Change).where(Routing_Change.id < version))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Failed to prune routing changes: {e}")
+
+
+topic_router = Topic_Router()
+
+
+# Изменения датчиков, их типов и параметров помечают сессию; перестройка — только после commit
+def _mark_routing_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['routing_dirty'] = True
+
+
+def _record_change(session, flush_context):
+    # Одна отметка на транзакцию — её увидят процессы приёма, в которых commit не происходил
+    if session.info.get('routing_dirty') and not session.info.get('routing_recorded'):
+        session.connection().execute(insert(Routing_Change.__table__).values(changed_at=datetime.utcnow()))
+        session.info['routing_recorded'] = True
+
+
+def _rebuild_after_commit(session):
+    session.info.pop('routing_recorded', None)
+    if session.info.pop('routing_dirty', False) and topic_router.app is not None:
+        topic_router.invalidate()
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop('routing_dirty', None)
+    session.info.pop('routing_recorded', None)
+
+
+for _model in (Sensor, Sensor_parameter, Sensor_type, Capture_Trigger, Derived_Parameter, Alarm_Rule,
+               Configuration, Broker):
+    event.listen(_model, 'after_insert', _mark_routing_dirty)
+    event.listen(_model, 'after_update', _mark_routing_dirty)
+    event.listen(_model, 'after_delete', _mark_routing_dirty)
+event.listen(Session, 'after_flush', _record_change)
+event.listen(Session, 'after_commit', _rebuild_after_commit)
+event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
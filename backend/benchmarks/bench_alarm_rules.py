@@ -0,0 +1,62 @@
+# backend/benchmarks/bench_alarm_rules.py
+#
+# Пропускная способность правил тревог на приёме (app.services.alarms.Alarm_Engine).
+# На каждую серию — три правила: порог сверху с гистерезисом, «3 из 5» снизу
+# и скорость изменения. Цель — не меньше 100 000 отсчётов в секунду на одном ядре.
+#
+# Запуск из каталога backend:
+#   python -m benchmarks.bench_alarm_rules
+# БД и брокер не нужны.
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.services.alarms import Alarm_Engine, Rule, KIND_HIGH, KIND_LOW, KIND_RATE
+
+SAMPLES = int(os.getenv('BENCH_SAMPLES', '1000000'))
+SERIES = int(os.getenv('BENCH_SERIES', '100'))
+BATCH = int(os.getenv('BENCH_BATCH', '1000'))
+TARGET_RATE = 100000
+
+
+def make_rules(series):
+    rules = []
+    for index in range(series):
+        key = (index // 10 + 1, index % 10 + 1)
+        rules.append(Rule(len(rules) + 1, key, KIND_HIGH, 90.0, hysteresis=5.0))
+        rules.append(Rule(len(rules) + 1, key, KIND_LOW, 10.0, hysteresis=5.0, n=3, m=5))
+        rules.append(Rule(len(rules) + 1, key, KIND_RATE, 500.0))
+    return rules
+
+
+def make_records(count, series):
+    start = datetime(2025, 1, 1)
+    keys = [(index // 10 + 1, index % 10 + 1) for index in range(series)]
+    return [(start + timedelta(milliseconds=i), random.uniform(0, 100)) + keys[i % series]
+            for i in range(count)]
+
+
+def main():
+    engine = Alarm_Engine()
+    engine.configure(make_rules(SERIES))
+    records = make_records(SAMPLES, SERIES)
+
+    events = 0
+    started = time.perf_counter()
+    for offset in range(0, len(records), BATCH):
+        events += len(engine.apply(records[offset:offset + BATCH]))
+    elapsed = time.perf_counter() - started
+
+    rate = len(records) / elapsed
+    print(f"{len(records)} samples, {SERIES} series x 3 rules, batch {BATCH}")
+    print(f"{elapsed:.3f} s  {rate:.0f} samples/s  ({elapsed / len(records) * 1e6:.2f} us/sample)")
+    print(f"events: {events} (raised {engine.raised}, cleared {engine.cleared})")
+    print(f"target {TARGET_RATE} samples/s: {'ok' if rate >= TARGET_RATE else 'NOT MET'}")
+    return 0 if rate >= TARGET_RATE else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# backend/benchmarks/bench_edge_forward.py
+#
+# Граничный узел и центральный экземпляр на одной машине.
+# Центр — настоящее приложение (create_app(mode='web')) в отдельном процессе на локальном порту,
+# узел — локальная БД с записанными отсчётами и Edge_Forwarder, как в процессе приёма узла.
+# Проверяется и измеряется:
+#   - скорость пересылки (строк/с) и объём на строку против сырых сообщений MQTT в JSON;
+#   - обрыв связи: пока центр недоступен, курсор не двигается и ничего не теряется;
+#   - потерянный ответ: повтор уже принятой пачки ничего не дублирует;
+#   - перезапуск узла: новый пересыльщик берёт курсор у центра и продолжает с него;
+#   - итог: на центре ровно те же строки, что на узле.
+#
+# Запуск из каталога backend:
+#   python -m benchmarks.bench_edge_forward
+# БД узла и центра — файлы SQLite во временном каталоге.
+
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from app import db
+from app.services.edge import Edge_Forwarder, read_batch, STREAM_RECORDS, STREAM_FRAMES
+from app.services.init_test_data import create_tables, create_sensors_and_equipment
+from app.services.record_writer import write_records, write_frames
+
+RECORDS = int(os.getenv('BENCH_RECORDS', '200000'))
+FRAMES = int(os.getenv('BENCH_FRAMES', '50'))
+FRAME_SAMPLES = 4096
+BATCH_ROWS = int(os.getenv('BENCH_BATCH_ROWS', '5000'))
+NODE_ID = 'edge-bench'
+TOKEN = 'edge-bench-token'  # Без EDGE_INGEST_TOKEN центр пачки узлов не принимает
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def run_central(uri, port, ready):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = uri
+    os.environ['EDGE_INGEST_TOKEN'] = TOKEN
+    from werkzeug.serving import make_server
+    from app import create_app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = create_app(mode='web')
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+def make_edge(uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    db.init_app(app)
+    with app.app_context():
+        create_tables()
+        create_sensors_and_equipment()
+    return app
+
+
+def fill_edge(app):
+    # Отсчёты трёх параметров датчика 1 раз в секунду и кадры формы сигнала; заодно
+    # считаем, сколько байт заняли бы те же данные сырыми сообщениями MQTT
+    start = datetime(2025, 1, 1)
+    random.seed(1)
+    values = [230.0, 10.0, 3.0]
+    records, mqtt_bytes = [], 0
+    for index in range(RECORDS // 3):
+        moment = start + timedelta(seconds=index)
+        values = [round(value + random.uniform(-0.5, 0.5), 2) for value in values]
+        records.extend((moment, value, 1, parameter_id) for parameter_id, value in zip((1, 2, 3), values))
+        mqtt_bytes += len(json.dumps({'device': {'timestamp': moment.strftime('%Y-%m-%d-%H:%M:%S')},
+                                      'telemetry': dict(zip(('voltage_rms', 'inrush_current', 'thd_current'),
+                                                            values))}))
+    frames = [(start + timedelta(seconds=index), 10000.0,
+               [random.gauss(0.0, 1.0) for _ in range(FRAME_SAMPLES)], 1, 1) for index in range(FRAMES)]
+    with app.app_context():
+        write_records(records)
+        write_frames(frames)
+        db.session.commit()
+    return len(records), mqtt_bytes
+
+
+def central_counts(uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    db.init_app(app)
+    with app.app_context():
+        return (db.session.execute(db.text("SELECT COUNT(*) FROM sensor_records")).scalar(),
+                db.session.execute(db.text("SELECT COUNT(*) FROM waveform_frames")).scalar())
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    central_uri = 'sqlite:///' + os.path.join(directory, 'central.db')
+    edge_uri = 'sqlite:///' + os.path.join(directory, 'edge.db')
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+
+    ready = multiprocessing.Event()
+    central = multiprocessing.Process(target=run_central, args=(central_uri, port, ready), daemon=True)
+    central.start()
+    if not ready.wait(60):
+        raise RuntimeError("Central instance did not start")
+
+    edge = make_edge(edge_uri)
+    rows, mqtt_bytes = fill_edge(edge)
+    print(f"edge: {rows} records, {FRAMES} frames x {FRAME_SAMPLES} samples; central at {url}")
+    try:
+        with edge.app_context():
+            # Обрыв связи: центр недоступен — курсор остаётся на месте
+            offline = Edge_Forwarder(f"http://127.0.0.1:{free_port()}", NODE_ID, token=TOKEN, batch_rows=BATCH_ROWS,
+                                     timeout=2)
+            try:
+                offline.forward_pending()
+                raise RuntimeError("Forwarding to an unreachable central instance succeeded")
+            except OSError as e:
+                print(f"offline: forwarding failed as expected ({type(e).__name__}), nothing acknowledged")
+
+            # Частичная пересылка, затем «перезапуск» узла новым пересыльщиком
+            first = Edge_Forwarder(url, NODE_ID, token=TOKEN, batch_rows=BATCH_ROWS)
+            first.cursors = {STREAM_RECORDS: 0, STREAM_FRAMES: 0}
+            batch = read_batch(STREAM_RECORDS, 0, BATCH_ROWS)
+            batch['node_id'] = NODE_ID
+            response = first._request('POST', '/api/edge/batches', batch)
+            replay = first._request('POST', '/api/edge/batches', batch)
+            print(f"replay: first send accepted {response['accepted']}, resend accepted {replay['accepted']} "
+                  f"(cursor {replay['cursor']})")
+
+            second = Edge_Forwarder(url, NODE_ID, token=TOKEN, batch_rows=BATCH_ROWS)
+            started = time.perf_counter()
+            accepted = second.forward_pending()
+            elapsed = time.perf_counter() - started
+            print(f"resume: new forwarder continued from central cursor {replay['cursor']}, "
+                  f"forwarded {accepted} rows in {elapsed:.2f}s ({accepted / elapsed:,.0f} rows/s)")
+            stats = second.stats()
+            print(f"wire: {stats['bytes_sent'] / 1024:,.0f} KiB in {stats['batches']} batches "
+                  f"(gzip {stats['compression_ratio']:.1f}x, frames included); the records alone "
+                  f"as raw MQTT JSON would be {mqtt_bytes / 1024:,.0f} KiB")
+
+        records, frames = central_counts(central_uri)
+        status = 'OK' if (records, frames) == (rows, FRAMES) else 'MISMATCH'
+        print(f"central: {records} records, {frames} frames — {status}")
+        nodes = json.loads(urllib.request.urlopen(f"{url}/api/edge/nodes").read())
+        print(f"cursors: {[(node['stream'], node['last_id'], node['rows']) for node in nodes]}")
+        return 0 if status == 'OK' else 1
+    finally:
+        central.terminate()
+        central.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -294,7 +294,11 @@ export default function Configurator() {
       if (field === 'parameter_id') {
         np.parameter_id = value;
         const sp = sensorParamsList.find(sp => sp.parameter_id === value);
-        if (sp) np.key = sp.key;
+        if (sp) {
+          np.key = sp.key;
+          // Параметры с хранением waveform читаются из кадров формы сигнала
+          np.mode = sp.storage === 'waveform' ? 'waveform' : 'records';
+        }
       }
       return { ...b, parameters: np, label: nl };
     }));
@@ -311,7 +315,11 @@ export default function Configurator() {
             [field]: value,
             ...(field === 'sensor_id' ? { parameter_id: '', key: '' } : {}),
             ...(field === 'parameter_id'
-              ? { key: (sensorParamsList.find(sp => sp.parameter_id === value) || {}).key || '' }
+              ? {
+                  key: (sensorParamsList.find(sp => sp.parameter_id === value) || {}).key || '',
+                  mode: (sensorParamsList.find(sp => sp.parameter_id === value) || {}).storage === 'waveform'
+                    ? 'waveform' : 'records'
+                }
               : {})
           }
         }
@@ -0,0 +1,28 @@
+import time
+
+
+def make_batch_message(device_id, generate_telemetry, samples=100, rate_hz=10.0, device_type="PV-D9MG"):
+    """
+    Пакетное сообщение: несколько отсчётов на параметр в одном сообщении.
+    device.t0 — время первого отсчёта в мс от эпохи, device.dt — интервал между отсчётами в мс,
+    telemetry — массивы значений по каждому ключу.
+    """
+    dt_ms = 1000.0 / rate_hz
+    t0_ms = int(time.time() * 1000 - dt_ms * (samples - 1))
+
+    telemetry = {}
+    for _ in range(samples):
+        for key, value in generate_telemetry().items():
+            telemetry.setdefault(key, []).append(value)
+
+    return {
+        "device": {
+            "type": device_type,
+            "serial_number": f"PasserSN{device_id}",
+            "t0": t0_ms,
+            "dt": dt_ms,
+            "time_unit": "ms",
+            "channel": device_id % 8 + 1
+        },
+        "telemetry": telemetry
+    }
@@ -54,14 +54,22 @@
 #     client.loop_stop()
 #     client.disconnect()
 #     print("Отключение от брокера")
+import argparse
 import json
 
 import paho.mqtt.client as mqtt
 import time
 
-from current_sensor import get_device_current_sensor_data
+from batch_format import make_batch_message
+from current_sensor import get_device_current_sensor_data, generate_current_telemetry
 from thermal_sensor import get_device_thermal_sensor_data
 
+# --batch N — пакетный режим: N отсчётов на параметр в одном сообщении с частотой --rate Гц
+parser = argparse.ArgumentParser()
+parser.add_argument("--batch", type=int, default=0, help="отсчётов в одном сообщении (0 — одиночный формат)")
+parser.add_argument("--rate", type=float, default=10.0, help="частота отсчётов в пакетном режиме, Гц")
+args = parser.parse_args()
+
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
@@ -79,7 +87,10 @@ try:
     client.loop_start()  # Фоновый поток для обработки сообщений
     mes_count = 0
     while True:
-        message = get_device_current_sensor_data(1)
+        if args.batch:
+            message = make_batch_message(1, generate_current_telemetry, samples=args.batch, rate_hz=args.rate)
+        else:
+            message = get_device_current_sensor_data(1)
         #client.publish("sensor/1", "Ping!")
         # Публикация в MQTT
         result = client.publish(topic="sensor/1", payload=json.dumps(message), qos=1)
@@ -94,7 +105,7 @@ try:
         mes_count += 1
         if mes_count % 100 == 0:
             print(f"Отправлено {mes_count} сообщений")
-        time.sleep(0.1)
+        time.sleep(args.batch / args.rate if args.batch else 0.1)
 except Exception as e:
     print(f"Ошибка: {e}")
 finally:
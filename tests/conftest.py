@@ -14,6 +14,9 @@ def app():
     with app.app_context():
         _db.create_all()  # Создаем все таблицы в тестовой БД
         yield app         # Возвращаем объект приложения для использования в тестах
+        # Запросы тестового клиента идут в том же контексте — закрываем их транзакцию,
+        # иначе в PostgreSQL (TEST_DATABASE_URI) drop_all ждёт её блокировок
+        _db.session.remove()
         _db.drop_all()    # Удаляем все таблицы после завершения тестов (чистка БД)
 
 # Фикстура для клиента Flask, который используется для выполнения HTTP-запросов в тестах
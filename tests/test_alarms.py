@@ -0,0 +1,65 @@
+# Тесты правил тревог на приёме и активных тревог из alarm_events (app/services/alarms.py)
+from datetime import datetime, timedelta
+
+from app.models.alarm import Alarm_Rule, Alarm_Event
+from app.services.alarms import Alarm_Engine, Rule, active_alarms, STATE_RAISED, STATE_CLEARED
+from app.services.topic_router import load_routing_table
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+
+
+def _states(engine, values, key=(1, 1), step=1.0):
+    records = [(T0 + timedelta(seconds=step * i), value, key[0], key[1]) for i, value in enumerate(values)]
+    return [(row['state'], row['value']) for _, row in engine.apply(records)]
+
+
+def test_n_of_m_and_hysteresis():
+    """Тревога поднимается при 2 нарушениях из 3 и снимается только ниже limit - hysteresis"""
+    engine = Alarm_Engine()
+    engine.configure([Rule(1, (1, 1), 'high', 50.0, hysteresis=5.0, n=2, m=3)])
+    assert _states(engine, [10, 60, 10, 60, 60, 48, 44, 10]) == [(STATE_RAISED, 60.0), (STATE_CLEARED, 44.0)]
+
+
+def test_low_and_rate_rules():
+    """Нижний порог и скорость изменения (ед./сек) проверяются по своим правилам"""
+    engine = Alarm_Engine()
+    engine.configure([Rule(1, (1, 1), 'low', 5.0), Rule(2, (1, 2), 'rate', 10.0)])
+    assert _states(engine, [10, 4, 6]) == [(STATE_RAISED, 4.0), (STATE_CLEARED, 6.0)]
+    # Скачок 3 ед. за 0.1 с — 30 ед./сек
+    assert _states(engine, [0, 0.5, 3.5, 3.6], key=(1, 2), step=0.1) == [(STATE_RAISED, 3.5), (STATE_CLEARED, 3.6)]
+
+
+def test_configure_keeps_state_of_unchanged_rules():
+    """Перестройка таблицы не сбрасывает состояние правила с теми же настройками"""
+    engine = Alarm_Engine()
+    engine.configure([Rule(1, (1, 1), 'high', 50.0, severity='warning')])
+    assert _states(engine, [60]) == [(STATE_RAISED, 60.0)]
+    engine.configure([Rule(1, (1, 1), 'high', 50.0, severity='critical')])
+    assert _states(engine, [70]) == []
+    assert engine.rules[(1, 1)][0].severity == 'critical'
+    assert _states(engine, [40]) == [(STATE_CLEARED, 40.0)]
+
+
+def _event(rule_id, state, second):
+    return Alarm_Event(rule_id=rule_id, sensor_id=1, parameter_id=1, state=state, severity='warning',
+                       timestamp=T0 + timedelta(seconds=second), value=1.0)
+
+
+def test_active_alarms_from_events(app, db):
+    """Активна тревога включённого правила, последнее событие которого — raised"""
+    db.session.add_all([
+        Alarm_Rule(id=1, sensor_id=1, parameter_id=1, kind='high', limit=50, severity='critical'),
+        Alarm_Rule(id=2, sensor_id=1, parameter_id=1, kind='high', limit=60),
+        Alarm_Rule(id=3, sensor_id=1, parameter_id=1, kind='high', limit=70, enabled=False),
+    ])
+    db.session.add_all([_event(1, STATE_RAISED, 1), _event(2, STATE_RAISED, 2), _event(3, STATE_RAISED, 3),
+                        _event(2, STATE_CLEARED, 4)])
+    db.session.commit()
+
+    active = active_alarms()
+    assert [(alarm['rule_id'], alarm['severity'], alarm['since']) for alarm in active] == \
+        [(1, 'critical', T0 + timedelta(seconds=1))]
+
+    # Перестроенная таблица маршрутизации продолжает с поднятой тревоги, а не поднимает её заново
+    rules = {rule.id: rule for rule in load_routing_table().alarm_rules}
+    assert rules[1].active and not rules[2].active
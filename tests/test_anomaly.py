@@ -0,0 +1,71 @@
+# Тесты потокового обнаружения аномалий (app/services/anomaly.py)
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.anomaly import Anomaly_Detector, Series_Baseline, ANOMALIES_TABLE
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+KEY = (1, 1)
+
+
+def _records(values, key=KEY):
+    return [(T0 + timedelta(seconds=i), float(v)) + key for i, v in enumerate(values)]
+
+
+def _signal(count=1000, spikes=()):
+    values = np.random.default_rng(4).normal(50.0, 1.0, count)
+    values[list(spikes)] += 15.0
+    return values
+
+
+def test_ewma_matches_per_sample_recursion():
+    """Векторная EWMA-оценка совпадает с поотсчётной рекурсией по предыдущим отсчётам"""
+    values = _signal(200)
+    detector = Anomaly_Detector(min_history=0)
+    ewma_score, _ = detector.score(Series_Baseline(), values)
+
+    alpha, mean, var = detector.alpha, values[0], 0.0
+    expected = []
+    for x in values:
+        expected.append((x - mean) / np.sqrt(var) if var > 1e-12 else 0.0)
+        deviation = x - mean
+        mean += alpha * deviation
+        var = (1.0 - alpha) * (var + alpha * deviation ** 2)
+    assert ewma_score == pytest.approx(expected)
+
+
+def test_batches_do_not_change_scores():
+    """Оценки не зависят от того, как поток разбит на пачки"""
+    values = _signal(spikes=(400, 700))
+    whole = Anomaly_Detector()
+    whole_scores = whole.score(Series_Baseline(), values)
+    split = Anomaly_Detector()
+    baseline = Series_Baseline()
+    parts = [split.score(baseline, part) for part in np.split(values, [7, 100, 101, 333, 650])]
+    for index in range(2):
+        assert np.concatenate([part[index] for part in parts]) == pytest.approx(whole_scores[index])
+
+
+def test_spikes_are_reported_after_warmup():
+    """Сохраняются только аномалии серий с порогом; первые min_history отсчётов не оцениваются"""
+    values = _signal(spikes=(10, 400, 700))
+    detector = Anomaly_Detector()
+    detector.configure({KEY: 5.0})
+    detector.collect(_records(values) + _records(values, key=(1, 2)))
+    events = detector.evaluate(detector.take())
+    assert {row['timestamp'] for _, row in events} == {T0 + timedelta(seconds=400), T0 + timedelta(seconds=700)}
+    assert all(table == ANOMALIES_TABLE and row['parameter_id'] == 1 for table, row in events)
+    assert detector.anomalies == 2
+
+
+def test_configure_drops_baselines_of_removed_series():
+    """Серия без порога теряет накопленную базу"""
+    detector = Anomaly_Detector()
+    detector.configure({KEY: 5.0})
+    detector.evaluate(_records(_signal(50)))
+    assert KEY in detector.baselines
+    detector.configure({})
+    assert detector.baselines == {}
+    assert detector.select(_records([1.0])) == []
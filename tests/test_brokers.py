@@ -0,0 +1,83 @@
+# Тесты подключений к нескольким брокерам MQTT и их метрик (app/services/brokers.py)
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import brokers
+from app.services.brokers import Broker_Client, Broker_Manager, Broker_Settings, Broker_Stats, broker_label, \
+    DEFAULT_BROKER, LAG_ALPHA, RATE_WINDOW
+
+
+class Fake_Client:
+    """Подключение без сети: запоминает запуск и остановку."""
+
+    def __init__(self, settings, on_message, stats, client_id=''):
+        self.settings = settings
+        self.client_id = client_id
+        self.started = self.stopped = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(brokers, 'Broker_Client', Fake_Client)
+    manager = Broker_Manager()
+    manager.client_id = 'ingest'
+    return manager
+
+
+def test_stats_rate_lag_and_connections():
+    """Сообщений в секунду — за окно RATE_WINDOW, задержка сглаживается, обрывы считаются"""
+    stats = Broker_Stats('plant')
+    for index in range(1, 21):
+        stats.message(100, stats.window_start + index * RATE_WINDOW / 20)
+    assert stats.messages == 20 and stats.bytes == 2000
+    assert stats.rate == pytest.approx(20 / RATE_WINDOW)
+    stats.delivery_lag(1.0)
+    stats.delivery_lag(3.0)
+    assert stats.lag == pytest.approx(1.0 + LAG_ALPHA * 2.0)
+    stats.connection(False)
+    stats.connection(True)
+    stats.connection(False)
+    assert (stats.connects, stats.disconnects, stats.connected) == (1, 1, False)
+
+
+def test_configure_connects_reconnects_and_drops(manager):
+    """Новые брокеры подключаются, изменённые — переподключаются, удалённые — отключаются вместе с метриками"""
+    manager.configure({1: Broker_Settings(1, 'line1', 'h1'), 2: Broker_Settings(2, 'line2', 'h2')})
+    first, second = manager.client(1), manager.client(2)
+    assert first.started and second.started and first.client_id == 'ingest-1'
+
+    # Имя не влияет на подключение, хост — влияет
+    manager.configure({1: Broker_Settings(1, 'renamed', 'h1'), 2: Broker_Settings(2, 'line2', 'h2b')})
+    assert manager.client(1) is first and not first.stopped
+    assert manager.stats_for(1).name == 'renamed'
+    assert second.stopped and manager.client(2) is not second and manager.client(2).started
+
+    manager.configure({})
+    assert first.stopped and manager.clients == {}
+    assert list(manager.all_stats()) == [broker_label(DEFAULT_BROKER)]
+
+
+def test_client_resubscribes_after_reconnect():
+    """После переподключения клиент повторяет свои подписки; отказ брокера подключением не считается"""
+    stats = Broker_Stats('line1')
+    received = []
+    client = Broker_Client(Broker_Settings(5, 'line1', 'localhost'), lambda *args: received.append(args), stats)
+    client.filters = {'b/#', 'a/1'}
+    subscribed = []
+    network = SimpleNamespace(subscribe=lambda topic_filter, qos: subscribed.append(topic_filter))
+
+    client._handle_connect(network, None, {}, 5)
+    assert subscribed == [] and not stats.connected
+    client._handle_connect(network, None, {}, 0)
+    assert subscribed == ['a/1', 'b/#'] and stats.connected
+
+    client._handle_message(network, None, SimpleNamespace(topic='a/1', payload=b'{}'))
+    assert [(broker_id, topic, payload) for broker_id, topic, payload, _ in received] == [(5, 'a/1', b'{}')]
+    assert stats.messages == 1
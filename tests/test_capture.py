@@ -0,0 +1,73 @@
+# Тесты захвата событий с полным разрешением на приёме (app/services/capture.py)
+import time
+from datetime import datetime, timedelta
+
+from app.services.capture import Capture_Engine, Trigger, CAPTURES_TABLE, CAPTURE_CLOSE_GRACE, \
+    CONDITION_ABOVE, CONDITION_RATE
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+KEY = (1, 1)
+
+
+def _at(second, value, key=KEY):
+    return (T0 + timedelta(seconds=second), value) + key
+
+
+def _engine(*triggers, decimation=None):
+    engine = Capture_Engine()
+    engine.configure(list(triggers), decimation or {})
+    return engine
+
+
+def test_decimated_series_kept_in_full_around_trigger():
+    """Вне окна — каждый N-й отсчёт; pre секунд до срабатывания и post после — все отсчёты"""
+    engine = _engine(Trigger(7, KEY, KEY, CONDITION_ABOVE, 100.0, 3, 2), decimation={KEY: 10})
+    values = [0.0] * 20 + [150.0] + [0.0] * 10
+    kept, events = engine.apply([_at(second, value) for second, value in enumerate(values)])
+    # Отсчёты окна не идут в счётчик прореживания: за окном он продолжается с 20, и 23-я секунда сохраняется
+    assert [(t - T0).seconds for t, _, _, _ in sorted(kept)] == [0, 10, 17, 18, 19, 20, 21, 22, 23]
+    # Окно закрыл первый отсчёт после end_time
+    assert events == [(CAPTURES_TABLE, {
+        'trigger_id': 7, 'sensor_id': 1, 'parameter_id': 1, 'trigger_time': T0 + timedelta(seconds=20),
+        'start_time': T0 + timedelta(seconds=17), 'end_time': T0 + timedelta(seconds=22)})]
+    assert engine.captures == 1
+    assert engine.open == {} and engine.deadlines == {}
+
+
+def test_rate_of_other_series_triggers_target():
+    """Условие по скорости изменения другой серии открывает окно целевой серии; повтор продлевает окно"""
+    source = (2, 1)
+    engine = _engine(Trigger(1, KEY, source, CONDITION_RATE, 5.0, 0, 2))
+    engine.apply([_at(0, 0.0, source), _at(1, 1.0, source)])
+    assert engine.open == {}
+    engine.apply([_at(2, 10.0, source), _at(3, 30.0, source)])
+    assert engine.open[KEY]['trigger_time'] == T0 + timedelta(seconds=2)
+    assert engine.open[KEY]['end_time'] == T0 + timedelta(seconds=5)
+
+
+def test_quiet_series_capture_closed_by_clock():
+    """Серия замолчала после срабатывания: окно закрывается на флаше по часам, а не ждёт следующего отсчёта"""
+    engine = _engine(Trigger(1, KEY, KEY, CONDITION_ABOVE, 100.0, 0, 5))
+    engine.apply([_at(0, 150.0)])
+    assert engine.expire() == []
+    assert engine.expire(time.monotonic() + 5 + CAPTURE_CLOSE_GRACE - 1) == []
+    events = engine.expire(time.monotonic() + 5 + CAPTURE_CLOSE_GRACE + 1)
+    assert [row['trigger_time'] for _, row in events] == [T0]
+    assert engine.open == {} and engine.captures == 1
+    # Следующий отсчёт серии уже не закрывает окно повторно
+    assert engine.apply([_at(60, 0.0)]) == ([_at(60, 0.0)], [])
+
+
+def test_drain_saves_open_captures():
+    """При остановке приёма незакрытые окна сохраняются как есть"""
+    engine = _engine(Trigger(1, KEY, KEY, CONDITION_ABOVE, 100.0, 0, 60))
+    engine.apply([_at(0, 150.0), _at(1, 0.0)])
+    assert [row['end_time'] for _, row in engine.drain()] == [T0 + timedelta(seconds=60)]
+    assert engine.drain() == [] and engine.deadlines == {}
+
+
+def test_series_without_settings_pass_through():
+    """Без условий и прореживания записи не трогаются"""
+    records = [_at(0, 1.0), _at(1, 'abc', (3, 3))]
+    assert Capture_Engine().apply(records) == (records, [])
+    assert _engine(Trigger(1, KEY, KEY, CONDITION_ABOVE, 1.0, 0, 1)).apply(records[1:]) == (records[1:], [])
@@ -0,0 +1,80 @@
+# Тесты сжатия серий на приёме и восстановления по опорным точкам (app/services/compression.py)
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.compression import Series_Compressor, reconstruct_segments, COMPRESSION_DEADBAND, \
+    COMPRESSION_SWINGING_DOOR
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+KEY = (1, 2)
+
+
+def _signal(count=3000):
+    # Медленная синусоида с шумом: линейные участки хорошо сжимаются
+    rng = np.random.default_rng(0)
+    return 220.0 + 5.0 * np.sin(np.arange(count) / 300.0) + rng.normal(0.0, 0.05, count)
+
+
+def _compress(method, tolerance, values, max_interval=None):
+    compressor = Series_Compressor()
+    compressor.configure({KEY: (method, tolerance, max_interval)})
+    records = [(T0 + timedelta(seconds=i), float(v)) + KEY for i, v in enumerate(values)]
+    kept = []
+    for offset in range(0, len(records), 50):
+        kept.extend(compressor.apply(records[offset:offset + 50]))
+    away = compressor.compressed_away
+    kept.extend(compressor.drain())
+    return away, sorted(kept)
+
+
+@pytest.mark.parametrize('method, bound', [(COMPRESSION_DEADBAND, 2.0), (COMPRESSION_SWINGING_DOOR, 1.0)])
+def test_reconstruction_error_is_bounded(method, bound):
+    """Линейное восстановление отходит от исходной серии не дальше bound допусков"""
+    values = _signal()
+    away, kept = _compress(method, 0.5, values)
+    assert len(kept) < len(values) / 5
+    # Последняя точка удерживалась до drain — при остановке приёма она тоже записывается
+    assert away == len(values) - len(kept) + 1
+    seconds = [(t - T0).total_seconds() for t, _, _, _ in kept]
+    restored = np.interp(np.arange(len(values)), seconds, [v for _, v, _, _ in kept])
+    assert np.abs(restored - values).max() <= bound * 0.5 + 1e-9
+
+
+@pytest.mark.parametrize('method', [COMPRESSION_DEADBAND, COMPRESSION_SWINGING_DOOR])
+def test_max_interval_forces_points(method):
+    """На постоянном значении точка всё равно сохраняется не реже max_interval"""
+    _, kept = _compress(method, 0.5, np.full(100, 7.0), max_interval=10)
+    gaps = np.diff([(t - T0).total_seconds() for t, _, _, _ in kept])
+    assert gaps.max() <= 10
+    assert kept[-1][0] == T0 + timedelta(seconds=99)
+
+
+def test_other_series_and_non_numeric_pass_through():
+    """Серии без настроек и нечисловые значения идут без изменений"""
+    compressor = Series_Compressor()
+    compressor.configure({KEY: (COMPRESSION_DEADBAND, 1.0, None)})
+    records = [(T0, 1.0, 1, 1), (T0, None, 1, 2), (T0, 'abc', 1, 2)]
+    assert compressor.apply(records) == records
+
+
+def test_configure_releases_held_tail():
+    """Смена настроек серии отдаёт удержанную последнюю точку, чтобы хвост не потерялся"""
+    compressor = Series_Compressor()
+    compressor.configure({KEY: (COMPRESSION_DEADBAND, 1.0, None)})
+    kept = compressor.apply([(T0 + timedelta(seconds=i), 5.0) + KEY for i in range(5)])
+    assert kept == [(T0, 5.0) + KEY]
+    assert compressor.configure({KEY: (COMPRESSION_DEADBAND, 2.0, None)}) == [(T0 + timedelta(seconds=4), 5.0) + KEY]
+    assert compressor.configure({}) == []
+
+
+def test_reconstruct_segments_grid():
+    """Восстановление — равномерная сетка с шагом наименьшего интервала, не больше max_points точек"""
+    timestamps = [T0, T0 + timedelta(seconds=2), T0 + timedelta(seconds=10)]
+    x, y = reconstruct_segments(timestamps, [0.0, 2.0, 10.0])
+    assert x[0] == T0 and x[-1] == timestamps[-1] and len(x) == 6
+    assert y == pytest.approx([0.0, 2.0, 4.0, 6.0, 8.0, 10.0])
+    x, _ = reconstruct_segments(timestamps, [0.0, 2.0, 10.0], max_points=2)
+    assert len(x) == 3
+    assert reconstruct_segments([T0], [1]) == ([T0], [1.0])
@@ -0,0 +1,53 @@
+# Тесты окна недавних ключей для отсева повторных доставок (app/services/dedup.py)
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.dedup import Recent_Key_Window
+from app.services.record_block import Record_Block, uniform_times
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+
+
+def _records(count, sensor_id=1, parameter_id=1, start=0):
+    return [(T0 + timedelta(seconds=start + i), float(i), sensor_id, parameter_id) for i in range(count)]
+
+
+def test_drops_repeated_deliveries():
+    """Повтор сообщения отсеивается, та же метка другой серии — нет"""
+    window = Recent_Key_Window()
+    assert window.filter_records(_records(3)) == _records(3)
+    assert window.filter_records(_records(3) + _records(1, parameter_id=2)) == _records(1, parameter_id=2)
+    assert window.duplicates == 3
+
+
+def test_window_is_bounded_per_series():
+    """На серию помнится не больше size меток: старые вытесняются, память не растёт"""
+    window = Recent_Key_Window(size=4)
+    window.filter_records(_records(10))
+    keys, order = window.series[(1, 1)]
+    assert len(keys) == len(order) == 4
+    # Вытесненная метка снова проходит — её отсеет уникальный ключ в БД
+    assert window.filter_records(_records(1)) == _records(1)
+    assert window.filter_records(_records(1, start=9)) == []
+
+
+def test_disabled_window_passes_everything():
+    """size <= 0 — окно выключено"""
+    window = Recent_Key_Window(size=0)
+    assert window.filter_records(_records(2) + _records(2)) == _records(2) + _records(2)
+    assert window.duplicates == 0
+
+
+def test_frames_and_blocks_by_start_time():
+    """Кадры и блоки узнаются по метке первого отсчёта; повтор блока считает все его отсчёты"""
+    window = Recent_Key_Window()
+    frame = (T0, 100.0, np.zeros(4), 1, 3)
+    assert window.filter_frames([frame]) == [frame]
+    assert window.filter_frames([frame]) == []
+
+    block = Record_Block(uniform_times(T0, 1000, range(5)), np.arange(5.0), 1, 4)
+    later = Record_Block(uniform_times(T0, 1000, range(5, 10)), np.arange(5.0), 1, 4)
+    assert window.filter_blocks([block]) == [block]
+    assert window.filter_blocks([block, later]) == [later]
+    assert window.duplicates == 1 + 5
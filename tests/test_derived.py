@@ -0,0 +1,84 @@
+# Тесты производных параметров, вычисляемых на приёме (app/services/derived.py)
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.derived import Derived_Definition, Derived_Engine, compile_expression
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+CURRENT, VOLTAGE, POWER = (1, 1), (2, 1), (1, 9)
+
+
+def _power(expression='current * voltage'):
+    return Derived_Definition(1, POWER, expression, [
+        {'name': 'current', 'sensor_id': CURRENT[0], 'parameter_id': CURRENT[1]},
+        {'name': 'voltage', 'sensor_id': VOLTAGE[0], 'parameter_id': VOLTAGE[1]},
+    ])
+
+
+def _at(second, value, key):
+    return (T0 + timedelta(seconds=second), value) + key
+
+
+@pytest.mark.parametrize('expression', [
+    'current.real',                 # Атрибуты
+    '__import__("os")',             # Вызов не из списка
+    'open',                         # Неизвестное имя
+    '[current]',                    # Списки и прочие узлы
+    'current *',                    # Синтаксис
+    'current * 9**9**9',            # Показатель — выражение: вычисление не закончится
+    'current ** current',           # Показатель — не константа
+    'current ** 100',               # Показатель больше MAX_EXPONENT
+])
+def test_compile_rejects_unsafe_expressions(expression):
+    """В выражении допустимы только арифметика, сравнения, имена входов и функции из списка"""
+    with pytest.raises(ValueError):
+        compile_expression(expression, ['current'])
+
+
+def test_compile_accepts_allowed_functions():
+    """Функции NumPy из списка и сравнения компилируются"""
+    compile_expression('where(current > 0, sqrt(current) * pi, -abs(current))', ['current'])
+
+
+def test_power_with_constant_exponent():
+    """Степень с небольшим постоянным показателем вычисляется; переполнение — ошибка выражения, а не зависание"""
+    engine = Derived_Engine()
+    current = [{'name': 'current', 'sensor_id': CURRENT[0], 'parameter_id': CURRENT[1]}]
+    engine.configure([Derived_Definition(2, (1, 10), 'current ** 2 + current ** -1', current),
+                      Derived_Definition(3, POWER, 'current * ((9 ** 16) ** 16) ** 16', current)])
+    assert engine.evaluate([_at(1, 2.0, CURRENT)]) == [_at(1, 4.5, (1, 10))]
+    assert engine.errors == 1
+
+
+def test_inputs_joined_as_of_first_input_times():
+    """Моменты выхода — у первого входа, остальные входы — последнее известное значение, в том числе из прошлой пачки"""
+    engine = Derived_Engine()
+    engine.configure([_power()])
+    engine.collect([_at(0, 230.0, VOLTAGE), _at(5, 9.0, (3, 3))])
+    assert engine.take() == [_at(0, 230.0, VOLTAGE)]
+    # Тока ещё нет — вычислять нечего, но напряжение запомнено
+    assert engine.evaluate([_at(0, 230.0, VOLTAGE)]) == []
+
+    batch = [_at(1, 2.0, CURRENT), _at(2, 3.0, CURRENT), _at(2, 240.0, VOLTAGE), _at(3, 1.0, CURRENT)]
+    assert engine.evaluate(batch) == [_at(1, 460.0, POWER), _at(2, 720.0, POWER), _at(3, 240.0, POWER)]
+    assert engine.derived_records == 3
+
+
+def test_unknown_inputs_and_non_finite_results_are_skipped():
+    """Моменты, на которые вход ещё неизвестен, и нечисловые результаты не записываются"""
+    engine = Derived_Engine()
+    engine.configure([_power('current / voltage')])
+    batch = [_at(1, 2.0, CURRENT), _at(2, 0.0, VOLTAGE), _at(3, 3.0, CURRENT), _at(4, 4.0, VOLTAGE),
+             _at(5, 8.0, CURRENT), _at(6, 'abc', CURRENT)]
+    assert engine.evaluate(batch) == [_at(5, 2.0, POWER)]
+
+
+def test_failing_definition_does_not_stop_others():
+    """Ошибка одного выражения считается, остальные вычисляются"""
+    engine = Derived_Engine()
+    current = [{'name': 'current', 'sensor_id': CURRENT[0], 'parameter_id': CURRENT[1]}]
+    engine.configure([Derived_Definition(2, (1, 10), 'arctan2(current)', current),
+                      Derived_Definition(3, POWER, 'current * 2', current)])
+    assert engine.evaluate([_at(1, 2.0, CURRENT)]) == [_at(1, 4.0, POWER)]
+    assert engine.errors == 1
@@ -0,0 +1,19 @@
+# Тесты приёма пачек с граничных узлов (app/api/edge.py)
+
+
+def test_edge_ingest_disabled_without_token(app, client):
+    """Без EDGE_INGEST_TOKEN центр не принимает пачки и не отдаёт курсоры"""
+    app.config['EDGE_INGEST_TOKEN'] = None
+    response = client.post('/api/edge/batches', json={'node_id': 'n1', 'stream': 'sensor_records'})
+    assert response.status_code == 403
+    assert client.get('/api/edge/cursors/n1').status_code == 403
+
+
+def test_edge_ingest_checks_token(app, client):
+    """С заданным токеном запрос без него или с чужим отвергается"""
+    app.config['EDGE_INGEST_TOKEN'] = 'secret'
+    assert client.get('/api/edge/cursors/n1').status_code == 401
+    assert client.get('/api/edge/cursors/n1', headers={'X-Edge-Token': 'wrong'}).status_code == 401
+    response = client.get('/api/edge/cursors/n1', headers={'X-Edge-Token': 'secret'})
+    assert response.status_code == 200
+    assert response.json == {}
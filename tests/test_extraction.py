@@ -0,0 +1,116 @@
+# Тесты разбора сообщений MQTT в записи (app/services/extraction.py)
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services import extraction
+from app.services.codecs import encode_float_frame
+from app.services.extraction import Extraction_Plan, Timestamp_Parser, decode_batch, record_value, \
+    TIMESTAMP_FORMAT
+
+TIMESTAMP = '2024-12-12-10:00:00'
+
+
+def test_record_value_coercion():
+    """Значение записи приводится к float; объекты и нечисловые строки отвергаются"""
+    assert record_value(3) == 3.0
+    assert record_value('2.5') == 2.5
+    assert record_value(True) == 1.0
+    assert record_value(None) is None
+    with pytest.raises(TypeError):
+        record_value({'a': 1})
+    with pytest.raises(ValueError):
+        record_value('warm')
+
+
+def test_extract_rejects_poison_values():
+    """Ключ с нечисловым значением попадает в неверные ключи, а не в записи"""
+    plan = Extraction_Plan(1, [('temp', 1), ('state', 2), ('flag', 3), ('note', 4), ('samples', 5)])
+    payload = {'device': {'timestamp': TIMESTAMP}, 'temp': '21.5', 'state': {'on': 1}, 'flag': True,
+               'note': 'warm', 'samples': [1, 2]}
+    records, blocks, frames, invalid = plan.extract(payload)
+    assert records == [(datetime(2024, 12, 12, 10), 21.5, 1, 1), (datetime(2024, 12, 12, 10), 1.0, 1, 3)]
+    assert blocks == []
+    # Массив без меток времени пакетного формата тоже не сохранить
+    assert invalid == ['state', 'note', 'samples']
+    assert frames == []
+
+
+def test_extract_batch_rejects_non_numeric_samples():
+    """Пакет с нечисловым отсчётом отвергается целиком по ключу"""
+    plan = Extraction_Plan(1, [('a', 1), ('b', 2)])
+    payload = {'device': {'t0': 1700000000000, 'dt': 10}, 'a': [1, 2, 3], 'b': [1, 'x', 3]}
+    records, blocks, _, invalid = plan.extract(payload)
+    assert records == [] and len(blocks) == 1
+    assert blocks[0].values.dtype == np.float64 and blocks[0].values.tolist() == [1.0, 2.0, 3.0]
+    assert invalid == ['b']
+
+
+@pytest.mark.parametrize('value', ['2024-12-12-10:00:00', '1999-01-31-23:59:59', '2024-02-29-00:00:01'])
+def test_timestamp_parser_matches_strptime(value):
+    """Быстрый путь даёт то же, что strptime, и запоминает последнюю строку"""
+    parse = Timestamp_Parser()
+    assert parse(value) == datetime.strptime(value, TIMESTAMP_FORMAT)
+    assert parse.last == (value, datetime.strptime(value, TIMESTAMP_FORMAT))
+
+
+@pytest.mark.parametrize('value', [
+    '2024/12/12-10:00:00',  # Чужие разделители той же длины
+    '2024-12-12T10:00:00',
+    '2024-12-12-10-00-00',
+    '2024-12-12- 1:00:00',  # int принял бы пробел, знак и подчёркивание
+    '2024-12-12-+1:00:00',
+    '2024-12-1_-10:00:00',
+    '2024-13-12-10:00:00',  # Поля вне диапазона
+    '2024-12-12 10:00:0',
+])
+def test_timestamp_parser_rejects_what_strptime_rejects(value):
+    """Строка не того формата не проходит быстрым путём — как и strptime, она отвергается"""
+    with pytest.raises(ValueError):
+        datetime.strptime(value, TIMESTAMP_FORMAT)
+    with pytest.raises(ValueError):
+        Timestamp_Parser()(value)
+
+
+def test_extract_batch_clock():
+    """Пакет с t0/dt и пакет с явными метками дают отсчёты с временем каждого, в наивном UTC"""
+    plan = Extraction_Plan(1, [('a', 1), ('b[1:]', 2)])
+    _, blocks, _, _ = plan.extract({'device': {'t0': 1700000000000, 'dt': 250}, 'a': [1, 2, 3], 'b': [7, 8, 9]})
+    start = datetime(2023, 11, 14, 22, 13, 20)
+    assert blocks[0].records() == \
+        [(start, 1.0, 1, 1), (start + timedelta(milliseconds=250), 2.0, 1, 1),
+         (start + timedelta(milliseconds=500), 3.0, 1, 1)]
+    # Срез сдвигает метки на номер первого отсчёта
+    assert [timestamp for timestamp, _, _, _ in blocks[1].records()] == \
+        [start + timedelta(milliseconds=250), start + timedelta(milliseconds=500)]
+
+    records, blocks, _, _ = plan.extract({'device': {'timestamps': [1700000000, 1700000005], 'time_unit': 's'},
+                                          'a': [4, 5]})
+    assert blocks == []
+    assert [(timestamp, value) for timestamp, value, _, _ in records] == \
+        [(start, 4.0), (start + timedelta(seconds=5), 5.0)]
+
+
+def test_process_plan_cache_is_bounded(monkeypatch):
+    """Кэш планов процесса-декодера не растёт без предела при смене настроек датчиков"""
+    monkeypatch.setattr(extraction, 'PROCESS_PLAN_CACHE', 4)
+    monkeypatch.setattr(extraction, '_process_plans', {})
+    payload = json.dumps({'device': {'timestamp': TIMESTAMP}, 'a': 1}).encode()
+    for parameter_id in range(1, 11):
+        records, _, _, _, errors = decode_batch([(1, (('a', parameter_id),), 'json', payload)])
+        assert records == [(datetime(2024, 12, 12, 10), 1.0, 1, parameter_id)] and errors == 0
+        assert len(extraction._process_plans) <= 4
+
+
+def test_float_frame_stays_an_array():
+    """Каналы float_frame доходят до блока видом на буфер сообщения, без списка отсчётов"""
+    samples = np.linspace(0.0, 1.0, 8)
+    plan = Extraction_Plan(1, [('channels[0]', 1)], 'float_frame')
+    payload = plan.decode(encode_float_frame([samples], 1700000000000000, 1000.0, 'float64'))
+    _, blocks, _, invalid = plan.extract(payload)
+    assert invalid == [] and len(blocks) == 1
+    assert np.shares_memory(blocks[0].values, payload['channels'][0])
+    assert blocks[0].values.tolist() == samples.tolist()
+    assert (blocks[0].times[1] - blocks[0].times[0]) == np.timedelta64(1000, 'us')
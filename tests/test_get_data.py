@@ -0,0 +1,111 @@
+# Тесты чтения серий для графиков (app/core/block_processor.py)
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.core.block_processor import get_data, get_waveform, feeds_charts_only, source_points
+from app.models.sensor_parameter import Sensor_parameter
+from app.models.sensor_record import Sensor_Record
+from app.services.record_writer import write_frames, write_records
+from app.services.rollups import rollup_manager
+
+T0 = datetime(2024, 12, 12, 10, 0, 0)
+MOSCOW = timezone(timedelta(hours=3))
+
+
+# Сжатая (deadband) серия: опорные точки на 0, 1, 5, 6 и 10 секунде
+@pytest.fixture
+def compressed_series(app, db):
+    db.session.add(Sensor_parameter(sensor_id=1, parameter_id=1, key='temp', compression='deadband',
+                                    compression_tolerance=0.5))
+    for seconds, value in ((0, 0.0), (1, 1.0), (5, 5.0), (6, 5.0), (10, 0.0)):
+        db.session.add(Sensor_Record(timestamp=T0 + timedelta(seconds=seconds), value=value,
+                                     sensor_id=1, parameter_id=1))
+    db.session.commit()
+
+
+def test_get_data_compressed_full(compressed_series):
+    """Полная сжатая серия восстанавливается на сетку с шагом наименьшего интервала"""
+    timestamps, values = get_data(1, 1)
+    assert timestamps[0] == T0
+    assert timestamps[-1] == T0 + timedelta(seconds=10)
+    assert len(timestamps) == 11
+    assert values[3] == pytest.approx(3.0)
+
+
+def test_get_data_compressed_incremental_aware(compressed_series):
+    """Инкрементальный опрос с last_update с поясом (как его передаёт /apply) возвращает только новые точки"""
+    last_update = (T0 + timedelta(seconds=5)).replace(tzinfo=timezone.utc).astimezone(MOSCOW)
+    timestamps, values = get_data(1, 1, last_update)
+    assert timestamps == [T0 + timedelta(seconds=s) for s in range(6, 11)]
+    assert values == pytest.approx([5.0, 3.75, 2.5, 1.25, 0.0])
+
+
+def test_get_data_compressed_incremental_naive(compressed_series):
+    """Наивный last_update (UTC) даёт тот же результат"""
+    timestamps, _ = get_data(1, 1, T0 + timedelta(seconds=5))
+    assert timestamps == [T0 + timedelta(seconds=s) for s in range(6, 11)]
+
+
+# Серия 2 Гц на 25 минут: 3000 записей, больше бюджета по умолчанию
+@pytest.fixture
+def long_series(app, db):
+    rollup_manager.configure(enabled=True, point_budget=2000)
+    write_records([(T0 + timedelta(milliseconds=500 * i), float(i), 1, 1) for i in range(3000)])
+    db.session.commit()
+
+
+def test_get_data_budget_only_when_given(long_series):
+    """Без points get_data отдаёт все записи; агрегаты — только при заданном бюджете"""
+    assert len(get_data(1, 1)[0]) == 3000
+    assert len(get_data(1, 1, points=0)[0]) == 3000
+    assert len(get_data(1, 1, points=2000)[0]) == 1500
+
+
+def test_source_budget_only_for_charts(app):
+    """Бюджет по умолчанию — только у источника одних графиков; функциям нужны исходные отсчёты"""
+    rollup_manager.configure(enabled=True, point_budget=2000)
+    config = {
+        'blocks': {'plot': {'type': 'dataSource'}, 'fft': {'type': 'dataSource'}, 'lonely': {'type': 'dataSource'},
+                   'chart': {'type': 'chart'}, 'spectrum': {'type': 'function'}},
+        'connections': [{'source': 'plot', 'target': 'chart'}, {'source': 'fft', 'target': 'chart'},
+                        {'source': 'fft', 'target': 'spectrum'}, {'source': 'spectrum', 'target': 'chart'}],
+    }
+    assert [feeds_charts_only(config, block) for block in ('plot', 'fft', 'lonely')] == [True, False, False]
+    assert source_points({}, True) == 2000
+    assert source_points({}, False) is None
+    # Заданный в блоке бюджет действует всегда
+    assert source_points({'points': '300'}, False) == 300
+    assert source_points({'points': 0}, True) == 0
+
+
+def test_raw_data_points_skip_rollups_of_compressed_series(app, db, client, access_token):
+    """raw_data с points отдаёт сжатую серию записями: в её агрегатах только опорные точки"""
+    rollup_manager.configure(enabled=True)
+    db.session.add(Sensor_parameter(sensor_id=1, parameter_id=1, key='temp', compression='deadband',
+                                    compression_tolerance=0.5))
+    write_records([(T0 + timedelta(seconds=seconds), value, 1, 1)
+                   for seconds, value in ((0, 0.0), (1, 1.0), (5, 5.0), (6, 5.0), (10, 0.0))])
+    write_records([(T0 + timedelta(seconds=seconds), 1.0, 1, 2) for seconds in range(10)])
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {access_token}'}
+    response = client.get('/api/sensor_records/raw_data/1?parameter=1&points=2', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == [0.0, 1.0, 5.0, 5.0, 0.0]
+    # Несжатая серия по-прежнему читается из агрегатов
+    response = client.get('/api/sensor_records/raw_data/1?parameter=2&points=2', headers=headers)
+    assert response.get_json() == [1.0]
+
+
+def test_get_waveform_incremental_offsets_from_series_start(app, db):
+    """Новые кадры отсчитываются от начала серии и продолжают ось x полного чтения"""
+    write_frames([(T0 + timedelta(seconds=second), 4.0, np.arange(4, dtype=np.float32) + second, 1, 1)
+                  for second in range(3)])
+    db.session.commit()
+    x_full, y_full, rate = get_waveform(1, 1)
+    x_new, y_new, _ = get_waveform(1, 1, (T0 + timedelta(seconds=1)).replace(tzinfo=timezone.utc))
+    assert rate == 4.0
+    assert list(x_full[-4:]) == [2.0, 2.25, 2.5, 2.75]
+    assert list(x_new) == list(x_full[-4:])
+    assert list(y_new) == list(y_full[-4:])
@@ -0,0 +1,89 @@
+# Тесты конвейера приёма: очередь сырых сообщений, декодеры-потоки и процессы (app/services/ingest_pipeline.py)
+import json
+from datetime import datetime
+from threading import Lock
+
+import pytest
+
+from app.services import ingest_pipeline
+from app.services.extraction import Extraction_Plan
+from app.services.ingest_pipeline import Ingest_Pipeline
+
+PLAN = Extraction_Plan(1, [('a', 1)])
+
+
+def _payload(value):
+    return json.dumps({'device': {'timestamp': '2024-12-12-10:00:00'}, 'a': value}).encode()
+
+
+def _resolve(topic, broker_id=None):
+    return (1, PLAN) if topic == 'sensor/1' else (None, None)
+
+
+def test_unknown_mode_rejected():
+    """Неизвестный режим декодеров — ошибка настройки, а не молчаливый режим по умолчанию"""
+    with pytest.raises(ValueError):
+        Ingest_Pipeline(handle=None, resolve=None, sink=None, mode='fork')
+
+
+def test_thread_mode_drains_queue_on_stop():
+    """Потоки-декодеры разбирают все сообщения, принятые до остановки; неудачные считаются"""
+    handled = []
+    lock = Lock()
+
+    def handle(topic, payload, received_at, broker_id):
+        with lock:
+            handled.append((topic, payload, received_at, broker_id))
+        return payload != b'bad'
+
+    pipeline = Ingest_Pipeline(handle=handle, resolve=None, sink=None, workers=3)
+    pipeline.start()
+    for index in range(50):
+        pipeline.submit('sensor/1', b'%d' % index, float(index), broker_id=2)
+    pipeline.submit('sensor/1', b'bad', 99.0)
+    pipeline.stop()
+    assert len(handled) == 51 and pipeline.threads == []
+    assert sorted(received for _, _, received, _ in handled) == [float(i) for i in range(50)] + [99.0]
+    assert pipeline.decode_errors == 1
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    """Переполненная очередь не держит поток сети дольше INGEST_PUT_TIMEOUT — сообщение отбрасывается"""
+    monkeypatch.setattr(ingest_pipeline, 'INGEST_PUT_TIMEOUT', 0.01)
+    pipeline = Ingest_Pipeline(handle=None, resolve=None, sink=None, queue_size=2)
+    for _ in range(5):
+        pipeline.submit('sensor/1', b'{}')
+    assert pipeline.dropped == 3
+    assert pipeline.stats()['raw_queue_depth'] == 2
+
+
+def test_next_batch_keeps_stop_signal():
+    """Пачка для процесса собирается до сигнала остановки, сам сигнал остаётся в очереди"""
+    pipeline = Ingest_Pipeline(handle=None, resolve=None, sink=None, mode='process')
+    for index in range(3):
+        pipeline.submit('sensor/1', b'{}', float(index))
+    pipeline.queue.put(None)
+    assert [item[2] for item in pipeline._next_batch()] == [0.0, 1.0, 2.0]
+    assert pipeline._next_batch() is None
+
+
+def test_process_mode_decodes_in_worker_processes():
+    """Режим process: план топика находится в диспетчере, разбор — в пуле процессов, результат — в sink"""
+    sunk = []
+    lock = Lock()
+
+    def sink(records, blocks, frames, received):
+        with lock:
+            sunk.append((records, received))
+
+    pipeline = Ingest_Pipeline(handle=None, resolve=_resolve, sink=sink, workers=2, mode='process')
+    pipeline.start()
+    pipeline.submit('sensor/1', _payload(1.5), 10.0)
+    pipeline.submit('unknown/topic', _payload(2.5), 11.0)
+    pipeline.submit('sensor/1', b'not json', 12.0)
+    pipeline.stop()
+    records = [record for batch, _ in sunk for record in batch]
+    assert records == [(datetime(2024, 12, 12, 10, 0, 0), 1.5, 1, 1)]
+    # Время приёма — только у сообщений, для которых нашёлся датчик
+    assert sorted(received for _, batch in sunk for received in batch) == [10.0, 12.0]
+    assert pipeline.decode_errors == 1 and pipeline.in_flight_count == 0
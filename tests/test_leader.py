@@ -0,0 +1,126 @@
+# Тесты блокировки лидера приёма и резервных процессов (app/services/leader.py, app/ingest.py)
+import os
+import signal
+from threading import Event
+from types import SimpleNamespace
+
+import pytest
+
+from app import ingest
+from app.services.leader import File_Leader_Lock, Db_Leader_Lock, make_leader_lock
+
+
+class Fake_Lock:
+    """Блокировка по сценарию: acquire и check возвращают значения из списков по очереди."""
+
+    def __init__(self, acquire=(True,), check=(True,)):
+        self.results = list(acquire)
+        self.checks = list(check)
+        self.released = False
+
+    def acquire(self):
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def check(self):
+        return self.checks.pop(0) if len(self.checks) > 1 else self.checks[0]
+
+    def release(self):
+        self.released = True
+
+    def describe(self):
+        return "fake lock"
+
+
+def _app(**config):
+    return SimpleNamespace(config=config, instance_path='/tmp/instance')
+
+
+def test_file_lock_has_single_holder(tmp_path):
+    """Файл держит один процесс; после release блокировку берёт резервный"""
+    path = str(tmp_path / 'lock' / 'ingest.lock')
+    leader, standby = File_Leader_Lock(path), File_Leader_Lock(path)
+    assert leader.acquire() and leader.acquire()
+    assert not standby.acquire() and not standby.check()
+    with open(path) as file:
+        assert file.read() == f"{os.getpid()}\n"
+    leader.release()
+    assert not leader.check()
+    assert standby.acquire() and standby.check()
+    standby.release()
+
+
+@pytest.mark.parametrize('config, expected', [
+    ({'INGEST_LEADER_LOCK': 'none'}, type(None)),
+    ({'INGEST_LEADER_LOCK': 'auto', 'SQLALCHEMY_DATABASE_URI': 'sqlite://'}, File_Leader_Lock),
+    ({'INGEST_LEADER_LOCK': 'auto', 'SQLALCHEMY_DATABASE_URI': 'postgresql://db/cv'}, Db_Leader_Lock),
+    ({'INGEST_LEADER_LOCK': 'file'}, File_Leader_Lock),
+])
+def test_make_leader_lock(config, expected):
+    """Вид блокировки: auto — advisory-блокировка для PostgreSQL, иначе файл"""
+    assert isinstance(make_leader_lock(_app(**config)), expected)
+
+
+def test_make_leader_lock_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        make_leader_lock(_app(INGEST_LEADER_LOCK='redis'))
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URI', '').startswith('postgresql'),
+                    reason="advisory-блокировка есть только в PostgreSQL (TEST_DATABASE_URI)")
+def test_db_lock_has_single_holder(app):
+    """Advisory-блокировка держится одним соединением; после release её берёт резервный процесс"""
+    leader, standby = Db_Leader_Lock(app), Db_Leader_Lock(app)
+    try:
+        assert leader.acquire() and leader.check()
+        assert not standby.acquire() and not standby.check()
+        leader.release()
+        assert standby.acquire()
+    finally:
+        leader.release()
+        standby.release()
+
+
+def test_standby_waits_until_lock_is_free():
+    """Резервный процесс повторяет попытки, в том числе после ошибок блокировки"""
+    lock = Fake_Lock(acquire=[False, RuntimeError("database is down"), False, True])
+    assert ingest._wait_for_leadership(lock, Event(), 0)
+    stopped = Event()
+    stopped.set()
+    assert not ingest._wait_for_leadership(Fake_Lock(acquire=[False]), stopped, 0)
+
+
+@pytest.fixture
+def started(monkeypatch):
+    # Приём без брокеров: только отмечаем запуск и остановку
+    calls = []
+    monkeypatch.setattr(ingest.mqtt_service, 'init_app', lambda app: calls.append('init'))
+    monkeypatch.setattr(ingest.mqtt_service, 'shutdown', lambda: calls.append('shutdown'))
+    monkeypatch.setattr(signal, 'signal', lambda *args: None)
+    return calls
+
+
+def test_run_ingest_stops_when_lock_lost(monkeypatch, started):
+    """Потеря блокировки лидера останавливает приём с кодом 1 — перезапуск за супервизором"""
+    lock = Fake_Lock(check=[True, False])
+    monkeypatch.setattr(ingest, 'make_leader_lock', lambda app: lock)
+    assert ingest.run_ingest(_app(INGEST_LEADER_RETRY=0.01)) == 1
+    assert started == ['init', 'shutdown'] and lock.released
+
+
+def test_sharded_ingest_needs_no_leader(monkeypatch, started):
+    """В шардированном режиме процессов приёма несколько по замыслу: блокировка не берётся"""
+    monkeypatch.setattr(ingest, 'make_leader_lock', lambda app: pytest.fail("leader lock in sharded mode"))
+    ingest.start_ingest(_app(INGEST_SHARD_MODE='hash'))
+    assert started == ['init']
+
+
+def test_background_ingest_takes_over_from_leader(monkeypatch, started):
+    """Веб-процесс без блокировки ждёт в резерве и запускает приём, когда лидер уходит"""
+    monkeypatch.setattr(ingest, 'make_leader_lock', lambda app: Fake_Lock(acquire=[False, False, True]))
+    initialized = Event()
+    monkeypatch.setattr(ingest.mqtt_service, 'init_app', lambda app: initialized.set())
+    ingest.start_ingest(_app(INGEST_LEADER_RETRY=0.01))
+    assert initialized.wait(5)
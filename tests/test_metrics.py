@@ -0,0 +1,68 @@
+# Тесты метрик процесса в текстовом формате Prometheus (app/services/metrics.py)
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app.services.metrics import Metrics_Registry, CONTENT_TYPE, metrics, start_http_server
+
+
+def test_counter_exposition_and_escaping():
+    """Счётчик без меток виден сразу с нулём; значения меток экранируются"""
+    registry = Metrics_Registry()
+    registry.counter('cv_failures_total', 'Failures')
+    messages = registry.counter('cv_messages_total', 'Messages', ('broker', 'topic'))
+    messages.inc('default', 'plant/"a"\\b')
+    messages.inc('default', 'plant/"a"\\b', value=2)
+    assert registry.render() == (
+        '# HELP cv_failures_total Failures\n'
+        '# TYPE cv_failures_total counter\n'
+        'cv_failures_total 0\n'
+        '# HELP cv_messages_total Messages\n'
+        '# TYPE cv_messages_total counter\n'
+        'cv_messages_total{broker="default",topic="plant/\\"a\\"\\\\b"} 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    """Корзины накопительные, граница le включительно; observe_many раскладывает так же, как observe"""
+    registry = Metrics_Registry()
+    one, many = registry.histogram('cv_one', 'One', (0.1, 1.0)), registry.histogram('cv_many', 'Many', (0.1, 1.0))
+    values = [0.05, 0.1, 0.5, 1.0, 3.0]
+    for value in values:
+        one.observe(value)
+    many.observe_many(values)
+    many.observe_many([])
+    assert one.samples() == [('cv_one_bucket', {'le': '0.1'}, 2), ('cv_one_bucket', {'le': '1.0'}, 4),
+                             ('cv_one_bucket', {'le': '+Inf'}, 5), ('cv_one_sum', {}, pytest.approx(4.65)),
+                             ('cv_one_count', {}, 5)]
+    assert [value for _, _, value in many.samples()] == [value for _, _, value in one.samples()]
+    assert 'cv_one_bucket{le="+Inf"} 5\n' in registry.render()
+
+
+def test_collectors_snapshot_state_and_failures_are_skipped():
+    """Сборщик снимает состояние при опросе; упавший сборщик не ломает остальной ответ"""
+    registry = Metrics_Registry()
+    registry.collector(lambda: [('cv_queue_depth', 'gauge', 'Queue depth', [({'queue': 'raw'}, 7), ({}, None)])])
+    registry.collector(lambda: 1 / 0)
+    assert registry.render() == (
+        '# HELP cv_queue_depth Queue depth\n'
+        '# TYPE cv_queue_depth gauge\n'
+        'cv_queue_depth{queue="raw"} 7\n'
+        'cv_queue_depth NaN\n'
+    )
+
+
+def test_http_server_serves_metrics_only():
+    """Сервер процесса приёма отдаёт /metrics в формате 0.0.4, остальные пути — 404"""
+    server = start_http_server(0, '127.0.0.1')
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            assert response.read().decode('utf-8') == metrics.render()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/other")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
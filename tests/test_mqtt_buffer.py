@@ -0,0 +1,115 @@
+# Тесты двойного буфера приёма и потока-флашера (app/services/mqtt_service.py)
+import time
+from datetime import datetime, timedelta
+from threading import Event, Thread
+
+import pytest
+
+from app.models.sensor_record import Sensor_Record
+from app.services import mqtt_service
+from app.services.mqtt_service import MQTT_Buffer, BUFFER_MIN_BATCH, BUFFER_MAX_BATCH, \
+    BUFFER_TARGET_COMMIT_LATENCY
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+
+
+def _records(count, start=0, parameter_id=1):
+    return [(T0 + timedelta(seconds=start + i), float(i), 1, parameter_id) for i in range(count)]
+
+
+@pytest.fixture
+def buffer(app, db, monkeypatch):
+    # Флашер пишет в БД в контексте приложения модуля приёма
+    monkeypatch.setattr(mqtt_service, 'app', app)
+    return MQTT_Buffer()
+
+
+def _stored():
+    return sorted((r.timestamp, r.value, r.sensor_id, r.parameter_id) for r in Sensor_Record.query.all())
+
+
+def test_swap_detaches_buffer(buffer):
+    """Подмена отдаёт накопленное и оставляет пустой буфер для новых сообщений"""
+    buffer.add_to_buffer('a', _records(3), received=[1.0])
+    buffer.add_to_buffer('b', _records(2, parameter_id=2))
+    (records, frames, events, blocks), received = buffer._swap()
+    assert sorted(records) == sorted(_records(3) + _records(2, parameter_id=2))
+    assert (frames, events, blocks, received) == ([], [], [], [1.0])
+    assert buffer.size == 0 and not buffer.buffer and buffer.received == []
+
+
+def test_intake_not_blocked_by_commit(buffer, monkeypatch):
+    """Пока флашер пишет пачку в БД, приём дописывает уже новый буфер и не ждёт commit"""
+    writing, release = Event(), Event()
+    written = []
+
+    def slow_write(records, frames=(), events=(), blocks=()):
+        writing.set()
+        release.wait(5)
+        written.append(list(records))
+
+    monkeypatch.setattr(buffer, '_write_batch', slow_write)
+    buffer.add_to_buffer(None, _records(3))
+    flusher = Thread(target=buffer.flush_buffer)
+    flusher.start()
+    assert writing.wait(5)
+    started = time.monotonic()
+    buffer.add_to_buffer(None, _records(2, start=10))
+    assert time.monotonic() - started < 1.0
+    release.set()
+    flusher.join(5)
+    assert written == [_records(3)]
+    assert buffer.buffer[None] == _records(2, start=10) and buffer.size == 2
+
+
+def test_failed_write_restores_batch_in_order(buffer, monkeypatch):
+    """Без журнала неудачная пачка возвращается в начало буфера, перед пришедшими позже"""
+    def failing_write(records, frames=(), events=(), blocks=()):
+        buffer.add_to_buffer(None, _records(1, start=10), received=[2.0])
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(buffer, '_write_batch', failing_write)
+    buffer.add_to_buffer(None, _records(2), received=[1.0])
+    assert buffer.flush_buffer() is False
+    assert buffer.buffer[None] == _records(2) + _records(1, start=10)
+    assert buffer.size == 3
+    assert buffer.received == [1.0, 2.0]
+
+
+@pytest.mark.parametrize('batch_size, latency, count, expected', [
+    (1000, 0.01, 1000, 2000),                              # Полная быстрая пачка — растём
+    (1000, 0.01, 10, 1000),                                # Флаш по таймеру о пределе ничего не говорит
+    (1000, BUFFER_TARGET_COMMIT_LATENCY * 2, 1000, 500),   # Медленный commit — уменьшаем
+    (BUFFER_MAX_BATCH, 0.01, BUFFER_MAX_BATCH, BUFFER_MAX_BATCH),
+    (BUFFER_MIN_BATCH, 10.0, 10, BUFFER_MIN_BATCH),
+])
+def test_adaptive_batch_size(batch_size, latency, count, expected):
+    """Размер пачки подстраивается под время commit в пределах BUFFER_MIN_BATCH..BUFFER_MAX_BATCH"""
+    buffer = MQTT_Buffer()
+    buffer.batch_size = batch_size
+    buffer._adapt_batch_size(latency, count)
+    assert buffer.batch_size == expected
+
+
+def test_full_batch_wakes_flusher(buffer):
+    """Заполненная пачка будит флашер сразу, не дожидаясь интервала"""
+    buffer.batch_size = 5
+    buffer.start()
+    try:
+        buffer.add_to_buffer(None, _records(6))
+        deadline = time.monotonic() + 5
+        while buffer.size and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert buffer.size == 0
+    finally:
+        buffer.stop()
+    assert _stored() == _records(6)
+
+
+def test_stop_flushes_remaining(buffer):
+    """Штатная остановка дописывает в БД всё, что осталось в буфере"""
+    buffer.start()
+    buffer.add_to_buffer(None, _records(3))
+    buffer.stop()
+    assert buffer.thread is None and not buffer.running
+    assert _stored() == _records(3)
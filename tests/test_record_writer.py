@@ -0,0 +1,29 @@
+# Тесты кодирования пачек для COPY (app/services/record_writer.py)
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.record_block import Record_Block, uniform_times
+from app.services.record_writer import COPY_BINARY_HEADER, _to_copy_binary
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+PG_EPOCH = datetime(2000, 1, 1)
+
+
+def test_copy_binary_layout():
+    """Двоичный COPY блока: поле за полем в формате PostgreSQL, время — мкс от 2000-01-01"""
+    block = Record_Block(uniform_times(T0, 1500, range(3)), np.array([1.5, -2.0, np.nan]), 7, 9)
+    data = _to_copy_binary([block, Record_Block(uniform_times(T0, 0, range(1)), np.array([4.0]), 8, 9)])
+    assert data.startswith(COPY_BINARY_HEADER) and data.endswith(struct.pack('>h', -1))
+
+    row = struct.Struct('>hiqidiiii')
+    body = data[len(COPY_BINARY_HEADER):-2]
+    assert len(body) == 4 * row.size
+    rows = [row.unpack_from(body, offset) for offset in range(0, len(body), row.size)]
+    # Число полей и длины полей строки
+    assert all((r[0], r[1], r[3], r[5], r[7]) == (4, 8, 8, 4, 4) for r in rows)
+    assert [PG_EPOCH + timedelta(microseconds=r[2]) for r in rows] == \
+        [T0, T0 + timedelta(microseconds=1500), T0 + timedelta(microseconds=3000), T0]
+    assert [r[4] for r in rows[:2]] == [1.5, -2.0] and np.isnan(rows[2][4])
+    assert [(r[6], r[8]) for r in rows] == [(7, 9), (7, 9), (7, 9), (8, 9)]
@@ -0,0 +1,92 @@
+# Тесты агрегатов серий и выбора разрешения по бюджету точек (app/services/rollups.py)
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app.models.sensor_record import Sensor_Record
+from app.models.sensor_rollup import Sensor_Rollup_1s, Sensor_Rollup_1m, Sensor_Rollup_1h
+from app.services.record_block import Record_Block, uniform_times
+from app.services.record_writer import write_records
+from app.services.rollups import rollup_manager
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+
+
+# Серия 2 Гц на полтора часа: 10800 записей, 5400 интервалов по 1 с, 90 по 1 мин, 2 по 1 ч
+@pytest.fixture
+def series(app, db):
+    rollup_manager.configure(enabled=True)
+    rows = [(T0 + timedelta(milliseconds=500 * i), float(i % 7), 1, 1) for i in range(10800)]
+    for offset in range(0, len(rows), 2000):
+        write_records(rows[offset:offset + 2000])
+        db.session.commit()
+    return rows
+
+
+def _points(result):
+    return None if result is None else len(result[0])
+
+
+@pytest.mark.parametrize('points, expected', [
+    (1, 2),         # Не укладывается даже 1 ч — отдаются часы
+    (2, 2),
+    (89, 2),
+    (90, 90),       # Самое мелкое, что укладывается в бюджет
+    (5399, 90),
+    (5400, 5400),
+    (10799, 5400),
+    (10800, None),  # Записи сами укладываются в бюджет — читаются записи
+])
+def test_read_budget_is_a_cap(series, points, expected):
+    """Бюджет точек — потолок: выбирается самое мелкое разрешение, которое в него укладывается"""
+    assert _points(rollup_manager.read(1, 1, points)) == expected
+
+
+def test_read_means_and_buckets(series):
+    """Агрегаты минут — начала интервалов и средние значения"""
+    buckets, means = rollup_manager.read(1, 1, 100)
+    assert buckets[0] == T0
+    assert buckets[1] == T0 + timedelta(minutes=1)
+    first_minute = [float(i % 7) for i in range(120)]
+    assert means[0] == pytest.approx(sum(first_minute) / len(first_minute))
+
+
+def test_read_after_and_disabled(series):
+    """Инкрементальное чтение после after и отказ от агрегатов, когда они выключены"""
+    after = T0 + timedelta(minutes=80)
+    assert _points(rollup_manager.read(1, 1, 100, after=after)) == 9
+    assert rollup_manager.read(1, 1, 0) is None
+    rollup_manager.configure(enabled=False)
+    try:
+        assert rollup_manager.read(1, 1, 100) is None
+    finally:
+        rollup_manager.configure(enabled=True)
+
+
+def _rollups(db, parameter_id):
+    return [db.session.execute(select(model.bucket, model.count, model.min, model.max, model.mean)
+                               .where(model.parameter_id == parameter_id).order_by(model.bucket)).all()
+            for model in (Sensor_Rollup_1s, Sensor_Rollup_1m, Sensor_Rollup_1h)]
+
+
+def test_blocks_match_records(app, db):
+    """Блоки отсчётов дают те же строки и агрегаты, что и записи, — с запоздавшими и повторами"""
+    rollup_manager.configure(enabled=True)
+    values = np.random.default_rng(2).normal(10.0, 2.0, 3000)
+    # Пачки: по времени, запоздавшая (до отметки серии) и с перекрытием уже записанного
+    for start, stop in ((1000, 2000), (2000, 3000), (0, 1200), (2500, 3000)):
+        block = Record_Block(uniform_times(T0, 200000, range(start, stop)), values[start:stop], 1, 2)
+        write_records([(t, v, 1, 1) for t, v, _, _ in block.records()], blocks=[block])
+        db.session.commit()
+
+    series = [db.session.execute(select(Sensor_Record.timestamp, Sensor_Record.value)
+                                 .where(Sensor_Record.parameter_id == parameter_id)
+                                 .order_by(Sensor_Record.timestamp)).all() for parameter_id in (1, 2)]
+    assert len(series[0]) == 3000 and series[1] == series[0]
+    by_records, by_blocks = _rollups(db, 1), _rollups(db, 2)
+    assert [len(level) for level in by_blocks] == [600, 10, 1]
+    for records_level, blocks_level in zip(by_records, by_blocks):
+        assert [row[:4] for row in blocks_level] == [row[:4] for row in records_level]
+        assert [row[4] for row in blocks_level] == pytest.approx([row[4] for row in records_level])
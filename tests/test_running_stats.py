@@ -0,0 +1,82 @@
+# Тесты текущей статистики серий и её снимков в series_stats (app/services/running_stats.py)
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.running_stats import Running_Stats, store_snapshot
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+
+
+def _records(values, sensor_id=1, parameter_id=1, step=1.0):
+    return [(T0 + timedelta(seconds=step * i), value, sensor_id, parameter_id) for i, value in enumerate(values)]
+
+
+def test_welford_matches_numpy():
+    """Среднее, дисперсия, минимум и максимум совпадают с расчётом по всей серии"""
+    values = np.random.default_rng(1).normal(5.0, 2.0, 1000)
+    stats = Running_Stats()
+    # Пачками, как их отдаёт буфер приёма
+    records = _records(values.tolist())
+    for offset in range(0, len(records), 128):
+        stats.update(records[offset:offset + 128])
+    row = stats.series[(1, 1)].to_dict()
+    assert row['count'] == 1000
+    assert row['mean'] == pytest.approx(values.mean())
+    assert row['variance'] == pytest.approx(values.var(ddof=1))
+    assert row['min'] == values.min() and row['max'] == values.max()
+    assert row['first_time'] == T0 and row['last_time'] == T0 + timedelta(seconds=999)
+
+
+def test_skips_empty_and_non_numeric_values():
+    """Отсчёты без времени или значения и нечисловые значения статистику не портят"""
+    stats = Running_Stats()
+    stats.update([(T0, 1.0, 1, 1), (None, 5.0, 1, 1), (T0, None, 1, 1), (T0, 'abc', 1, 1), (T0, '3', 1, 1)])
+    row = stats.series[(1, 1)].to_dict()
+    assert row['count'] == 2
+    assert row['mean'] == pytest.approx(2.0)
+
+
+def test_ewm_depends_on_time_not_rate():
+    """Затухающее среднее зависит от прошедшего времени, а не от частоты публикации"""
+    slow, fast = Running_Stats((60.0,)), Running_Stats((60.0,))
+    slow.update(_records([0.0] + [10.0] * 60, step=1.0))
+    fast.update(_records([0.0] + [10.0] * 600, step=0.1))
+    expected = 10.0 * (1.0 - math.exp(-1.0))
+    assert slow.series[(1, 1)].ewm[0][1] == pytest.approx(expected)
+    assert fast.series[(1, 1)].ewm[0][1] == pytest.approx(expected)
+
+
+def test_snapshot_takes_only_changed_series():
+    """Снимок — только серии, изменившиеся после прошлого снимка; незаписанный снимок возвращается"""
+    stats = Running_Stats()
+    stats.update(_records([1.0, 2.0], parameter_id=1) + _records([3.0], parameter_id=2))
+    assert sorted(row['parameter_id'] for row in stats.snapshot()) == [1, 2]
+    assert stats.snapshot() == []
+
+    stats.update(_records([4.0], parameter_id=2))
+    rows = stats.snapshot()
+    assert [(row['parameter_id'], row['count']) for row in rows] == [(2, 2)]
+    stats.restore(rows)
+    assert [row['parameter_id'] for row in stats.snapshot()] == [2]
+
+
+def test_store_snapshot_and_stats_endpoint(app, db, client, access_token):
+    """Снимки перезаписывают строки series_stats; API читает их без процесса приёма"""
+    stats = Running_Stats()
+    stats.update(_records([1.0, 2.0, 3.0], parameter_id=1) + _records([5.0], parameter_id=2))
+    store_snapshot(stats.snapshot())
+    db.session.commit()
+    stats.update(_records([10.0], parameter_id=1))
+    store_snapshot(stats.snapshot())
+    db.session.commit()
+
+    response = client.get('/api/sensor_records/stats/1', headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == 200
+    parameters = response.json['parameters']
+    assert [(row['parameter_id'], row['count']) for row in parameters] == [(1, 4), (2, 1)]
+    assert parameters[0]['max'] == 10.0
+    assert parameters[0]['std'] == pytest.approx(math.sqrt(parameters[0]['variance']))
+    assert set(parameters[0]['ewm']) == {'60', '3600'}
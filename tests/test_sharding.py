@@ -0,0 +1,81 @@
+# Тесты кольца согласованного хеширования и координации шардов приёма (app/services/sharding.py)
+from datetime import timedelta
+
+from app.models.ingest_worker import Ingest_Worker
+from app.services import sharding
+from app.services.sharding import Hash_Ring, Shard_Coordinator, shared_filters
+
+KEYS = [f"sensor/{index}" for index in range(3000)]
+
+
+def _owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_ring_does_not_depend_on_worker_order():
+    """Владелец топика одинаков во всех процессах, в каком бы порядке они ни прочитали список"""
+    assert _owners(Hash_Ring(['a', 'b', 'c'])) == _owners(Hash_Ring(['c', 'a', 'b']))
+    assert Hash_Ring([]).owner('sensor/1') is None
+
+
+def test_join_moves_keys_only_to_new_worker():
+    """Пришедший процесс забирает ≈ 1/N топиков, остальные топики не меняют владельца"""
+    before = _owners(Hash_Ring(['a', 'b', 'c']))
+    after = _owners(Hash_Ring(['a', 'b', 'c', 'd']))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'd' for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_leave_moves_only_keys_of_leaving_worker():
+    """Ушедший процесс отдаёт только свои топики, они расходятся по оставшимся"""
+    before = _owners(Hash_Ring(['a', 'b', 'c', 'd']))
+    after = _owners(Hash_Ring(['a', 'b', 'd']))
+    assert all(after[key] == before[key] for key in KEYS if before[key] != 'c')
+    assert {after[key] for key in KEYS if before[key] == 'c'} == {'a', 'b', 'd'}
+
+
+def test_shared_filters():
+    """Общие подписки — $share/<группа>/<фильтр>"""
+    assert shared_filters(['sensor/#', 'plant/1'], 'ingest') == ['$share/ingest/sensor/#', '$share/ingest/plant/1']
+
+
+def _coordinator(app, worker_id, changes=None):
+    coordinator = Shard_Coordinator(worker_id, heartbeat=1.0, timeout=15.0)
+    coordinator.app = app
+    if changes is not None:
+        coordinator.on_change = lambda: changes.append(worker_id)
+    return coordinator
+
+
+def test_coordinators_agree_on_ownership(app, db):
+    """Отметки в ingest_workers дают процессам один состав кольца; каждый топик — ровно у одного"""
+    changes = []
+    first, second = _coordinator(app, 'a', changes), _coordinator(app, 'b', changes)
+    first.beat()
+    assert first.workers() == ('a',) and changes == []
+    second.beat()
+    first.beat()
+    assert first.workers() == second.workers() == ('a', 'b')
+    assert changes == ['b', 'a'] and first.rebalances == 1
+    assert all(first.owns(key) != second.owns(key) for key in KEYS)
+    # Состав не изменился — без перестройки
+    first.beat()
+    assert first.rebalances == 1
+
+
+def test_silent_and_stopped_workers_leave_ring(app, db, monkeypatch):
+    """Процесс без отметки дольше timeout выпадает из кольца; остановленный уходит сразу"""
+    first, second = _coordinator(app, 'a'), _coordinator(app, 'b')
+    second.beat()
+    first.beat()
+    assert first.workers() == ('a', 'b')
+
+    now = sharding._utcnow()
+    monkeypatch.setattr(sharding, '_utcnow', lambda: now + timedelta(seconds=20))
+    first.beat()
+    assert first.workers() == ('a',)
+    assert all(first.owns(key) for key in KEYS[:100])
+
+    first.stop()
+    assert Ingest_Worker.query.filter_by(worker_id='a').first() is None
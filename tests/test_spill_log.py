@@ -0,0 +1,103 @@
+# Тесты журнала на диске для записей, не попавших в БД (app/services/spill_log.py)
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+from app.services.record_block import Record_Block, uniform_times
+from app.services.spill_log import Spill_Log, QUARANTINE_DIR
+
+T0 = datetime(2024, 12, 12, 10, 0, 0)
+
+
+def _rows(count, value=1.5, start=0):
+    return [(T0 + timedelta(seconds=start + i), value, 1, 1) for i in range(count)]
+
+
+class Fake_DB:
+    """write_batch, который отвергает нечисловые значения, как COPY в столбец double precision"""
+
+    def __init__(self):
+        self.rows, self.frames, self.events, self.blocks = [], [], [], []
+        self.down = False
+
+    def write_batch(self, rows, frames, events, blocks):
+        if self.down:
+            raise OperationalError('COPY', {}, Exception('connection refused'))
+        for row in rows:
+            if not isinstance(row[1], (int, float)) or isinstance(row[1], bool):
+                raise DataError('COPY', {}, Exception(f'invalid input syntax for type double precision: "{row[1]}"'))
+        self.rows.extend(rows)
+        self.frames.extend(frames)
+        self.events.extend(events)
+        self.blocks.extend(blocks)
+
+
+def test_replay_in_order_and_delete(tmp_path):
+    """Сегменты воспроизводятся по порядку и удаляются после записи"""
+    log = Spill_Log(str(tmp_path), segment_max_bytes=1)
+    log.append(_rows(3))
+    log.append(_rows(2, start=3), frames=[(T0, 100.0, np.arange(4, dtype=np.float32), 1, 2)],
+               events=[('alarm_events', {'rule_id': 1, 'timestamp': T0})],
+               blocks=[Record_Block(uniform_times(T0, 250000, range(3)), np.array([1.0, 2.0, 3.0]), 1, 3)])
+    assert log.pending_rows == 10
+    db = Fake_DB()
+    assert log.replay(db.write_batch) == 10
+    assert [row[0] for row in db.rows] == [T0 + timedelta(seconds=i) for i in range(5)]
+    assert db.frames[0][2].tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert db.events[0][1]['rule_id'] == 1
+    # Блок возвращается массивами — теми же метками и значениями
+    assert db.blocks[0].records() == [(T0 + timedelta(milliseconds=250 * i), i + 1.0, 1, 3) for i in range(3)]
+    assert not log.has_pending()
+    assert log.pending_rows == 0
+
+
+def test_replay_keeps_segments_while_db_is_down(tmp_path):
+    """Ошибка связи с БД не уводит сегменты в карантин, сколько бы раз она ни повторялась"""
+    log = Spill_Log(str(tmp_path), max_attempts=2)
+    log.append(_rows(3))
+    db = Fake_DB()
+    db.down = True
+    for _ in range(5):
+        with pytest.raises(OperationalError):
+            log.replay(db.write_batch)
+    assert log.quarantined == 0
+    db.down = False
+    assert log.replay(db.write_batch) == 3
+
+
+def test_replay_quarantines_poison_segment(tmp_path):
+    """Сегмент со значением, которое БД не принимает, уходит в карантин, и журнал воспроизводится дальше"""
+    log = Spill_Log(str(tmp_path), max_attempts=2)
+    log.append(_rows(2, value=True) + _rows(1, value={'a': 1}, start=2))
+    db = Fake_DB()
+    with pytest.raises(DataError):
+        log.replay(db.write_batch)
+    # Последний сегмент некому подтвердить — журнал ждёт новых данных
+    with pytest.raises(DataError):
+        log.replay(db.write_batch)
+    assert log.quarantined == 0
+    # Новые данные приходят в следующий сегмент
+    log.append(_rows(2, start=10))
+    # Отвергнут max_attempts раз и следующий сегмент записался — в карантин
+    assert log.replay(db.write_batch) == 2
+    assert log.quarantined == 1
+    assert os.listdir(tmp_path / QUARANTINE_DIR)
+    assert not log.has_pending()
+    assert log.pending_rows == 0
+    assert len(db.rows) == 2
+
+
+def test_replay_does_not_quarantine_without_proof(tmp_path):
+    """Если следующий сегмент тоже не записался, плохим считается не сегмент, а БД"""
+    log = Spill_Log(str(tmp_path), max_attempts=1)
+    log.append(_rows(1, value='x'))
+    log._roll()
+    log.append(_rows(1, value='y', start=1))
+    db = Fake_DB()
+    with pytest.raises(DataError):
+        log.replay(db.write_batch)
+    assert log.quarantined == 0
+    assert log.has_pending()
@@ -0,0 +1,89 @@
+# Тесты постоянных конфигураций, пересчитываемых после каждой пачки приёма (app/services/standing.py)
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.standing_result import Standing_Result
+from app.services.record_writer import write_records
+from app.services.rollups import rollup_manager
+from app.services.standing import Standing_Engine, configuration_sources
+
+T0 = datetime(2025, 1, 1, 10, 0, 0)
+VIEW = (1, 7)
+
+
+def _config(points=0, sensor_id=1):
+    return {
+        'blocks': {'src': {'type': 'dataSource', 'parameters': {'sensor_id': sensor_id, 'parameter_id': 1,
+                                                                 'points': points}},
+                   'chart': {'type': 'chart'}},
+        'connections': [{'source': 'src', 'target': 'chart'}],
+    }
+
+
+def _records(count, start=0, sensor_id=1):
+    return [(T0 + timedelta(seconds=start + i), float(start + i), sensor_id, 1) for i in range(count)]
+
+
+def _commit(engine, db, records):
+    # Как флашер: пачка записана в БД, затем on_commit
+    write_records(records)
+    db.session.commit()
+    engine.on_commit(records, [])
+
+
+def _chart(view=VIEW):
+    stored = Standing_Result.query.filter_by(user_id=view[0], equipment_id=view[1]).first()
+    return None if stored is None else json.loads(stored.payload)['result']['chart']['y_values']
+
+
+@pytest.fixture
+def engine(app, db):
+    rollup_manager.configure(enabled=True)
+    return Standing_Engine()
+
+
+def test_sources_of_configuration(app):
+    """Источник — (sensor_id, parameter_id, mode, points); бюджет по умолчанию — у источника одних графиков"""
+    rollup_manager.configure(enabled=True, point_budget=2000)
+    assert configuration_sources(_config(points=0)) == {(1, 1, 'records', 0)}
+    assert configuration_sources(_config(points='')) == {(1, 1, 'records', 2000)}
+
+
+def test_results_follow_committed_batches(engine, db):
+    """Первая пачка читает серию из БД, следующие дополняют её в памяти; чужая пачка граф не пересчитывает"""
+    engine.configure({VIEW: _config()}, {})
+    _commit(engine, db, _records(3))
+    assert _chart() == [0.0, 1.0, 2.0]
+
+    _commit(engine, db, _records(2, start=3))
+    assert _chart() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert engine.evaluations == 2
+
+    _commit(engine, db, _records(2, sensor_id=2))
+    assert engine.evaluations == 2
+
+
+def test_removed_configuration_result_deleted(engine, db):
+    """Снятая конфигурация теряет сохранённый ответ при следующей пачке"""
+    engine.configure({VIEW: _config()}, {})
+    _commit(engine, db, _records(2))
+    assert _chart() == [0.0, 1.0]
+    engine.configure({}, {})
+    engine.on_commit([], [])
+    assert _chart() is None and engine.series == {}
+
+
+def test_sharded_refresh_only_owned_views(engine, db):
+    """Шардированный приём: серии перечитываются раз в refresh_interval и только у своих конфигураций"""
+    other = (2, 8)
+    engine.refresh_interval = 3600
+    engine.owns = lambda key: key == f"standing/{VIEW[0]}/{VIEW[1]}"
+    engine.configure({VIEW: _config(), other: _config(sensor_id=2)}, {})
+    _commit(engine, db, _records(2) + _records(2, sensor_id=2))
+    assert _chart() == [0.0, 1.0]
+    assert _chart(other) is None
+    # До истечения интервала пачки не перечитываются
+    _commit(engine, db, _records(1, start=2))
+    assert _chart() == [0.0, 1.0]
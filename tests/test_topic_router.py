@@ -0,0 +1,35 @@
+# Тесты таблицы маршрутизации топиков и подписок MQTT (app/services/topic_router.py)
+from app.models.routing_change import Routing_Change
+from app.models.sensor import Sensor
+from app.services.topic_router import Topic_Router, subscription_filters
+
+
+def test_filters_subscribe_each_topic_without_configured():
+    """Без MQTT_TOPIC_FILTERS топики не группируются: plant/# принёс бы чужие сообщения"""
+    assert subscription_filters(['plant/line1/x', 'plant/line2/y']) == ['plant/line1/x', 'plant/line2/y']
+
+
+def test_filters_do_not_overlap():
+    """Топики, покрытые заданным или подстановочным фильтром, отдельно не подписываются"""
+    sources = ['sensor/1', 'plant/a/x', 'plant/+/y', 'plant/#', 'other/1', 'sensor/2']
+    assert subscription_filters(sources, ['sensor/#', 'sensor/#']) == ['sensor/#', 'plant/#', 'other/1']
+    assert subscription_filters(['a/b', 'a/+', 'c']) == ['a/+', 'c']
+
+
+def test_rebuild_applies_changes_and_prunes_log(app, db):
+    """Изменение датчика отмечается в routing_changes; перестройка его применяет и удаляет старые отметки"""
+    router = Topic_Router()
+    router.app = app
+    router.rebuild()
+    assert router.table.routes_count() == 0
+
+    for topic in ('sensor/1', 'sensor/2'):
+        db.session.add(Sensor(name=topic, data_source=topic))
+        db.session.commit()
+    assert router.changed()
+    router.rebuild()
+    assert not router.changed()
+    assert router.lookup('sensor/2')[0] == 2
+    assert router.lookup('sensor/3') == (None, None)
+    # Для сравнения версий нужна только последняя отметка
+    assert [change.id for change in Routing_Change.query.all()] == [router.version]